@@ -1,5 +1,5 @@
 import os
-from flask import Flask
+from flask import Flask, Response
 from config import config
 from flask_cors import CORS
 
@@ -25,6 +25,38 @@ def create_app(config_name='default'):
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
     
+    # Create the pooled LLM clients, model router, response cache, retry policy and rate limiter shared by all services
+    from app.services.llm_client import init_llm_clients
+    from app.services.llm_providers import init_llm_router
+    from app.services.llm_cache import init_llm_cache
+    from app.services.resilience import init_resilience
+    from app.services.rate_limiter import init_rate_limiter
+    init_llm_clients(app)
+    init_llm_router(app)
+    init_llm_cache(app)
+    init_resilience(app)
+    init_rate_limiter(app)
+    
+    # Create the metrics registry, filled by the LLM gateway
+    from app.services.metrics import init_metrics
+    init_metrics(app)
+    
+    # Create the deduplication layer of identical concurrent generation requests
+    from app.services.single_flight import init_single_flight
+    init_single_flight(app)
+    
+    # Create the store of the content generated ahead of the content requests
+    from app.services.speculation import init_speculation
+    init_speculation(app)
+    
+    # Create the process pool rendering the PDF and PPTX files
+    from app.services.rendering import init_render_pool
+    init_render_pool(app)
+    
+    # Create the background worker pool for generation jobs
+    from app.services.jobs import init_job_manager
+    init_job_manager(app)
+    
     # Register blueprints
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
@@ -34,4 +66,9 @@ def create_app(config_name='default'):
         """Health check endpoint to verify the application is running."""
         return {'status': 'OK', 'message': 'Presentation Builder API is running'}
     
+    @app.route('/metrics')
+    def metrics():
+        """Export the application metrics in the Prometheus text format."""
+        return Response(app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+    
     return app
\ No newline at end of file
@@ -1,39 +1,430 @@
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, Response, stream_with_context
 import os
 import time
 import traceback
 from werkzeug.utils import secure_filename
 
 from app.services.plan_jour_generator import generate_plan_jour
-from app.services.content_jour_generator import generate_content_jour
+from app.services.checkpoints import ContentCheckpoint, purge_checkpoints
+from app.services.content_jour_generator import iter_content_jour, speculate_content_jour
+from app.services.document import InvalidDocument, build_course, build_course_jour
+from app.services.jobs import JobQueueFull, ProgressRelay
+from app.services.llm_parsing import pipeline as parse_pipeline
+from app.services.prompts import prompt_stats
+from app.services.rendering import RenderTimeout
+from app.services.themes import DEFAULT_THEME, THEMES
+from app.utils.concurrency import CancelToken, watch_disconnect
+from app.utils.helpers import format_sse
 
 # Create a blueprint for the main routes
 main = Blueprint('main', __name__)
 
 # Import service functions (these will be implemented in the services files)
 from app.services.plan_generator import generate_plan
-from app.services.content_generator import generate_content
-from app.services.pdf_generator import create_pdf, create_pdf_jour
-from app.services.pptx_generator import generate_powerpoint
+from app.services.content_generator import (iter_content, is_fallback_section, reuse_previous_content,
+                                            speculate_content)
+
+class InvalidRequest(ValueError):
+    """Raised when a request payload is missing or has invalid fields (400)."""
+
+def sse_response(events):
+    """Wrap an event generator in a streaming text/event-stream response."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+        }
+    )
 
 def allowed_file(filename):
     """Check if the file extension is allowed."""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
+# Request parsing, shared by the synchronous, streaming and job routes
+
+def parse_plan_request(data):
+    """Extract and validate the parameters of a plan request."""
+    params = {
+        'domaine': data.get('domaine'),
+        'sujet': data.get('sujet'),
+        'description_sujet': data.get('description_sujet', ''),
+        'niveau_apprenant': data.get('niveau_apprenant'),
+        'use_cache': data.get('use_cache', True),  # False to bypass the LLM response cache
+        # Generate the content of the plan in the background, ahead of the content request
+        'speculate': data.get('speculate', current_app.config['CONTENT_SPECULATIVE']),
+    }
+
+    # Validate required parameters
+    if not all([params['domaine'], params['sujet'], params['niveau_apprenant']]):
+        raise InvalidRequest('Missing required fields: domaine, sujet, niveau_apprenant')
+    return params
+
+def parse_plan_jour_request(data):
+    """Extract and validate the parameters of a daily plan request."""
+    params = parse_plan_request(data)
+    nombre_jours = data.get('nombre_jours', 2)  # Default to 2 days if not specified
+
+    # Validate nombre_jours is an integer
+    try:
+        nombre_jours = int(nombre_jours)
+    except (TypeError, ValueError):
+        raise InvalidRequest('nombre_jours must be a valid integer')
+    if nombre_jours < 1:
+        raise InvalidRequest('nombre_jours must be at least 1')
+
+    params['nombre_jours'] = nombre_jours
+    return params
+
+def parse_deadline(data):
+    """Extract the optional deadline (seconds) of a content request, 0 meaning none."""
+    deadline = data.get('deadline', current_app.config['CONTENT_REQUEST_DEADLINE'])
+    try:
+        deadline = float(deadline or 0)
+    except (TypeError, ValueError):
+        raise InvalidRequest('deadline must be a number of seconds')
+    if deadline < 0:
+        raise InvalidRequest('deadline must be positive')
+    return deadline
+
+def parse_content_request(data):
+    """Extract and validate the parameters of a content request."""
+    params = {
+        'domaine': data.get('domaine'),
+        'sujet': data.get('sujet'),
+        'plan': data.get('plan'),
+        'use_cache': data.get('use_cache', True),  # False to bypass the LLM response cache
+        # Optional previous plan and content, to only regenerate the edited sections
+        'previous_plan': data.get('previous_plan'),
+        'previous_content': data.get('previous_content'),
+        # Seconds after which the remaining sections are cancelled, returning the partial content
+        'deadline': parse_deadline(data),
+    }
+
+    # Validate required parameters
+    if not all([params['domaine'], params['sujet'], params['plan']]):
+        raise InvalidRequest('Missing required fields: domaine, sujet, plan')
+
+    if (params['previous_plan'] is None) != (params['previous_content'] is None):
+        raise InvalidRequest('previous_plan and previous_content must be sent together')
+    previous_plan = params['previous_plan']
+    if previous_plan is not None and not (
+        isinstance(previous_plan, dict)
+        and isinstance(previous_plan.get('sections', []), list)
+        and all(isinstance(sec, dict) for sec in previous_plan.get('sections', []))
+    ):
+        raise InvalidRequest('previous_plan must be a plan object with a list of sections')
+    if params['previous_content'] is not None and not isinstance(params['previous_content'], list):
+        raise InvalidRequest('previous_content must be a list of sections')
+    return params
+
+def parse_content_jour_request(data):
+    """Extract and validate the parameters of a daily content request."""
+    params = {
+        'domaine': data.get('domaine'),
+        'sujet': data.get('sujet'),
+        'plan_jour': data.get('plan_jour'),
+        'day_priority': data.get('day_priority'),  # Optional list of day numbers to generate first
+        'use_cache': data.get('use_cache', True),  # False to bypass the LLM response cache
+        # Seconds after which the remaining sessions are cancelled, returning the partial content
+        'deadline': parse_deadline(data),
+    }
+
+    # Validate required parameters
+    if not all([params['domaine'], params['sujet'], params['plan_jour']]):
+        raise InvalidRequest('Missing required fields: domaine, sujet, plan_jour')
+
+    if params['day_priority'] is not None and not isinstance(params['day_priority'], list):
+        raise InvalidRequest('day_priority must be a list of day numbers')
+    return params
+
+def parse_resume_request(data):
+    """Extract the run to resume and rebuild the parameters of its daily content request."""
+    if not current_app.config['CONTENT_CHECKPOINT_ENABLED']:
+        raise InvalidRequest('Content checkpoints are disabled')
+    checkpoint = ContentCheckpoint.load(current_app.config['CHECKPOINT_FOLDER'], data.get('run_id'))
+    if checkpoint is None:
+        raise InvalidRequest('Unknown or expired run_id')
+    if checkpoint.in_progress():
+        raise InvalidRequest(f'Run {checkpoint.run_id} is still in progress')
+    return {
+        **checkpoint.request,
+        'run_id': checkpoint.run_id,
+        'deadline': parse_deadline(data),
+    }
+
+def parse_files_request(data):
+    """Extract and validate the parameters of a file generation request."""
+    params = {
+        'sujet': data.get('sujet'),
+        'contenu': data.get('contenu'),
+        'format_type': data.get('format', 'pdf'),  # pdf, pptx, or both
+        'trainer_name': data.get('trainer_name', 'AIT TALEB AYOUB'),
+        'logo_path': data.get('logo_path', os.path.join(current_app.config['UPLOAD_FOLDER'], 'ODC_logo.jpeg')),
+        'theme': data.get('theme', DEFAULT_THEME),
+    }
+
+    # Validate required parameters
+    if not all([params['sujet'], params['contenu']]):
+        raise InvalidRequest('Missing required fields: sujet, contenu')
+
+    # Check if the format is valid
+    if params['format_type'] not in ['pdf', 'pptx', 'both']:
+        raise InvalidRequest('Invalid format. Must be one of: pdf, pptx, both')
+    if params['theme'] not in THEMES:
+        raise InvalidRequest(f"Invalid theme. Must be one of: {', '.join(THEMES)}")
+    return params
+
+# Generation tasks, called with the parsed parameters and an optional job
+
+def run_plan(params, job=None):
+    """Generate a presentation plan."""
+    plan = generate_plan(params['domaine'], params['sujet'], params['description_sujet'],
+                         params['niveau_apprenant'], use_cache=params['use_cache'])
+    if params['speculate']:
+        speculate_content(params['domaine'], params['sujet'], plan, use_cache=params['use_cache'])
+    return {'plan': plan}
+
+def run_plan_jour(params, job=None):
+    """Generate a presentation plan organized by days."""
+    plan_jour = generate_plan_jour(params['domaine'], params['sujet'], params['description_sujet'],
+                                   params['niveau_apprenant'], params['nombre_jours'],
+                                   use_cache=params['use_cache'])
+    if params['speculate']:
+        speculate_content_jour(params['domaine'], params['sujet'], plan_jour, use_cache=params['use_cache'])
+    return {'plan_jour': plan_jour}
+
+def request_cancel_token(params, job=None, cancel=None):
+    """Return the cancellation token of a generation: the job's or the request's, bounded by the request deadline."""
+    if job is not None:
+        cancel = job.cancel
+    elif cancel is None:
+        cancel = CancelToken()
+    cancel.limit(params['deadline'])
+    return cancel
+
+def cancellation_report(cancel, completed, total):
+    """Describe a generation cut short by its token, or None if it completed."""
+    if completed >= total or not cancel.cancelled:
+        return None
+    return {'reason': cancel.reason, 'completed': completed, 'total': total}
+
+def run_content(params, job=None, cancel=None):
+    """Generate the content of a plan, publishing each section to the job as it completes."""
+    total = len(params['plan'].get('sections', []))
+    content = [None] * total
+    reuse = reuse_previous_content(params['plan'], params['previous_plan'], params['previous_content'])
+    cancel = request_cancel_token(params, job, cancel)
+    if job is not None:
+        job.set_progress(0, total, content)
+
+    completed = 0
+    for index, section_content in iter_content(params['domaine'], params['sujet'], params['plan'],
+                                               use_cache=params['use_cache'], reuse=reuse, cancel=cancel):
+        content[index] = section_content
+        completed += 1
+        if job is not None:
+            job.set_progress(completed)
+
+    result = {'content': content}
+    if params['previous_plan'] is not None:
+        result['incremental'] = {'reused_sections': len(reuse), 'generated_sections': total - len(reuse)}
+    cancelled = cancellation_report(cancel, completed, total)
+    if cancelled is not None:
+        # Sections left without content are None
+        result['cancelled'] = cancelled
+    return result
+
+def open_checkpoint(params):
+    """
+    Continue the checkpoint of a resumed daily content run, or start a new one.
+
+    The checkpoint is locked while the run goes on: release it when the run ends.
+
+    Returns:
+        A (checkpoint, reuse) tuple, reuse holding the sessions completed by
+        the previous attempts of the run; (None, {}) when checkpoints are disabled
+
+    Raises:
+        InvalidRequest: If another request is running the run
+    """
+    config = current_app.config
+    if not config['CONTENT_CHECKPOINT_ENABLED']:
+        return None, {}
+    purge_checkpoints(config['CHECKPOINT_FOLDER'], config['CHECKPOINT_TTL'])
+    checkpoint = None
+    if params.get('run_id') is not None:
+        checkpoint = ContentCheckpoint.load(config['CHECKPOINT_FOLDER'], params['run_id'])
+    if checkpoint is None:
+        request_params = {key: params[key] for key in ('domaine', 'sujet', 'plan_jour', 'day_priority', 'use_cache')}
+        checkpoint = ContentCheckpoint.create(config['CHECKPOINT_FOLDER'], request_params, params.get('run_id'))
+        reuse = {}
+    else:
+        # Failed sessions are generated again
+        reuse = {key: session_content for key, session_content in checkpoint.completed().items()
+                 if not is_fallback_section(session_content)}
+    if not checkpoint.lock():
+        raise InvalidRequest(f'Run {checkpoint.run_id} is still in progress')
+    checkpoint.save('running')
+    return checkpoint, reuse
+
+def run_content_jour(params, job=None, cancel=None):
+    """Generate the content of a daily plan, publishing each session to the job as it completes."""
+    plan_jour = params['plan_jour']
+    total = sum(len(day.get('sessions', [])) for day in plan_jour)
+    # Pre-allocate the [day][session] structure so results land in plan order
+    content = [[None] * len(day.get('sessions', [])) for day in plan_jour]
+    cancel = request_cancel_token(params, job, cancel)
+    checkpoint, reuse = open_checkpoint(params)
+    if job is not None:
+        job.set_progress(0, total, content)
+
+    completed = 0
+    try:
+        for day_index, session_index, session_content in iter_content_jour(
+                params['domaine'], params['sujet'], plan_jour,
+                day_priority=params['day_priority'], use_cache=params['use_cache'], cancel=cancel, reuse=reuse):
+            content[day_index][session_index] = session_content
+            completed += 1
+            if checkpoint is not None and (day_index, session_index) not in reuse:
+                checkpoint.record(day_index, session_index, session_content)
+            if job is not None:
+                job.set_progress(completed)
+    except Exception:
+        if checkpoint is not None:
+            checkpoint.save('failed')
+            checkpoint.release()
+        raise
+
+    result = {'content': content}
+    cancelled = cancellation_report(cancel, completed, total)
+    if cancelled is not None:
+        # Sessions left without content are None
+        result['cancelled'] = cancelled
+    if checkpoint is not None:
+        checkpoint.save('cancelled' if cancelled is not None else 'completed')
+        checkpoint.release()
+        # Send the run id to POST /api/generate-content-jour/resume to continue an interrupted run
+        result['run_id'] = checkpoint.run_id
+        if reuse:
+            result['resumed'] = {'reused_sessions': len(reuse), 'generated_sessions': total - len(reuse)}
+    return result
+
+def render_files(build, params):
+    """
+    Render the requested formats in parallel, each one independently of the others
+
+    The content is normalized once (see app.services.document) and the same
+    Course is handed to every renderer.
+
+    Args:
+        build: build_course or build_course_jour, building the Course from the content
+        params: The parsed parameters of the request (see parse_files_request)
+
+    Returns:
+        A dict with the generated 'files', the 'render_seconds' of each format
+        and, when a format failed while another succeeded, its 'errors'
+
+    Raises:
+        InvalidRequest: If the content does not have the expected structure
+        The error of the first format when none of them could be rendered
+    """
+    try:
+        course = build(params['sujet'], params['trainer_name'], params['contenu'])
+    except InvalidDocument as e:
+        raise InvalidRequest(f'Invalid content: {str(e)}')
+
+    formats = ['pdf', 'pptx'] if params['format_type'] == 'both' else [params['format_type']]
+    render_pool = current_app.extensions['render_pool']
+    finished = {}
+    submitted = []
+    for format_type in formats:
+        filename = f"{params['sujet']}_{int(time.time())}.{format_type}"
+        path = os.path.join(current_app.config['OUTPUT_FOLDER'], filename)
+        start_time = time.time()
+        future = render_pool.submit(format_type, path, course, params['logo_path'], theme_id=params['theme'])
+        # Timed when the render completes, whichever format is waited for first
+        future.add_done_callback(lambda _, format_type=format_type: finished.setdefault(format_type, time.time()))
+        submitted.append((format_type, filename, path, start_time, future))
+
+    file_paths, errors, timings = [], [], {}
+    for format_type, filename, path, start_time, future in submitted:
+        try:
+            render_pool.wait(future, path)
+        except Exception as e:
+            print(f"Error generating the {format_type} file: {str(e)}")
+            errors.append((format_type, e))
+            continue
+        finally:
+            timings[format_type] = round(finished.get(format_type, time.time()) - start_time, 2)
+        file_paths.append({
+            'type': format_type,
+            'filename': filename,
+            'path': path,
+            'download_url': f"/api/download/{filename}"
+        })
+
+    if not file_paths:
+        raise errors[0][1]
+    result = {'files': file_paths, 'render_seconds': timings}
+    if errors:
+        result['errors'] = [{'type': format_type, 'error': str(e)} for format_type, e in errors]
+    return result
+
+def run_files(params, job=None):
+    """Generate PDF and/or PPTX files from the provided content."""
+    return render_files(build_course, params)
+
+def run_files_jour(params, job=None):
+    """Generate PDF and/or PPTX files from the provided daily content."""
+    return render_files(build_course_jour, params)
+
+# Generations shared by identical requests in flight (see SingleFlight); files are always rendered
+SHARED_TASKS = {'generate-plan', 'generate-plan-jour', 'generate-content', 'generate-content-jour',
+                'resume-content-jour'}
+
+def run_shared(kind, task, params, job=None, cancel=None):
+    """Run a generation task, sharing its execution with the identical requests in flight."""
+    # Only the content tasks take the cancellation token of a plain request
+    options = {'cancel': cancel} if cancel is not None else {}
+    single_flight = current_app.extensions.get('single_flight')
+    if single_flight is None or kind not in SHARED_TASKS:
+        return task(params, job, **options)
+    # The generation reports its progress to every job sharing it, and stops with the token of its request
+    own_cancel = job.cancel if job is not None else cancel
+    relay = lambda publish: ProgressRelay(own_cancel if own_cancel is not None else CancelToken(), publish)
+    # A result cut short by the cancellation of its request is not shared
+    return single_flight.do(kind, params, lambda publish: task(params, relay(publish)),
+                            reusable=lambda result: 'cancelled' not in result,
+                            cancel=own_cancel,
+                            on_progress=job.set_progress if job is not None else None)
+
+# Job types accepted by /api/jobs/<job_type>: (request parser, task)
+JOB_TYPES = {
+    'generate-plan': (parse_plan_request, run_plan),
+    'generate-plan-jour': (parse_plan_jour_request, run_plan_jour),
+    'generate-content': (parse_content_request, run_content),
+    'generate-content-jour': (parse_content_jour_request, run_content_jour),
+    'resume-content-jour': (parse_resume_request, run_content_jour),
+    'generate-files': (parse_files_request, run_files),
+    'generate-files-jour': (parse_files_request, run_files_jour),
+}
+
 @main.route('/api/upload', methods=['POST'])
 def upload_file():
     """Handle file uploads (for logos, etc.)."""
     # Check if file part exists in request
     if 'file' not in request.files:
         return jsonify({'error': 'No file part in the request'}), 400
-    
+
     file = request.files['file']
-    
+
     # Check if a file was selected
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
-    
+
     # Check if the file type is allowed
     if file and allowed_file(file.filename):
         # Secure the filename to prevent directory traversal attacks
@@ -41,46 +432,37 @@ def upload_file():
         # Create a unique filename to prevent overwriting
         unique_filename = f"{int(time.time())}_{filename}"
         filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-        
+
         # Save the file
         file.save(filepath)
         return jsonify({
-            'success': True, 
+            'success': True,
             'filename': unique_filename,
             'filepath': filepath
         })
-    
+
     return jsonify({'error': 'File type not allowed'}), 400
 
 @main.route('/api/generate-plan', methods=['POST'])
 def api_generate_plan():
     """Generate a presentation plan based on provided parameters."""
     try:
-        # Get JSON data from request
-        data = request.json
-        
-        # Extract required parameters
-        domaine = data.get('domaine')
-        sujet = data.get('sujet')
-        description_sujet = data.get('description_sujet', '')
-        niveau_apprenant = data.get('niveau_apprenant')
-        
-        # Validate required parameters
-        if not all([domaine, sujet, niveau_apprenant]):
-            return jsonify({'error': 'Missing required fields: domaine, sujet, niveau_apprenant'}), 400
-        
+        params = parse_plan_request(request.json)
+
         # Generate the plan
         start_time = time.time()
-        plan = generate_plan(domaine, sujet, description_sujet, niveau_apprenant)
+        result = run_shared('generate-plan', run_plan, params)
         execution_time = round(time.time() - start_time, 2)
-        
+
         # Return the plan with timing information
         return jsonify({
             'success': True,
             'execution_time_seconds': execution_time,
-            'plan': plan
+            **result
         })
-    
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating plan: {str(e)}")
@@ -91,102 +473,133 @@ def api_generate_plan():
 def api_generate_content():
     """Generate presentation content based on the provided plan."""
     try:
-        # Get JSON data from request
-        data = request.json
-        
-        # Extract required parameters
-        domaine = data.get('domaine')
-        sujet = data.get('sujet')
-        plan = data.get('plan')
-        
-        # Validate required parameters
-        if not all([domaine, sujet, plan]):
-            return jsonify({'error': 'Missing required fields: domaine, sujet, plan'}), 400
-        
+        params = parse_content_request(request.json)
+
         # Generate the content
         start_time = time.time()
-        content = generate_content(domaine, sujet, plan)
+        # Stop the remaining LLM calls if the client goes away
+        with watch_disconnect(request.environ) as cancel:
+            result = run_shared('generate-content', run_content, params, cancel=cancel)
         execution_time = round(time.time() - start_time, 2)
-        
+
         # Return the content with timing information
         return jsonify({
             'success': True,
             'execution_time_seconds': execution_time,
-            'content': content
+            **result
         })
-    
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating content: {str(e)}")
         print(traceback.format_exc())
         return jsonify({'error': f'Failed to generate content: {str(e)}'}), 500
 
+@main.route('/api/generate-content/stream', methods=['POST'])
+def api_generate_content_stream():
+    """Stream presentation content as Server-Sent Events, one event per section and sub-section."""
+    try:
+        params = parse_content_request(request.json)
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    total = len(params['plan'].get('sections', []))
+    reuse = reuse_previous_content(params['plan'], params['previous_plan'], params['previous_content'])
+    cancel = CancelToken(params['deadline'])
+
+    def events():
+        start_time = time.time()
+        completed = 0
+        streamed = []
+
+        def on_subsection(index, subsection):
+            streamed.append(format_sse('subsection', {'index': index, 'content': subsection}))
+
+        yield format_sse('start', {'total': total, 'reused': len(reuse)})
+        try:
+            for item in iter_content(params['domaine'], params['sujet'], params['plan'],
+                                     use_cache=params['use_cache'], heartbeat=heartbeat, reuse=reuse,
+                                     on_subsection=on_subsection, cancel=cancel):
+                if item is None:
+                    if streamed:
+                        yield from streamed
+                        streamed.clear()
+                    else:
+                        # SSE comment, keeps proxies from closing an idle connection
+                        yield ": keep-alive\n\n"
+                    continue
+                index, section_content = item
+                completed += 1
+                yield format_sse('section', {
+                    'index': index,
+                    'completed': completed,
+                    'total': total,
+                    'reused': index in reuse,
+                    'content': section_content
+                })
+            yield format_sse('done', {
+                'success': True,
+                'execution_time_seconds': round(time.time() - start_time, 2),
+                'cancelled': cancellation_report(cancel, completed, total)
+            })
+        except GeneratorExit:
+            # The client went away: stop the remaining LLM calls
+            cancel.cancel('client disconnected')
+            raise
+        except Exception as e:
+            # Log the error for debugging
+            print(f"Error streaming content: {str(e)}")
+            print(traceback.format_exc())
+            yield format_sse('error', {'error': f'Failed to generate content: {str(e)}'})
+
+    return sse_response(events())
+
 @main.route('/api/generate-files', methods=['POST'])
 def api_generate_files():
     """Generate PDF and/or PPTX files from the provided content."""
     try:
-        # Get JSON data from request
-        data = request.json
-        
-        # Extract required parameters
-        sujet = data.get('sujet')
-        contenu = data.get('contenu')
-        format_type = data.get('format', 'pdf')  # pdf, pptx, or both
-        trainer_name = data.get('trainer_name', 'AIT TALEB AYOUB')
-        logo_path = data.get('logo_path', os.path.join(current_app.config['UPLOAD_FOLDER'], 'ODC_logo.jpeg'))
-        
-        # Validate required parameters
-        if not all([sujet, contenu]):
-            return jsonify({'error': 'Missing required fields: sujet, contenu'}), 400
-        
-        # Check if the format is valid
-        if format_type not in ['pdf', 'pptx', 'both']:
-            return jsonify({'error': 'Invalid format. Must be one of: pdf, pptx, both'}), 400
-        
-        file_paths = []
+        params = parse_files_request(request.json)
+
         start_time = time.time()
-        
-        # Generate PDF if requested
-        if format_type in ['pdf', 'both']:
-            pdf_filename = f"{sujet}_{int(time.time())}.pdf"
-            pdf_path = os.path.join(current_app.config['OUTPUT_FOLDER'], pdf_filename)
-            
-            create_pdf(pdf_path, contenu, logo_path, sujet, trainer_name)
-            file_paths.append({
-                'type': 'pdf',
-                'filename': pdf_filename,
-                'path': pdf_path,
-                'download_url': f"/api/download/{pdf_filename}"
-            })
-        
-        # Generate PPTX if requested
-        if format_type in ['pptx', 'both']:
-            pptx_filename = f"{sujet}_{int(time.time())}.pptx"
-            pptx_path = os.path.join(current_app.config['OUTPUT_FOLDER'], pptx_filename)
-            
-            generate_powerpoint(sujet, contenu, trainer_name, logo_path, pptx_path)
-            file_paths.append({
-                'type': 'pptx',
-                'filename': pptx_filename,
-                'path': pptx_path,
-                'download_url': f"/api/download/{pptx_filename}"
-            })
-        
+        result = run_files(params)
         execution_time = round(time.time() - start_time, 2)
-        
+
         # Return information about generated files
         return jsonify({
             'success': True,
             'execution_time_seconds': execution_time,
-            'files': file_paths
+            **result
         })
-    
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except RenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating files: {str(e)}")
         print(traceback.format_exc())
         return jsonify({'error': f'Failed to generate files: {str(e)}'}), 500
 
+@main.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    """Report the counters of the LLM call layer."""
+    cache = current_app.extensions.get('llm_cache')
+    single_flight = current_app.extensions.get('single_flight')
+    return jsonify({
+        'cache': cache.stats() if cache is not None else None,
+        'resilience': current_app.extensions['llm_resilience'].stats(),
+        'rate_limit': current_app.extensions['llm_scheduler'].stats(),
+        'routing': current_app.extensions['llm_router'].stats(),
+        'parsing': parse_pipeline.stats(),
+        'prompts': prompt_stats(),
+        'speculation': current_app.extensions['speculation'].stats(),
+        'single_flight': single_flight.stats() if single_flight is not None else None
+    })
+
 @main.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
     """Download a generated file."""
@@ -200,163 +613,235 @@ def download_file(filename):
 def api_generate_plan_jour():
     """Generate a presentation plan organized by days based on provided parameters."""
     try:
-        # Get JSON data from request
-        data = request.json
-        
-        # Extract required parameters
-        domaine = data.get('domaine')
-        sujet = data.get('sujet')
-        description_sujet = data.get('description_sujet', '')
-        niveau_apprenant = data.get('niveau_apprenant')
-        nombre_jours = data.get('nombre_jours', 2)  # Default to 2 days if not specified
-        
-        # Validate required parameters
-        if not all([domaine, sujet, niveau_apprenant]):
-            return jsonify({'error': 'Missing required fields: domaine, sujet, niveau_apprenant'}), 400
-        
-        # Validate nombre_jours is an integer
-        try:
-            nombre_jours = int(nombre_jours)
-            if nombre_jours < 1:
-                return jsonify({'error': 'nombre_jours must be at least 1'}), 400
-        except (TypeError, ValueError):
-            return jsonify({'error': 'nombre_jours must be a valid integer'}), 400
-        
+        params = parse_plan_jour_request(request.json)
+
         # Generate the daily plan
         start_time = time.time()
-        plan_jour = generate_plan_jour(domaine, sujet, description_sujet, niveau_apprenant, nombre_jours)
+        result = run_shared('generate-plan-jour', run_plan_jour, params)
         execution_time = round(time.time() - start_time, 2)
-        
+
         # Return the plan with timing information
         return jsonify({
             'success': True,
             'execution_time_seconds': execution_time,
-            'plan_jour': plan_jour
+            **result
         })
-    
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating daily plan: {str(e)}")
         print(traceback.format_exc())
         return jsonify({'error': f'Failed to generate daily plan: {str(e)}'}), 500
-    
+
 @main.route('/api/generate-content-jour', methods=['POST'])
 def api_generate_content_jour():
     """Generate detailed content for a daily presentation plan."""
     try:
-        # Get JSON data from request
-        data = request.json
-        
-        # Extract required parameters
-        domaine = data.get('domaine')
-        sujet = data.get('sujet')
-        plan_jour = data.get('plan_jour')
-        
-        # Validate required parameters
-        if not all([domaine, sujet, plan_jour]):
-            return jsonify({'error': 'Missing required fields: domaine, sujet, plan_jour'}), 400
-        
+        params = parse_content_jour_request(request.json)
+
         # Generate the content
         start_time = time.time()
-        content = generate_content_jour(domaine, sujet, plan_jour)
+        # Stop the remaining LLM calls if the client goes away
+        with watch_disconnect(request.environ) as cancel:
+            result = run_shared('generate-content-jour', run_content_jour, params, cancel=cancel)
         execution_time = round(time.time() - start_time, 2)
-        
+
         # Return the content with timing information
         return jsonify({
             'success': True,
             'execution_time_seconds': execution_time,
-            'content': content
+            **result
         })
-    
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating daily content: {str(e)}")
         print(traceback.format_exc())
         return jsonify({'error': f'Failed to generate daily content: {str(e)}'}), 500
-    
+
+@main.route('/api/generate-content-jour/resume', methods=['POST'])
+def api_resume_content_jour():
+    """Continue an interrupted daily content run from its last completed session."""
+    try:
+        params = parse_resume_request(request.json)
+
+        # Generate the remaining sessions
+        start_time = time.time()
+        # Stop the remaining LLM calls if the client goes away
+        with watch_disconnect(request.environ) as cancel:
+            result = run_shared('resume-content-jour', run_content_jour, params, cancel=cancel)
+        execution_time = round(time.time() - start_time, 2)
+
+        # Return the content with timing information
+        return jsonify({
+            'success': True,
+            'execution_time_seconds': execution_time,
+            **result
+        })
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        # Log the error for debugging
+        print(f"Error resuming daily content: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'error': f'Failed to resume daily content: {str(e)}'}), 500
+
+@main.route('/api/generate-content-jour/stream', methods=['POST'])
+def api_generate_content_jour_stream():
+    """Stream daily presentation content as Server-Sent Events, one event per session and sub-section."""
+    try:
+        # With a run_id, continue an interrupted run
+        if request.json.get('run_id'):
+            params = parse_resume_request(request.json)
+        else:
+            params = parse_content_jour_request(request.json)
+        checkpoint, reuse = open_checkpoint(params)
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+    plan_jour = params['plan_jour']
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    total = sum(len(day.get('sessions', [])) for day in plan_jour)
+    cancel = CancelToken(params['deadline'])
+
+    def events():
+        start_time = time.time()
+        completed = 0
+        streamed = []
+
+        def on_subsection(day_index, session_index, subsection):
+            streamed.append(format_sse('subsection', {
+                'day_index': day_index,
+                'session_index': session_index,
+                'content': subsection
+            }))
+
+        yield format_sse('start', {
+            'total': total,
+            'sessions_per_day': [len(day.get('sessions', [])) for day in plan_jour],
+            'run_id': checkpoint.run_id if checkpoint is not None else None,
+            'reused': len(reuse)
+        })
+        try:
+            for item in iter_content_jour(params['domaine'], params['sujet'], plan_jour,
+                                          day_priority=params['day_priority'],
+                                          use_cache=params['use_cache'], heartbeat=heartbeat,
+                                          on_subsection=on_subsection, cancel=cancel, reuse=reuse):
+                if item is None:
+                    if streamed:
+                        yield from streamed
+                        streamed.clear()
+                    else:
+                        # SSE comment, keeps proxies from closing an idle connection
+                        yield ": keep-alive\n\n"
+                    continue
+                day_index, session_index, session_content = item
+                completed += 1
+                if checkpoint is not None and (day_index, session_index) not in reuse:
+                    checkpoint.record(day_index, session_index, session_content)
+                yield format_sse('session', {
+                    'day_index': day_index,
+                    'session_index': session_index,
+                    'jour': plan_jour[day_index].get('jour', day_index + 1),
+                    'completed': completed,
+                    'total': total,
+                    'content': session_content
+                })
+            cancelled = cancellation_report(cancel, completed, total)
+            if checkpoint is not None:
+                checkpoint.save('cancelled' if cancelled is not None else 'completed')
+            yield format_sse('done', {
+                'success': True,
+                'execution_time_seconds': round(time.time() - start_time, 2),
+                'cancelled': cancelled
+            })
+        except GeneratorExit:
+            # The client went away: stop the remaining LLM calls
+            cancel.cancel('client disconnected')
+            if checkpoint is not None:
+                checkpoint.save('cancelled')
+            raise
+        except Exception as e:
+            if checkpoint is not None:
+                checkpoint.save('failed')
+            # Log the error for debugging
+            print(f"Error streaming daily content: {str(e)}")
+            print(traceback.format_exc())
+            yield format_sse('error', {'error': f'Failed to generate daily content: {str(e)}'})
+        finally:
+            if checkpoint is not None:
+                checkpoint.release()
+
+    return sse_response(events())
+
 @main.route('/api/generate-files-jour', methods=['POST'])
 def api_generate_files_jour():
     """Generate PDF and/or PPTX files from the provided daily content."""
     try:
-        # Get JSON data from request
-        data = request.json
-        
-        # Extract required parameters
-        sujet = data.get('sujet')
-        contenu_jour = data.get('contenu')
-        format_type = data.get('format', 'pdf')  # pdf, pptx, or both
-        trainer_name = data.get('trainer_name', 'AIT TALEB AYOUB')
-        logo_path = data.get('logo_path', os.path.join(current_app.config['UPLOAD_FOLDER'], 'ODC_logo.jpeg'))
-        
-        # Validate required parameters
-        if not all([sujet, contenu_jour]):
-            return jsonify({'error': 'Missing required fields: sujet, contenu'}), 400
-        
-        # Check if the format is valid
-        if format_type not in ['pdf', 'pptx', 'both']:
-            return jsonify({'error': 'Invalid format. Must be one of: pdf, pptx, both'}), 400
-        
-        file_paths = []
+        params = parse_files_request(request.json)
+
         start_time = time.time()
-        
-        # Generate PDF if requested
-        if format_type in ['pdf', 'both']:
-            pdf_filename = f"{sujet}_{int(time.time())}.pdf"
-            pdf_path = os.path.join(current_app.config['OUTPUT_FOLDER'], pdf_filename)
-            
-            create_pdf_jour(pdf_path, contenu_jour, logo_path, sujet, trainer_name)
-            file_paths.append({
-                'type': 'pdf',
-                'filename': pdf_filename,
-                'path': pdf_path,
-                'download_url': f"/api/download/{pdf_filename}"
-            })
-        
-        # Generate PPTX if requested (using the regular function for now)
-        if format_type in ['pptx', 'both']:
-            pptx_filename = f"{sujet}_{int(time.time())}.pptx"
-            pptx_path = os.path.join(current_app.config['OUTPUT_FOLDER'], pptx_filename)
-            
-            # You would need to update the PowerPoint generator too, but for now using existing function
-            # You could implement a similar create_pptx_jour function
-            adapted_content = []
-            for day_index, day_content in enumerate(contenu_jour):
-                day_num = day_index + 1
-                # Add day title section
-                day_section = {
-                    "title": f"Jour {day_num}",
-                    "subsections": [
-                        {
-                            "title": f"Programme du Jour {day_num}",
-                            "content": f"Voici le contenu de la formation pour le jour {day_num}."
-                        }
-                    ]
-                }
-                adapted_content.append([day_section])
-                
-                # Add the day's content
-                for session_list in day_content:
-                    adapted_content.append(session_list)
-            
-            generate_powerpoint(sujet, adapted_content, trainer_name, logo_path, pptx_path)
-            file_paths.append({
-                'type': 'pptx',
-                'filename': pptx_filename,
-                'path': pptx_path,
-                'download_url': f"/api/download/{pptx_filename}"
-            })
-        
+        result = run_files_jour(params)
         execution_time = round(time.time() - start_time, 2)
-        
+
         # Return information about generated files
         return jsonify({
             'success': True,
             'execution_time_seconds': execution_time,
-            'files': file_paths
+            **result
         })
-    
+
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except RenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         # Log the error for debugging
         print(f"Error generating files: {str(e)}")
         print(traceback.format_exc())
-        return jsonify({'error': f'Failed to generate files: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Failed to generate files: {str(e)}'}), 500
+
+@main.route('/api/jobs/<job_type>', methods=['POST'])
+def submit_job(job_type):
+    """Queue a generation job and return its id immediately."""
+    if job_type not in JOB_TYPES:
+        return jsonify({'error': f"Unknown job type. Must be one of: {', '.join(JOB_TYPES)}"}), 404
+
+    parse_request, task = JOB_TYPES[job_type]
+    try:
+        params = parse_request(request.json)
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job = current_app.extensions['jobs'].submit(job_type, lambda job: run_shared(job_type, task, params, job))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f"/api/jobs/{job.id}"
+    }), 202
+
+@main.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the status, progress, partial results and timing of a job."""
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@main.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job, stopping its remaining LLM calls; its partial result stays available."""
+    job = current_app.extensions['jobs'].cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict()), 202
@@ -4,4 +4,5 @@ from app.services.plan_jour_generator import generate_plan_jour
 from app.services.content_generator import generate_content
 from app.services.content_jour_generator import generate_content_jour
 from app.services.pdf_generator import create_pdf
-from app.services.pptx_generator import generate_powerpoint
\ No newline at end of file
+from app.services.pptx_generator import generate_powerpoint
+from app.services.document import build_course, build_course_jour
\ No newline at end of file
@@ -0,0 +1,170 @@
+# app/services/checkpoints.py
+import os
+import re
+import time
+import uuid
+import errno
+from app.utils.helpers import save_to_json, load_from_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs in progress are not detected
+    fcntl = None
+
+# Run ids are generated by new_run_id; anything else is rejected before touching the disk
+RUN_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def new_run_id():
+    """Return a new run id"""
+    return uuid.uuid4().hex
+
+
+class ContentCheckpoint:
+    """
+    Progress of a daily content generation, saved on disk after each session
+
+    The checkpoint holds the request of the run and the content of the
+    sessions completed so far, so a run interrupted by a crash, a worker
+    timeout or a restart can be resumed without generating them again.
+
+    While a request runs it, the run holds an exclusive lock on
+    ``<run_id>.lock``, released when it ends or when its process dies, so
+    a run still in progress is not resumed a second time.
+    """
+
+    def __init__(self, directory, run_id, request, content, status='running', created_at=None):
+        self.directory = directory
+        self.run_id = run_id
+        self.request = request
+        self.content = content
+        self.status = status  # running, completed, cancelled, failed
+        self.created_at = created_at or time.time()
+        self._lock_file = None
+
+    @property
+    def filename(self):
+        return f'{self.run_id}.json'
+
+    @classmethod
+    def create(cls, directory, request, run_id=None):
+        """
+        Start the checkpoint of a run
+
+        Args:
+            directory: The checkpoint folder
+            request: The parameters of the run: domaine, sujet, plan_jour, day_priority, use_cache
+            run_id: The id of a resumed run, a new one by default
+
+        Returns:
+            The saved ContentCheckpoint
+        """
+        content = [[None] * len(day.get('sessions', [])) for day in request['plan_jour']]
+        checkpoint = cls(directory, run_id or new_run_id(), request, content)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, directory, run_id):
+        """Return the checkpoint of a run, or None if unknown or invalid"""
+        if not isinstance(run_id, str) or not RUN_ID_PATTERN.match(run_id):
+            return None
+        try:
+            data = load_from_json(f'{run_id}.json', directory)
+        except (OSError, ValueError):
+            return None
+        if not data:
+            return None
+        return cls(directory, run_id, data['request'], data['content'], data.get('status', 'running'),
+                   data.get('created_at'))
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.directory, f'{self.run_id}.lock')
+
+    def lock(self):
+        """
+        Mark the run as in progress, for every process sharing the checkpoint folder
+
+        Returns:
+            True if the run is now locked by this checkpoint, False if another request runs it
+        """
+        if fcntl is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            lock_file.close()
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        """End the lock taken by lock"""
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def in_progress(self):
+        """Whether another request is running the run"""
+        if not self.lock():
+            return True
+        self.release()
+        return False
+
+    def record(self, day_index, session_index, session_content):
+        """Save the content of a completed session"""
+        self.content[day_index][session_index] = session_content
+        self.save()
+
+    def completed(self):
+        """Return the content of the completed sessions, by (day_index, session_index)"""
+        return {
+            (day_index, session_index): session_content
+            for day_index, day in enumerate(self.content)
+            for session_index, session_content in enumerate(day)
+            if session_content is not None
+        }
+
+    def save(self, status=None):
+        if status is not None:
+            self.status = status
+        completed = sum(1 for day in self.content for session_content in day if session_content is not None)
+        save_to_json({
+            'run_id': self.run_id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'updated_at': time.time(),
+            'completed': completed,
+            'total': sum(len(day) for day in self.content),
+            'request': self.request,
+            'content': self.content,
+        }, self.filename, self.directory)
+
+
+def purge_checkpoints(directory, ttl):
+    """Remove the checkpoints not updated for ttl seconds"""
+    if not os.path.isdir(directory):
+        return 0
+    limit = time.time() - ttl
+    removed = 0
+    for name in os.listdir(directory):
+        # Lock files keep the time of the start of their run; they go with their checkpoint
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+        try:
+            os.remove(f'{path[:-len(".json")]}.lock')
+        except OSError:
+            pass
+    return removed
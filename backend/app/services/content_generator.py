@@ -1,6 +1,13 @@
-from openai import OpenAI
-import json_repair
+import queue
+from collections import namedtuple
 from flask import current_app
+from app.services.llm_client import get_llm
+from app.services.json_stream import stream_json
+from app.services.llm_parsing import InvalidLLMOutput, validate_section_content
+from app.services.plan_diff import reusable_content, section_key
+from app.services.prompts import register_prompt, to_json
+from app.services.speculation import claimed_result
+from app.utils.concurrency import Cancelled, iter_parallel
 
 # Example content structure for demonstration
 exemple = [
@@ -29,91 +36,618 @@ exemple = [
     }
 ]
 
-def generate_content(domaine, sujet, plan):
+# Static instructions first, the fields of the call last (see PromptTemplate)
+SECTION_PROMPT = register_prompt(
+    "content.section",
+    prefix=f"""
+    Tu es un formateur expert dans le domaine indiqué à la fin de ce message.
+    Ton objectif est de générer le contenu pédagogique détaillé pour une section d'une présentation. Le sujet de la présentation et la section à développer sont indiqués à la fin de ce message.
+
+    Pour chaque sous-section (sauf conclusion) :
+
+    Rédige une explication détaillée de tous les concepts d'une façon claire et progressive.
+
+    Ajoute si nécessaire des exemples bien commentés.
+
+    Utilise si nécessaire des tableaux ou illustrations pour synthétiser les concepts.
+
+    Le contenu doit être structuré en JSON. Commence à générer le JSON directement sans ajouter d'autre message.
+
+    Voici un exemple de résultat attendu : {to_json(exemple)}
+    """,
+    suffix="""
+    Domaine : {domaine}
+    Sujet de la présentation : {sujet}
+
+    Voici la section à développer :
+      {section} :
+        Sous Sections : {sous_sections}
+
+    ```json
+    """,
+)
+
+BATCH_PROMPT = register_prompt(
+    "content.batch",
+    prefix=f"""
+    Tu es un formateur expert dans le domaine indiqué à la fin de ce message.
+    Ton objectif est de générer le contenu pédagogique détaillé pour plusieurs sections d'une présentation. Le sujet de la présentation et les sections à développer, chacune identifiée par une clé, sont indiqués à la fin de ce message.
+
+    Pour chaque sous-section (sauf conclusion) :
+
+    Rédige une explication détaillée de tous les concepts d'une façon claire et progressive.
+
+    Ajoute si nécessaire des exemples bien commentés.
+
+    Utilise si nécessaire des tableaux ou illustrations pour synthétiser les concepts.
+
+    Le contenu doit être structuré en JSON : un objet dont les clés sont les identifiants des sections et dont chaque valeur est le contenu de la section. Commence à générer le JSON directement sans ajouter d'autre message.
+
+    Voici un exemple de contenu attendu pour une section : {to_json(exemple)}
+    """,
+    suffix="""
+    Domaine : {domaine}
+    Sujet de la présentation : {sujet}
+
+    Voici les sections à développer (clés : {keys}) :
+    {sections}
+
+    ```json
+    """,
+)
+
+# Sub-sections of a large section, generated with their own prompt and merged afterwards
+PART_PROMPT = register_prompt(
+    "content.section_part",
+    prefix=f"""
+    Tu es un formateur expert dans le domaine indiqué à la fin de ce message.
+    Ton objectif est de générer le contenu pédagogique détaillé d'une partie des sous-sections d'une section d'une présentation. La section est trop longue pour être générée en une fois : elle est découpée en parties, et seules les sous-sections indiquées à la fin de ce message sont à développer. Le sujet de la présentation et la section sont indiqués à la fin de ce message.
+
+    Pour chaque sous-section (sauf conclusion) :
+
+    Rédige une explication détaillée de tous les concepts d'une façon claire et progressive.
+
+    Ajoute si nécessaire des exemples bien commentés.
+
+    Utilise si nécessaire des tableaux ou illustrations pour synthétiser les concepts.
+
+    Ne développe que les sous-sections demandées, dans l'ordre donné, sans introduction ni conclusion de la section.
+
+    Le contenu doit être structuré en JSON. Commence à générer le JSON directement sans ajouter d'autre message.
+
+    Voici un exemple de résultat attendu : {to_json(exemple)}
+    """,
+    suffix="""
+    Domaine : {domaine}
+    Sujet de la présentation : {sujet}
+
+    Voici la section à développer, partie {part} sur {parts} :
+      {section} :
+        Sous Sections de cette partie : {sous_sections}
+
+    ```json
+    """,
+)
+
+# A group of sub-sections of a large section: part (0-based) of parts
+SectionPart = namedtuple('SectionPart', ['index', 'part', 'parts', 'sous_sections'])
+
+# Placeholder text of the sub-sections whose generation failed
+FALLBACK_CONTENT = "Contenu non disponible. Erreur lors de la génération."
+
+def _normalize_sous_sections(sous_sections):
+    """Return the sub-sections of a plan section as a list of titles"""
+    # If sous-sections is just a string (like "aucun" for conclusion), make it a list
+    if isinstance(sous_sections, str):
+        if sous_sections.lower() == "aucun":
+            return ["Conclusion"]
+        return [sous_sections]
+    return sous_sections
+
+def fallback_section(section, sous_sections):
+    """Basic section structure used when the generation of a section fails"""
+    return {
+        "title": section,
+        "subsections": [
+            {
+                "title": subsection,
+                "content": FALLBACK_CONTENT
+            } for subsection in sous_sections if isinstance(sous_sections, list)
+        ]
+    }
+
+def is_fallback_section(section_content):
+    """Tell whether a section content is, or contains, the placeholder of a failed generation"""
+    if isinstance(section_content, list):
+        # Sections generated in parts are lists, with the placeholders of their failed parts
+        return any(is_fallback_section(item) for item in section_content)
+    return isinstance(section_content, dict) and any(
+        subsection.get("content") == FALLBACK_CONTENT
+        for subsection in section_content.get("subsections", [])
+        if isinstance(subsection, dict)
+    )
+
+def reuse_previous_content(plan, previous_plan, previous_content):
     """
-    Generate detailed content for each section in the plan
+    Select the sections of a previous generation that are still valid for an edited plan
+    
+    Sections are matched by title and sub-section titles; placeholders of
+    failed generations are never reused.
+    
+    Args:
+        plan: The edited presentation plan
+        previous_plan: The plan the previous content was generated from
+        previous_content: The content previously generated, in plan order
+        
+    Returns:
+        A dict mapping section indexes of ``plan`` to their reused content
+    """
+    return reusable_content(previous_plan, previous_content, plan,
+                            is_reusable=lambda section_content: not is_fallback_section(section_content))
+
+def generate_section_content(llm, domaine, sujet, sec, on_subsection=None):
+    """
+    Generate the detailed content of a single plan section
+    
+    With a streaming gateway, the answer is parsed while it arrives: each
+    sub-section is reported as soon as it is complete, and a malformed
+    answer is aborted early.
     
     Args:
+        llm: The LLMGateway used to query the model
         domaine: The domain/field (e.g., "Java", "Python", etc.)
         sujet: The specific subject of the presentation
-        plan: The presentation plan structure previously generated
+        sec: The plan section ({"section": ..., "sous-sections": ...})
+        on_subsection: Optional function called with each streamed sub-section
         
     Returns:
-        A list containing detailed content for each section
+        The parsed content of the section, or the fallback structure on failure
     """
-    # Get API configuration from Flask config
-    api_key = current_app.config['API_KEY']
-    base_url = current_app.config['BASE_URL']
-    model = current_app.config['MODEL']
+    section = sec.get('section')
+    sous_sections = _normalize_sous_sections(sec.get('sous-sections'))
     
-    content = []
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    # Build the prompt for this section
+    prompt = SECTION_PROMPT.render(
+        domaine=domaine,
+        sujet=sujet,
+        section=section,
+        sous_sections=" // ".join(sous_sections) if isinstance(sous_sections, list) else sous_sections,
+    )
     
-    # Process each section in the plan
-    for sec in plan.get('sections', []):
-        section = sec.get('section')
-        sous_sections = sec.get('sous-sections')
-        
-        # If sous-sections is just a string (like "aucun" for conclusion), make it a list
-        if isinstance(sous_sections, str):
-            if sous_sections.lower() == "aucun":
-                sous_sections = ["Conclusion"]
-            else:
-                sous_sections = [sous_sections]
-        
-        # Build the prompt for this section
-        prompt = f"""
-        Tu es un formateur expert en {domaine}.
-        Ton objectif est de générer le contenu pédagogique détaillé pour la section suivante d'une présentation sur le sujet {sujet}.
+    try:
+        # Get the response
+        if llm.streaming:
+            response_text = stream_json(
+                llm, prompt, on_subsection,
+                temperature=0.3,  # Lower temperature for more focused output
+                top_p=0.9,
+            )
+        else:
+            response_text = llm.complete(
+                prompt,
+                temperature=0.3,  # Lower temperature for more focused output
+                top_p=0.9,
+            )
+    except Cancelled:
+        raise
+    except Exception as e:
+        print(f"Error generating content for section '{section}': {str(e)}")
+        return fallback_section(section, sous_sections)
+    
+    # Process the response
+    try:
+        return llm.parse_json(response_text, validate_section_content)
+    except InvalidLLMOutput as e:
+        print(f"Error parsing JSON for section '{section}': {str(e)}")
+        print(f"Raw response: {response_text}")
+        # Add a basic structure to avoid breaking the application
+        return fallback_section(section, sous_sections)
 
-        Voici la section à développer :
-          {section} :
+def output_token_budget(model):
+    """
+    Return the output tokens a single content prompt may ask of a model
+    
+    Uses CONTENT_OUTPUT_TOKEN_BUDGETS for the model, CONTENT_OUTPUT_TOKEN_BUDGET otherwise.
+    """
+    config = current_app.config
+    return config['CONTENT_OUTPUT_TOKEN_BUDGETS'].get(model, config['CONTENT_OUTPUT_TOKEN_BUDGET'])
 
-            Sous Sections : {" // ".join(sous_sections) if isinstance(sous_sections, list) else sous_sections}
+def section_part_size(llm):
+    """Return the number of sub-sections a single prompt can develop within the budget of the model"""
+    return max(1, output_token_budget(llm.model) // current_app.config['CONTENT_TOKENS_PER_SUBSECTION'])
 
-        Pour chaque sous-section (sauf conclusion) :
+def split_subsections(sous_sections, part_size):
+    """
+    Split the sub-sections of a large section into balanced groups
+    
+    Args:
+        sous_sections: The sub-section titles of the section
+        part_size: Maximum number of sub-sections of a group
+        
+    Returns:
+        A list of lists of sub-section titles; a single group when the
+        section fits in one prompt
+    """
+    if not isinstance(sous_sections, list) or len(sous_sections) <= part_size:
+        return [sous_sections]
+    parts = -(-len(sous_sections) // part_size)
+    size, extra = divmod(len(sous_sections), parts)
+    groups = []
+    start = 0
+    for part in range(parts):
+        stop = start + size + (1 if part < extra else 0)
+        groups.append(sous_sections[start:stop])
+        start = stop
+    return groups
 
-        Rédige une explication détaillée de tous les concepts d'une façon claire et progressive.
+def generate_section_part(llm, domaine, sujet, sec, part, parts, sous_sections, on_subsection=None):
+    """
+    Generate the content of a group of sub-sections of a large section
+    
+    Args:
+        llm: The LLMGateway used to query the model
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        sec: The plan section ({"section": ..., "sous-sections": ...})
+        part: Position of the group (0-based)
+        parts: Number of groups of the section
+        sous_sections: The sub-section titles of the group
+        on_subsection: Optional function called with each streamed sub-section
+        
+    Returns:
+        The parsed content of the group, or the fallback structure on failure
+    """
+    section = sec.get('section')
+    prompt = PART_PROMPT.render(
+        domaine=domaine,
+        sujet=sujet,
+        part=part + 1,
+        parts=parts,
+        section=section,
+        sous_sections=" // ".join(sous_sections),
+    )
+    
+    try:
+        if llm.streaming:
+            response_text = stream_json(
+                llm, prompt, on_subsection,
+                temperature=0.3,  # Lower temperature for more focused output
+                top_p=0.9,
+            )
+        else:
+            response_text = llm.complete(
+                prompt,
+                temperature=0.3,  # Lower temperature for more focused output
+                top_p=0.9,
+            )
+        return llm.parse_json(response_text, validate_section_content)
+    except Cancelled:
+        raise
+    except Exception as e:
+        print(f"Error generating part {part + 1}/{parts} of section '{section}': {str(e)}")
+        return fallback_section(section, sous_sections)
 
-        Ajoute si nécessaire des exemples bien commentés.
+def merge_section_parts(section, parts_content):
+    """
+    Merge the content generated for the groups of a large section under its title
+    
+    Args:
+        section: The title of the section
+        parts_content: The content of each group, in order
+        
+    Returns:
+        The content of the section: a list with one {"title", "subsections"} section
+    """
+    subsections = []
+    for content in parts_content:
+        for item in content if isinstance(content, list) else [content]:
+            subsections.extend(item.get("subsections", []))
+    return [{"title": section, "subsections": subsections}]
 
-        Utilise si nécessaire des tableaux ou illustrations pour synthétiser les concepts.
+def generate_section_in_parts(llm, domaine, sujet, sec, part_size):
+    """
+    Generate a section, one prompt per group of sub-sections when it is too large for one
+    
+    The groups are generated one after the other; iter_content generates
+    them concurrently instead.
+    """
+    groups = split_subsections(_normalize_sous_sections(sec.get('sous-sections')), part_size)
+    if len(groups) == 1:
+        return generate_section_content(llm, domaine, sujet, sec)
+    return merge_section_parts(sec.get('section'), [
+        generate_section_part(llm, domaine, sujet, sec, part, len(groups), group)
+        for part, group in enumerate(groups)
+    ])
 
-        Le contenu doit être structuré en JSON. Commence à générer le JSON directement sans ajouter d'autre message.
+def batch_sections(sections, indexes, max_subsections, token_budget, tokens_per_subsection, max_batch_size):
+    """
+    Group the small sections of a plan so they can share a single prompt
+    
+    A section is small when it has at most ``max_subsections`` sub-sections.
+    Consecutive small sections are packed greedily while their expected
+    output stays under ``token_budget``; the other sections get their own
+    prompt.
+    
+    Args:
+        sections: The sections of the plan
+        indexes: Indexes of the sections to generate
+        max_subsections: Maximum sub-sections of a section that can be batched
+        token_budget: Maximum expected output tokens of a batch
+        tokens_per_subsection: Expected output tokens of one sub-section
+        max_batch_size: Maximum number of sections of a batch
         
-        Voici un exemple de résultat attendu : {exemple}
-        ```json
-        """
+    Returns:
+        A list of lists of section indexes, one list per prompt
+    """
+    units = []
+    batch = []
+    batch_tokens = 0
+    for index in indexes:
+        sous_sections = _normalize_sous_sections(sections[index].get('sous-sections'))
+        count = len(sous_sections) if isinstance(sous_sections, list) else 1
+        if count > max_subsections:
+            units.append([index])
+            continue
         
+        expected_tokens = count * tokens_per_subsection
+        if batch and (batch_tokens + expected_tokens > token_budget or len(batch) >= max_batch_size):
+            units.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(index)
+        batch_tokens += expected_tokens
+    if batch:
+        units.append(batch)
+    return units
+
+def generate_section_batch(llm, domaine, sujet, batch):
+    """
+    Generate the content of several small sections with a single prompt
+    
+    The model is asked for a JSON object keyed by section id. Sections
+    missing from the answer or that fail to parse are generated again with
+    their own prompt.
+    
+    Args:
+        llm: The LLMGateway used to query the model
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        batch: List of (index, plan section) tuples
+        
+    Returns:
+        A list of (index, section_content) tuples
+    """
+    keys = [f"S{position + 1}" for position in range(len(batch))]
+    
+    descriptions = []
+    for key, (_, sec) in zip(keys, batch):
+        sous_sections = _normalize_sous_sections(sec.get('sous-sections'))
+        descriptions.append(
+            f"  {key} - {sec.get('section')} :\n"
+            f"    Sous Sections : {' // '.join(sous_sections) if isinstance(sous_sections, list) else sous_sections}"
+        )
+    
+    # Build the prompt for the whole batch
+    prompt = BATCH_PROMPT.render(
+        domaine=domaine,
+        sujet=sujet,
+        keys=", ".join(keys),
+        sections="\n".join(descriptions),
+    )
+    
+    def validate_batch(value):
+        if not isinstance(value, dict):
+            raise InvalidLLMOutput('Expected an object keyed by section id')
+        valid = {}
+        for key in keys:
+            try:
+                valid[key] = validate_section_content(value.get(key))
+            except InvalidLLMOutput:
+                pass  # Generated again below
+        return valid
+    
+    parsed = {}
+    try:
         # Get the response
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
+        response_text = llm.complete(
+            prompt,
             temperature=0.3,  # Lower temperature for more focused output
             top_p=0.9,
         )
+        # A batch missing sections is used but not cached, so the next run asks for the whole batch again
+        parsed = llm.parse_json(response_text, validate_batch, cacheable=lambda valid: len(valid) == len(keys))
+    except Cancelled:
+        raise
+    except Exception as e:
+        print(f"Error generating content for batch {[sec.get('section') for _, sec in batch]}: {str(e)}")
+    
+    results = []
+    for key, (index, sec) in zip(keys, batch):
+        section_content = parsed.get(key)
+        if section_content is None:
+            # Fall back to a dedicated prompt for this section
+            section_content = generate_section_content(llm, domaine, sujet, sec)
+        results.append((index, section_content))
+    return results
+
+def speculate_content(domaine, sujet, plan, use_cache=True):
+    """
+    Start generating the content of a plan in the background, before it is requested
+    
+    The results are kept in the speculative store of the application and
+    claimed by iter_content when the content of the same plan, or of an
+    edited version of it, is requested.
+    
+    Args:
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        plan: The presentation plan just generated
+        use_cache: False to bypass the LLM response cache
         
-        # Process the response
-        response_text = response.choices[0].message.content
-        response_text = response_text.replace("```", "").replace("json", "").strip()
+    Returns:
+        The fingerprint of the plan in the speculative store
+    """
+    sections = plan.get('sections', [])
+    llm = get_llm(use_cache, stage='content')
+    part_size = section_part_size(llm)
+    return current_app.extensions['speculation'].start(
+        'content', domaine, sujet, plan,
+        [(section_key(sec), index) for index, sec in enumerate(sections)],
+        lambda index: generate_section_in_parts(llm, domaine, sujet, sections[index], part_size),
+    )
+
+def iter_content(domaine, sujet, plan, max_workers=None, use_cache=True, heartbeat=None, reuse=None,
+                 batch=None, on_subsection=None, cancel=None):
+    """
+    Generate the content of the plan sections, yielding each one when ready
+    
+    Sections are generated concurrently, with at most ``max_workers`` LLM
+    calls in flight, and yielded in completion order. Sections found in
+    ``reuse`` are yielded first, without calling the LLM. Sections already
+    generated in the background (see speculate_content) are taken from the
+    speculative store; the others are generated, small sections sharing a
+    prompt (see batch_sections) and sections too large for the output
+    budget of the model being split in groups of sub-sections generated
+    concurrently, then merged (see split_subsections).
+    
+    Args:
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        plan: The presentation plan structure previously generated
+        max_workers: Maximum number of concurrent section requests
+            (defaults to CONTENT_MAX_WORKERS, 1 generates sequentially)
+        use_cache: False to bypass the LLM response cache
+        heartbeat: Optional number of seconds after which None is yielded
+            while no section completed
+        reuse: Optional dict of section index -> already generated content
+            (see reuse_previous_content)
+        batch: Whether to batch small sections (defaults to CONTENT_BATCH_ENABLED)
+        on_subsection: Optional function called as on_subsection(index, subsection)
+            for each sub-section streamed before its section completes; it
+            runs in the consuming thread, and None is yielded after it
+        cancel: Optional CancelToken; once cancelled, no new LLM call is
+            sent, streamed answers are closed and iteration stops, leaving
+            the sections not yielded yet without content
         
-        try:
-            section_content = json_repair.loads(response_text)
-            content.append(section_content)
-        except Exception as e:
-            print(f"Error parsing JSON for section '{section}': {str(e)}")
-            print(f"Raw response: {response_text}")
-            # Add a basic structure to avoid breaking the application
-            content.append({
-                "title": section,
-                "subsections": [
-                    {
-                        "title": subsection,
-                        "content": "Contenu non disponible. Erreur lors de la génération."
-                    } for subsection in sous_sections if isinstance(sous_sections, list)
-                ]
-            })
+    Yields:
+        (index, section_content) tuples, index being the position in the plan
+    """
+    # Get configuration from Flask config
+    if max_workers is None:
+        max_workers = current_app.config['CONTENT_MAX_WORKERS']
+    if batch is None:
+        batch = current_app.config['CONTENT_BATCH_ENABLED']
+    
+    sections = plan.get('sections', [])
+    reuse = reuse or {}
+    llm = get_llm(use_cache, stage='content', cancel=cancel)
+    
+    for index in sorted(reuse):
+        yield index, reuse[index]
+    
+    # Sections generated in the background since the plan was returned
+    remaining = [index for index in range(len(sections)) if index not in reuse]
+    speculative = current_app.extensions['speculation'].claim(
+        'content', domaine, sujet, plan, {index: section_key(sections[index]) for index in remaining})
+    
+    # Only the added or changed sections go to the LLM
+    pending = [index for index in remaining if index not in speculative]
+    if batch:
+        config = current_app.config
+        units = batch_sections(
+            sections, pending,
+            max_subsections=config['CONTENT_BATCH_MAX_SUBSECTIONS'],
+            token_budget=config['CONTENT_BATCH_TOKEN_BUDGET'],
+            tokens_per_subsection=config['CONTENT_TOKENS_PER_SUBSECTION'],
+            max_batch_size=config['CONTENT_BATCH_MAX_SECTIONS'],
+        )
+    else:
+        units = [[index] for index in pending]
+    
+    # Sections too large for one answer of the model are generated in parts
+    part_size = section_part_size(llm)
+    parts_content = {}
+    chunked_units = []
+    for unit in units:
+        groups = [unit]
+        if len(unit) == 1:
+            groups = split_subsections(_normalize_sous_sections(sections[unit[0]].get('sous-sections')), part_size)
+        if len(groups) == 1:
+            chunked_units.append(unit)
+            continue
+        parts_content[unit[0]] = [None] * len(groups)
+        chunked_units.extend(SectionPart(unit[0], part, len(groups), group) for part, group in enumerate(groups))
+    units = chunked_units
+    
+    # Finished speculative sections first, the new ones, then those still in flight
+    done = {index for index, future in speculative.items() if future.done()}
+    units = ([[index] for index in sorted(done)] + units
+             + [[index] for index in sorted(speculative) if index not in done])
+    
+    # Streamed sub-sections are handed over from the workers through a queue
+    events = queue.Queue() if on_subsection is not None else None
+    
+    def generate(unit):
+        if isinstance(unit, SectionPart):
+            report = (lambda subsection: events.put((unit.index, subsection))) if events is not None else None
+            return [(unit, generate_section_part(llm, domaine, sujet, sections[unit.index], unit.part,
+                                                 unit.parts, unit.sous_sections, report))]
+        if len(unit) == 1:
+            index = unit[0]
+            if index in speculative:
+                section_content = claimed_result(speculative[index])
+                if section_content is not None and not is_fallback_section(section_content):
+                    return [(index, section_content)]
+                return [(index, generate_section_in_parts(llm, domaine, sujet, sections[index], part_size))]
+            report = (lambda subsection: events.put((index, subsection))) if events is not None else None
+            return [(index, generate_section_content(llm, domaine, sujet, sections[index], report))]
+        return generate_section_batch(llm, domaine, sujet, [(index, sections[index]) for index in unit])
+    
+    for item in iter_parallel(generate, units, max_workers, heartbeat, events, cancel):
+        if item is None:
+            yield None
+            continue
+        unit_index, results = item
+        if unit_index is None:
+            on_subsection(*results)
+            yield None
+            continue
+        for index, section_content in results:
+            if isinstance(index, SectionPart):
+                part = index
+                parts = parts_content[part.index]
+                parts[part.part] = section_content
+                if any(content is None for content in parts):
+                    continue
+                index, section_content = part.index, merge_section_parts(sections[part.index].get('section'), parts)
+            yield index, section_content
+
+def generate_content(domaine, sujet, plan, max_workers=None, use_cache=True, previous_plan=None,
+                     previous_content=None):
+    """
+    Generate detailed content for each section in the plan
+    
+    Sections are generated concurrently (see iter_content) and returned in
+    plan order. When the previous version of the plan and its content are
+    given, only the added or changed sections are generated again.
+    
+    Args:
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        plan: The presentation plan structure previously generated
+        max_workers: Maximum number of concurrent section requests
+            (defaults to CONTENT_MAX_WORKERS, 1 generates sequentially)
+        use_cache: False to bypass the LLM response cache
+        previous_plan: Optional plan the previous content was generated from
+        previous_content: Optional content previously generated for previous_plan
+        
+    Returns:
+        A list containing detailed content for each section
+    """
+    content = [None] * len(plan.get('sections', []))
+    reuse = reuse_previous_content(plan, previous_plan, previous_content)
+    
+    # Process each section in the plan
+    for index, section_content in iter_content(domaine, sujet, plan, max_workers, use_cache, reuse=reuse):
+        content[index] = section_content
     
-    return content
\ No newline at end of file
+    return content
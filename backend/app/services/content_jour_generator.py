@@ -1,7 +1,14 @@
 # app/services/content_jour_generator.py
-from openai import OpenAI
-import json_repair
+import queue
 from flask import current_app
+from app.services.content_generator import FALLBACK_CONTENT, is_fallback_section
+from app.services.llm_client import get_llm
+from app.services.json_stream import stream_json
+from app.services.llm_parsing import InvalidLLMOutput, validate_section_content
+from app.services.plan_diff import session_key
+from app.services.prompts import register_prompt, to_json
+from app.services.speculation import claimed_result
+from app.utils.concurrency import Cancelled, iter_parallel
 
 # Example content structure for demonstration
 exemple_contenu = [
@@ -30,92 +37,269 @@ exemple_contenu = [
     }
 ]
 
-def generate_content_jour(domaine, sujet, plan_jour):
+# Static instructions first, the fields of the call last (see PromptTemplate)
+SESSION_PROMPT = register_prompt(
+    "content_jour.session",
+    prefix=f"""
+    Tu es un formateur expert dans le domaine indiqué à la fin de ce message.
+    Ton objectif est de générer le contenu pédagogique détaillé pour une session d'une formation organisée en jours. Le sujet de la formation, le jour et la session à développer sont indiqués à la fin de ce message.
+
+    Pour chaque sous-section :
+    1. Rédige une explication détaillée de tous les concepts d'une façon claire et progressive.
+    2. Ajoute des exemples bien commentés quand c'est pertinent.
+    3. Utilise des tableaux pour synthétiser les informations complexes.
+    4. Si applicable, inclus des points clés sous forme de liste à puces.
+    5. Pour les sujets techniques, ajoute des exemples de code quand c'est approprié.
+
+    Le contenu doit être structuré en JSON selon le format suivant. Commence à générer le JSON directement sans ajouter d'autre message.
+
+    Voici un exemple de résultat attendu : {to_json(exemple_contenu)}
+    """,
+    suffix="""
+    Domaine : {domaine}
+    Sujet de la formation : {sujet}
+    Jour : {day_number}
+
+    Voici la session à développer :
+      Session : {session_title}
+
+      Sous-sections : {subsections}
+
+    ```json
+    """,
+)
+
+def fallback_session(session_title, subsections):
+    """Basic session structure used when the generation of a session fails"""
+    return {
+        "title": session_title,
+        "subsections": [
+            {
+                "title": subsection,
+                "content": FALLBACK_CONTENT
+            } for subsection in subsections if isinstance(subsections, list)
+        ]
+    }
+
+def generate_session_content(llm, domaine, sujet, day_number, session, on_subsection=None):
     """
-    Generate detailed content for each session in the daily plan
+    Generate the detailed content of a single session of a day
+    
+    With a streaming gateway, each sub-section is reported as soon as it is
+    complete and a malformed answer is aborted early.
     
     Args:
+        llm: The LLMGateway used to query the model
         domaine: The domain/field (e.g., "Java", "Python", etc.)
         sujet: The specific subject of the presentation
-        plan_jour: The daily presentation plan structure previously generated
+        day_number: The number of the day the session belongs to
+        session: The plan session ({"title": ..., "subsections": [...]})
+        on_subsection: Optional function called with each streamed sub-section
         
     Returns:
-        A list containing detailed content for each day, with each day containing sessions
+        The parsed content of the session, or the fallback structure on failure
     """
-    # Get API configuration from Flask config
-    api_key = current_app.config['API_KEY']
-    base_url = current_app.config['BASE_URL']
-    model = current_app.config['MODEL']
-    
-    all_days_content = []
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    
-    # Process each day in the plan
-    for day in plan_jour:
-        day_number = day.get('jour')
-        sessions = day.get('sessions', [])
-        
-        day_content = []
-        
-        # Process each session for this day
-        for session in sessions:
-            session_title = session.get('title')
-            subsections = session.get('subsections', [])
-            
-            # Build the prompt for this session
-            prompt = f"""
-            Tu es un formateur expert en {domaine}.
-            Ton objectif est de générer le contenu pédagogique détaillé pour la session suivante, qui fait partie du jour {day_number} d'une présentation sur le sujet {sujet}.
+    session_title = session.get('title')
+    subsections = session.get('subsections', [])
+    
+    # Build the prompt for this session
+    prompt = SESSION_PROMPT.render(
+        domaine=domaine,
+        sujet=sujet,
+        day_number=day_number,
+        session_title=session_title,
+        subsections=", ".join(subsections) if isinstance(subsections, list) else subsections,
+    )
+    
+    try:
+        # Get the response
+        if llm.streaming:
+            response_text = stream_json(
+                llm, prompt, on_subsection,
+                temperature=0.3,  # Lower temperature for more focused output
+                top_p=0.9,
+            )
+        else:
+            response_text = llm.complete(
+                prompt,
+                temperature=0.3,  # Lower temperature for more focused output
+                top_p=0.9,
+            )
+    except Cancelled:
+        raise
+    except Exception as e:
+        print(f"Error generating content for session '{session_title}' on day {day_number}: {str(e)}")
+        return fallback_session(session_title, subsections)
+    
+    # Process the response
+    try:
+        return llm.parse_json(response_text, validate_section_content)
+    except InvalidLLMOutput as e:
+        print(f"Error parsing JSON for session '{session_title}' on day {day_number}: {str(e)}")
+        print(f"Raw response: {response_text}")
+        # Add a basic structure to avoid breaking the application
+        return fallback_session(session_title, subsections)
 
-            Voici la session à développer :
-              Session : {session_title}
+def schedule_sessions(plan_jour, day_priority=None):
+    """
+    Flatten a daily plan into an ordered list of session tasks
+    
+    Sessions of the days listed in ``day_priority`` are scheduled first, in
+    the given order; the other days follow in plan order.
+    
+    Args:
+        plan_jour: The daily presentation plan structure
+        day_priority: Optional list of day numbers to generate first
+        
+    Returns:
+        A list of (day_index, session_index, day_number, session) tuples
+    """
+    day_priority = list(day_priority or [])
+    
+    def rank(day_index):
+        day_number = plan_jour[day_index].get('jour', day_index + 1)
+        if day_number in day_priority:
+            return day_priority.index(day_number)
+        return len(day_priority)
+    
+    tasks = []
+    for day_index in sorted(range(len(plan_jour)), key=lambda index: (rank(index), index)):
+        day = plan_jour[day_index]
+        for session_index, session in enumerate(day.get('sessions', [])):
+            tasks.append((day_index, session_index, day.get('jour'), session))
+    return tasks
 
-              Sous-sections : {", ".join(subsections) if isinstance(subsections, list) else subsections}
+def speculate_content_jour(domaine, sujet, plan_jour, use_cache=True):
+    """
+    Start generating the content of a daily plan in the background, before it is requested
+    
+    The results are kept in the speculative store of the application and
+    claimed by iter_content_jour when the content of the same plan, or of
+    an edited version of it, is requested.
+    
+    Args:
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        plan_jour: The daily presentation plan just generated
+        use_cache: False to bypass the LLM response cache
+        
+    Returns:
+        The fingerprint of the plan in the speculative store
+    """
+    tasks = schedule_sessions(plan_jour)
+    llm = get_llm(use_cache, stage='content_jour')
+    return current_app.extensions['speculation'].start(
+        'content_jour', domaine, sujet, plan_jour,
+        [(session_key(day_number, session), (day_number, session)) for _, _, day_number, session in tasks],
+        lambda item: generate_session_content(llm, domaine, sujet, *item),
+    )
 
-            Pour chaque sous-section :
-            1. Rédige une explication détaillée de tous les concepts d'une façon claire et progressive.
-            2. Ajoute des exemples bien commentés quand c'est pertinent.
-            3. Utilise des tableaux pour synthétiser les informations complexes.
-            4. Si applicable, inclus des points clés sous forme de liste à puces.
-            5. Pour les sujets techniques, ajoute des exemples de code quand c'est approprié.
+def iter_content_jour(domaine, sujet, plan_jour, max_workers=None, day_priority=None, use_cache=True,
+                      heartbeat=None, on_subsection=None, cancel=None, reuse=None):
+    """
+    Generate the content of every session of the daily plan, yielding each one when ready
+    
+    The sessions of all days share one worker pool, capped at ``max_workers``
+    concurrent LLM calls, and are started in the order of schedule_sessions.
+    Sessions found in ``reuse`` are yielded first, without calling the LLM;
+    sessions already generated in the background (see speculate_content_jour)
+    are taken from the speculative store.
+    
+    Args:
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        plan_jour: The daily presentation plan structure previously generated
+        max_workers: Maximum number of concurrent session requests
+            (defaults to CONTENT_JOUR_MAX_WORKERS, 1 generates sequentially)
+        day_priority: Optional list of day numbers whose sessions are generated first
+        use_cache: False to bypass the LLM response cache
+        heartbeat: Optional number of seconds after which None is yielded
+            while no session completed
+        on_subsection: Optional function called as
+            on_subsection(day_index, session_index, subsection) for each
+            sub-section streamed before its session completes; it runs in the
+            consuming thread, and None is yielded after it
+        cancel: Optional CancelToken; once cancelled, no new LLM call is
+            sent, streamed answers are closed and iteration stops, leaving
+            the sessions not yielded yet without content
+        reuse: Optional dict of (day_index, session_index) -> already generated
+            content (e.g. the sessions of a resumed run)
+        
+    Yields:
+        (day_index, session_index, session_content) tuples in completion order
+    """
+    # Get configuration from Flask config
+    if max_workers is None:
+        max_workers = current_app.config['CONTENT_JOUR_MAX_WORKERS']
+    
+    llm = get_llm(use_cache, stage='content_jour', cancel=cancel)
+    reuse = reuse or {}
+    
+    for day_index, session_index in sorted(reuse):
+        yield day_index, session_index, reuse[(day_index, session_index)]
+    
+    # Only the sessions without content go to the LLM
+    tasks = [task for task in schedule_sessions(plan_jour, day_priority) if (task[0], task[1]) not in reuse]
+    
+    # Sessions generated in the background since the plan was returned
+    speculative = current_app.extensions['speculation'].claim(
+        'content_jour', domaine, sujet, plan_jour,
+        {task_index: session_key(day_number, session)
+         for task_index, (_, _, day_number, session) in enumerate(tasks)})
+    # Finished speculative sessions first, then the others in schedule order
+    done = {task_index for task_index, future in speculative.items() if future.done()}
+    order = sorted(range(len(tasks)), key=lambda task_index: task_index not in done)
+    
+    # Streamed sub-sections are handed over from the workers through a queue
+    events = queue.Queue() if on_subsection is not None else None
+    
+    def generate(task_index):
+        day_index, session_index, day_number, session = tasks[task_index]
+        if task_index in speculative:
+            session_content = claimed_result(speculative[task_index])
+            if session_content is not None and not is_fallback_section(session_content):
+                return session_content
+        report = None
+        if events is not None:
+            report = lambda subsection: events.put((day_index, session_index, subsection))
+        return generate_session_content(llm, domaine, sujet, day_number, session, report)
+    
+    for item in iter_parallel(generate, order, max_workers, heartbeat, events, cancel):
+        if item is None:
+            yield None
+            continue
+        position, session_content = item
+        if position is None:
+            on_subsection(*session_content)
+            yield None
+            continue
+        day_index, session_index, _, _ = tasks[order[position]]
+        yield day_index, session_index, session_content
 
-            Le contenu doit être structuré en JSON selon le format suivant. Commence à générer le JSON directement sans ajouter d'autre message.
-            
-            Voici un exemple de résultat attendu : {exemple_contenu}
-            ```json
-            """
-            
-            # Get the response
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.3,  # Lower temperature for more focused output
-                top_p=0.9,
-            )
-            
-            # Process the response
-            response_text = response.choices[0].message.content
-            response_text = response_text.replace("```", "").replace("json", "").strip()
-            
-            try:
-                session_content = json_repair.loads(response_text)
-                day_content.append(session_content)
-            except Exception as e:
-                print(f"Error parsing JSON for session '{session_title}' on day {day_number}: {str(e)}")
-                print(f"Raw response: {response_text}")
-                # Add a basic structure to avoid breaking the application
-                day_content.append({
-                    "title": session_title,
-                    "subsections": [
-                        {
-                            "title": subsection,
-                            "content": "Contenu non disponible. Erreur lors de la génération."
-                        } for subsection in subsections if isinstance(subsections, list)
-                    ]
-                })
+def generate_content_jour(domaine, sujet, plan_jour, max_workers=None, day_priority=None, use_cache=True):
+    """
+    Generate detailed content for each session in the daily plan
+    
+    Sessions are generated concurrently (see iter_content_jour); the nested
+    result keeps the plan order whatever the completion order.
+    
+    Args:
+        domaine: The domain/field (e.g., "Java", "Python", etc.)
+        sujet: The specific subject of the presentation
+        plan_jour: The daily presentation plan structure previously generated
+        max_workers: Maximum number of concurrent session requests
+            (defaults to CONTENT_JOUR_MAX_WORKERS, 1 generates sequentially)
+        day_priority: Optional list of day numbers whose sessions are generated first
+        use_cache: False to bypass the LLM response cache
         
-        all_days_content.append(day_content)
+    Returns:
+        A list containing detailed content for each day, with each day containing sessions
+    """
+    # Pre-allocate the [day][session] structure so results land in plan order
+    all_days_content = [[None] * len(day.get('sessions', [])) for day in plan_jour]
+    
+    for day_index, session_index, session_content in iter_content_jour(
+            domaine, sujet, plan_jour, max_workers, day_priority, use_cache):
+        all_days_content[day_index][session_index] = session_content
     
-    return all_days_content
\ No newline at end of file
+    return all_days_content
@@ -0,0 +1,206 @@
+# app/services/document.py
+
+
+class InvalidDocument(ValueError):
+    """Raised when the content to render does not have the expected structure."""
+
+
+class Block:
+    """A piece of a sub-section, rendered in the order of the sub-section"""
+    TEXT = 'text'        # value: str
+    EXAMPLE = 'example'  # value: str
+    BULLETS = 'bullets'  # value: tuple of str
+    CODE = 'code'        # value: tuple of lines
+    TABLE = 'table'      # value: tuple of rows, each a tuple of str; the first row is the header
+
+    __slots__ = ('kind', 'value')
+
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+
+    def __repr__(self):
+        return f"Block({self.kind!r}, {self.value!r})"
+
+
+class Subsection:
+    __slots__ = ('title', 'blocks')
+
+    def __init__(self, title, blocks=()):
+        self.title = title
+        self.blocks = tuple(blocks)
+
+
+class Section:
+    __slots__ = ('title', 'subsections')
+
+    def __init__(self, title, subsections=()):
+        self.title = title
+        self.subsections = tuple(subsections)
+
+
+class Day:
+    """The sections of a day of training, or all the sections of a course not organized in days"""
+    __slots__ = ('number', 'sections')
+
+    def __init__(self, number, sections=()):
+        self.number = number
+        self.sections = tuple(sections)
+
+
+class Course:
+    """
+    Content to render to PDF and PPTX, built once per request by build_course or build_course_jour
+
+    The generated content is normalized into Day, Section, Subsection and
+    Block nodes; the renderers only walk these nodes, without checking the
+    types of the fields or their variants ("code" or "code_example", code as
+    a string or a list of lines).
+    """
+    __slots__ = ('title', 'trainer', 'days', 'daily')
+
+    def __init__(self, title, trainer, days=(), daily=False):
+        self.title = title
+        self.trainer = trainer
+        self.days = tuple(days)
+        self.daily = daily
+
+    @property
+    def sections(self):
+        """All the sections of the course, in order"""
+        return [section for day in self.days for section in day.sections]
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return "\n".join(str(item) for item in value if item is not None)
+    return str(value)
+
+
+def _code_lines(code):
+    if isinstance(code, (list, tuple)):
+        return tuple(_text(line) for line in code)
+    return tuple(_text(code).strip("\n").split("\n"))
+
+
+def _table_rows(table):
+    if not isinstance(table, (list, tuple)):
+        return ()
+    rows = []
+    for row in table:
+        if isinstance(row, dict):
+            row = list(row.values())
+        elif not isinstance(row, (list, tuple)):
+            row = [row]
+        if row:
+            rows.append(tuple(_text(cell) for cell in row))
+    return tuple(rows)
+
+
+def build_subsection(subsection):
+    """
+    Normalize a generated sub-section
+
+    Args:
+        subsection: A {"title", "content", "example", "bullets", "code" or
+            "code_example", "table"} dict, every field optional, or a title
+
+    Returns:
+        A Subsection with its non-empty blocks
+    """
+    if isinstance(subsection, str):
+        return Subsection(subsection)
+    if not isinstance(subsection, dict):
+        raise InvalidDocument(f"Invalid sub-section: {subsection!r:.80}")
+
+    blocks = []
+    if subsection.get("content"):
+        blocks.append(Block(Block.TEXT, _text(subsection["content"])))
+    if subsection.get("example"):
+        blocks.append(Block(Block.EXAMPLE, _text(subsection["example"])))
+
+    bullets = subsection.get("bullets")
+    if isinstance(bullets, str):
+        bullets = [bullets]
+    if isinstance(bullets, (list, tuple)):
+        bullets = tuple(_text(point) for point in bullets if point is not None)
+        if bullets:
+            blocks.append(Block(Block.BULLETS, bullets))
+
+    code = subsection.get("code") or subsection.get("code_example")
+    if code:
+        blocks.append(Block(Block.CODE, _code_lines(code)))
+
+    rows = _table_rows(subsection.get("table"))
+    if rows:
+        blocks.append(Block(Block.TABLE, rows))
+
+    return Subsection(_text(subsection.get("title")) or "Sous-section", blocks)
+
+
+def build_section(section):
+    """Normalize a generated {"title", "subsections"} section into a Section"""
+    if not isinstance(section, dict):
+        raise InvalidDocument(f"Invalid section: {section!r:.80}")
+    subsections = section.get("subsections") or []
+    if not isinstance(subsections, list):
+        raise InvalidDocument(f"Sub-sections of '{section.get('title')}' are not a list")
+    return Section(_text(section.get("title")) or "Sans titre",
+                   [build_subsection(subsection) for subsection in subsections if subsection is not None])
+
+
+def _build_sections(item):
+    """The sections of a generated item: a list of sections, a single one, or None when it was not generated"""
+    if item is None:
+        return []
+    if isinstance(item, dict):
+        item = [item]
+    if not isinstance(item, list):
+        raise InvalidDocument(f"Expected a list of sections, got {type(item).__name__}")
+    return [build_section(section) for section in item if section is not None]
+
+
+def build_course(title, trainer, contenu):
+    """
+    Build the Course of the content generated for a plan
+
+    Args:
+        title: Title of the presentation
+        trainer: Name of the presenter
+        contenu: The generated content, one list of sections per plan section
+
+    Returns:
+        A Course with a single Day without number
+    """
+    if not isinstance(contenu, list):
+        raise InvalidDocument("The content must be a list")
+    sections = [section for item in contenu for section in _build_sections(item)]
+    return Course(_text(title), _text(trainer), [Day(None, sections)])
+
+
+def build_course_jour(title, trainer, contenu_jour):
+    """
+    Build the Course of the content generated for a daily plan
+
+    Args:
+        title: Title of the presentation
+        trainer: Name of the presenter
+        contenu_jour: The generated content, one list per day of lists of sections per session
+
+    Returns:
+        A Course with one Day per day, numbered from 1
+    """
+    if not isinstance(contenu_jour, list):
+        raise InvalidDocument("The content must be a list of days")
+    days = []
+    for day_index, day_content in enumerate(contenu_jour):
+        if day_content is None:
+            day_content = []
+        if not isinstance(day_content, list):
+            raise InvalidDocument(f"Day {day_index + 1} is not a list of sessions")
+        days.append(Day(day_index + 1, [section for item in day_content for section in _build_sections(item)]))
+    return Course(_text(title), _text(trainer), days, daily=True)
@@ -0,0 +1,225 @@
+# app/services/jobs.py
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.concurrency import Cancelled, CancelToken
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+class Job:
+    """
+    A generation task run in the background
+
+    The runner function receives the job and can publish partial results
+    and progress while it runs. It stops its work when ``job.cancel`` is
+    cancelled (see JobManager.cancel).
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'  # queued, running, succeeded, failed, cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.partial = None
+        self.completed = 0
+        self.total = None
+        self.cancel = CancelToken()
+        self._lock = threading.Lock()
+
+    def set_progress(self, completed, total=None, partial=None):
+        """Publish the progress of the job and, optionally, its partial result"""
+        with self._lock:
+            self.completed = completed
+            if total is not None:
+                self.total = total
+            if partial is not None:
+                self.partial = partial
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def to_dict(self):
+        """Return a JSON-serializable snapshot of the job"""
+        with self._lock:
+            now = time.time()
+            data = {
+                'job_id': self.id,
+                'type': self.kind,
+                'status': self.status,
+                'progress': {'completed': self.completed, 'total': self.total},
+                'timing': {
+                    'created_at': self.created_at,
+                    'started_at': self.started_at,
+                    'finished_at': self.finished_at,
+                    'queue_seconds': round((self.started_at or now) - self.created_at, 2),
+                    'execution_time_seconds': round((self.finished_at or now) - self.started_at, 2)
+                    if self.started_at else None,
+                },
+            }
+            if self.status == 'succeeded':
+                data['result'] = self.result
+            elif self.status == 'cancelled' and self.result is not None:
+                # The partial result of the work done before the cancellation
+                data['result'] = self.result
+            else:
+                if self.status == 'failed':
+                    data['error'] = self.error
+                if self.partial is not None:
+                    data['partial'] = _snapshot(self.partial)
+            return data
+
+
+class ProgressRelay:
+    """
+    Stands in for the job of a generation shared by several requests (see SingleFlight)
+
+    The generation reports its progress to the relay, which forwards it to
+    the job of every request sharing it; its token is the one of the request
+    running the generation.
+    """
+
+    def __init__(self, cancel, publish):
+        self.cancel = cancel
+        self._publish = publish
+
+    def set_progress(self, completed, total=None, partial=None):
+        """See Job.set_progress"""
+        self._publish(completed, total, partial)
+
+
+def _snapshot(partial):
+    """Copy the list containers of a partial result so it can be serialized while the job runs"""
+    if isinstance(partial, list):
+        return [_snapshot(item) if isinstance(item, list) else item for item in partial]
+    return partial
+
+
+class JobManager:
+    """
+    Bounded background worker pool for generation jobs
+
+    Jobs run inside an application context of ``app``. Finished jobs are
+    kept ``result_ttl`` seconds and then forgotten. Job state lives in the
+    memory of the process, so status requests must reach the worker process
+    that accepted the job.
+    """
+
+    def __init__(self, app, max_workers=4, result_ttl=3600, max_pending=100):
+        self.app = app
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, runner):
+        """
+        Queue a job
+
+        Args:
+            kind: The type of job (e.g. "content")
+            runner: Function called with the Job, returning the JSON-serializable result
+
+        Returns:
+            The queued Job
+
+        Raises:
+            JobQueueFull: If max_pending jobs are already waiting
+        """
+        self.purge_expired()
+        job = Job(kind)
+        with self._lock:
+            pending = sum(1 for other in self._jobs.values() if other.status == 'queued')
+            if pending >= self.max_pending:
+                raise JobQueueFull(f'Too many pending jobs ({pending})')
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def get(self, job_id):
+        """Return a job by id, or None if unknown or expired"""
+        self.purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: a queued job will not run, a running job stops its remaining LLM calls
+
+        Returns:
+            The Job, or None if unknown or expired
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel.cancel('job cancelled')
+        with job._lock:
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        return job
+
+    def purge_expired(self):
+        """Forget the jobs finished more than result_ttl seconds ago"""
+        limit = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < limit]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def _run(self, job, runner):
+        with job._lock:
+            if job.status == 'cancelled':
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        try:
+            with self.app.app_context():
+                result = runner(job)
+            job.result = result
+            job.status = 'cancelled' if job.cancel.cancelled and job.cancel.reason == 'job cancelled' else 'succeeded'
+        except Cancelled:
+            # Cancelled while waiting for an identical generation; its progress stays in the partial result
+            job.status = 'cancelled'
+        except Exception as e:
+            print(f"Error in {job.kind} job {job.id}: {str(e)}")
+            print(traceback.format_exc())
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def init_job_manager(app):
+    """
+    Create the background job manager of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The JobManager stored in app.extensions['jobs']
+    """
+    manager = JobManager(
+        app,
+        max_workers=app.config['JOB_MAX_WORKERS'],
+        result_ttl=app.config['JOB_RESULT_TTL'],
+        max_pending=app.config['JOB_MAX_PENDING'],
+    )
+    app.extensions['jobs'] = manager
+    return manager
@@ -0,0 +1,156 @@
+# app/services/json_stream.py
+import json
+
+
+class MalformedStream(ValueError):
+    """Raised when a streamed answer cannot be the expected JSON document."""
+
+
+class IncrementalJSONParser:
+    """
+    Incremental scanner of a JSON document streamed by an LLM
+
+    Text chunks are fed as they arrive. Every object of an array stored
+    under ``emit_key`` (the sub-sections of a section) is decoded as soon
+    as its closing brace arrives, so it can be used before the end of the
+    answer. The scanner only tracks the nesting of the document: the full
+    text is still parsed once complete.
+
+    An answer is rejected as soon as it is obviously not the expected
+    document: too much text before the opening bracket, or a closing
+    bracket that does not match the opened one. Python-style answers
+    (single-quoted strings) are left to the repair step of the final parse.
+    """
+
+    def __init__(self, emit_key='subsections', max_preamble=200):
+        self.emit_key = emit_key
+        self.max_preamble = max_preamble
+        self.text = ''
+        self.finished = False
+        self._pos = 0
+        self._root = None  # Offset of the opening bracket of the document
+        self._stack = []  # Open containers: [bracket, key, expect_key, emit_start]
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._lenient = False
+
+    def feed(self, chunk):
+        """
+        Scan a new chunk of the answer
+
+        Args:
+            chunk: The text received since the previous call
+
+        Returns:
+            The list of objects completed by this chunk
+
+        Raises:
+            MalformedStream: If the answer cannot be the expected JSON document
+        """
+        self.text += chunk
+        completed = []
+        text = self.text
+        for pos in range(self._pos, len(text)):
+            if self.finished or self._lenient:
+                break
+            char = text[pos]
+
+            if self._root is None:
+                if char in '{[':
+                    self._root = pos
+                    self._open(char, pos)
+                elif pos >= self.max_preamble:
+                    raise MalformedStream(f'No JSON document in the first {self.max_preamble} characters')
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string(pos)
+                continue
+
+            frame = self._stack[-1]
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == "'" and frame[0] == '{' and frame[2]:
+                # Python-style keys, the scanner cannot follow these strings
+                self._lenient = True
+            elif char in '{[':
+                self._open(char, pos)
+            elif char in '}]':
+                if (frame[0], char) not in (('{', '}'), ('[', ']')):
+                    raise MalformedStream(f'Unexpected {char!r} at offset {pos}')
+                self._stack.pop()
+                if frame[3] is not None:
+                    item = self._decode(text[frame[3]:pos + 1])
+                    if isinstance(item, dict):
+                        completed.append(item)
+                if not self._stack:
+                    self.finished = True
+            elif frame[0] == '{':
+                if char == ':':
+                    frame[2] = False
+                elif char == ',':
+                    frame[2] = True
+        self._pos = len(text)
+        return completed
+
+    def _open(self, bracket, pos):
+        parent = self._stack[-1] if self._stack else None
+        key = parent[1] if parent is not None and parent[0] == '{' else None
+        emit_start = None
+        if bracket == '{' and parent is not None and parent[0] == '[' and parent[1] == self.emit_key:
+            emit_start = pos
+        # Arrays remember the key they are stored under, objects the key being read
+        self._stack.append([bracket, key if bracket == '[' else None, bracket == '{', emit_start])
+
+    def _close_string(self, pos):
+        frame = self._stack[-1]
+        if frame[0] == '{' and frame[2]:
+            frame[1] = self._decode(self.text[self._string_start:pos + 1])
+
+    @staticmethod
+    def _decode(text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            # Left to the final parse of the whole answer
+            return None
+
+
+def stream_json(llm, prompt, on_object=None, emit_key='subsections', **options):
+    """
+    Stream a completion through an IncrementalJSONParser
+
+    A malformed answer is aborted mid-stream: the connection is closed and
+    the rest of the completion is never generated.
+
+    Args:
+        llm: The LLMGateway used to query the model
+        prompt: The user prompt
+        on_object: Optional function called with each object completed under emit_key
+        emit_key: Key of the arrays whose objects are reported
+        **options: Sampling options passed to LLMGateway.stream
+
+    Returns:
+        The full text of the answer
+
+    Raises:
+        MalformedStream: If the answer was aborted
+    """
+    parser = IncrementalJSONParser(emit_key)
+    chunks = llm.stream(prompt, **options)
+    try:
+        for chunk in chunks:
+            for item in parser.feed(chunk):
+                if on_object is not None:
+                    on_object(item)
+    finally:
+        chunks.close()
+    return parser.text
@@ -0,0 +1,196 @@
+# app/services/llm_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+class LLMCache:
+    """
+    Content-addressed on-disk cache of LLM responses
+
+    Entries are keyed by a hash of the model, the messages and the sampling
+    parameters, and stored as one JSON file each. Entries older than ``ttl``
+    seconds are treated as misses and removed; their age is counted from
+    ``created_at``, which is also the modification time of the file, as it
+    is never modified after being written. Reading an entry refreshes its
+    access time, which is used as the LRU order when the total size goes
+    over ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    @staticmethod
+    def make_key(model, messages, temperature=None, top_p=None):
+        """Hash the parameters that determine a completion"""
+        payload = json.dumps({
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "top_p": top_p,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def get(self, key):
+        """
+        Return the cached response text for a key, or None on a miss
+
+        Args:
+            key: A key built with make_key
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is not None and time.time() - entry.get('created_at', 0) > self.ttl:
+            self._remove(path)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # Refresh the LRU position of the entry, keeping its modification time for the TTL
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+        return entry.get('text')
+
+    def set(self, key, text, model=None):
+        """
+        Store a response text, evicting old entries if the cache is full
+
+        Args:
+            key: A key built with make_key
+            text: The response text to store
+            model: The model that produced the response (informational)
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({
+            "created_at": time.time(),
+            "model": model,
+            "text": text,
+        }, ensure_ascii=False)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += os.path.getsize(path) - previous_size
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def delete(self, key):
+        """Remove the entry of a key, if any"""
+        self._remove(self._path(key))
+
+    def evict(self):
+        """Remove expired entries, then the least recently used ones until under max_bytes"""
+        now = time.time()
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # Expired entries first, then the least recently read ones
+            expired = now - stat.st_mtime > self.ttl
+            entries.append((not expired, stat.st_atime, stat.st_size, path))
+
+        # Rescan the total, other workers may share the same directory
+        total = sum(size for _, _, size, _ in entries)
+        removed = 0
+        for fresh, _, size, path in sorted(entries):
+            if total <= self.max_bytes and fresh:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._size = total
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        """Remove every entry"""
+        for path in list(self._entries()):
+            self._remove(path)
+
+    def stats(self):
+        """Return the hit/miss counters and the current size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+            }
+
+
+def init_llm_cache(app):
+    """
+    Create the LLM response cache of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The LLMCache stored in app.extensions['llm_cache'], or None if disabled
+    """
+    cache = None
+    if app.config['LLM_CACHE_ENABLED']:
+        cache = LLMCache(
+            app.config['LLM_CACHE_FOLDER'],
+            max_bytes=app.config['LLM_CACHE_MAX_BYTES'],
+            ttl=app.config['LLM_CACHE_TTL'],
+        )
+    app.extensions['llm_cache'] = cache
+    return cache
@@ -0,0 +1,476 @@
+# app/services/llm_client.py
+import time
+import uuid
+import threading
+import httpx
+from openai import OpenAI
+from flask import current_app
+from app.services.llm_cache import LLMCache
+from app.services.llm_parsing import InvalidLLMOutput, parse_llm_json
+from app.services.resilience import DeadlineExceeded
+from app.utils.concurrency import Cancelled
+from app.utils.helpers import estimate_tokens
+
+
+class LLMClientRegistry:
+    """
+    Process-wide registry of pooled OpenAI clients
+
+    One client is kept per (base_url, api_key) pair. All clients share the
+    same connection pool limits, so keep-alive connections survive across
+    requests instead of paying the TLS handshake on every call.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0, timeout=180.0,
+                 max_retries=2):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._clients = {}
+        self._http_clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url, api_key):
+        """Return the shared client for an endpoint, creating it on first use"""
+        key = (base_url, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    http_client = httpx.Client(limits=self.limits, timeout=self.timeout)
+                    client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client,
+                                    max_retries=self.max_retries)
+                    self._clients[key] = client
+                    self._http_clients[key] = http_client
+        return client
+
+    def warm_up(self, base_url, api_key, connections=1):
+        """
+        Open connections to an endpoint ahead of the first request
+
+        Runs in daemon threads so the worker start is never blocked; failures
+        are only logged, the first real request will simply connect itself.
+
+        Args:
+            base_url: The API base URL to connect to
+            api_key: The API key of the endpoint
+            connections: Number of connections to open concurrently
+        """
+        self.get(base_url, api_key)
+        http_client = self._http_clients[(base_url, api_key)]
+
+        def ping():
+            try:
+                http_client.head(base_url)
+            except Exception as e:
+                print(f"LLM warm-up failed for {base_url}: {str(e)}")
+
+        threads = [threading.Thread(target=ping, daemon=True) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def close(self):
+        """Close every pooled client"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._http_clients.clear()
+
+
+class LLMGateway:
+    """
+    Entry point of the generators for chat completions
+
+    Binds the model routes of a generation stage to the options of one
+    request, so it can be handed to worker threads that have no application
+    context. Routes are tried in order: when a call fails on a model, after
+    the retries of the resilience policy, the next model of the chain is
+    used.
+
+    With a cancellation token, calls are not sent once the token is
+    cancelled, streamed answers are closed at the next chunk, and a token
+    deadline bounds the resilience deadline of each call.
+
+    Answers are only written to the response cache once parse_json accepted
+    them, and a cached answer it rejects is removed, so an unparseable answer
+    is asked again instead of being served until it expires.
+    """
+
+    def __init__(self, routes, cache=None, use_cache=True, resilience=None, scheduler=None, flow=None,
+                 streaming=False, stage=None, metrics=None, router=None, cancel=None):
+        self.routes = routes
+        self.cache = cache
+        self.use_cache = use_cache
+        self.resilience = resilience
+        self.scheduler = scheduler
+        self.flow = flow or uuid.uuid4().hex
+        self.streaming = streaming  # Whether the generators should prefer stream over complete
+        self.stage = stage  # Generation stage the calls are recorded under (plan, content...)
+        self.metrics = metrics
+        self.router = router  # Receives the outcome of every call, to degrade unhealthy models
+        self.cancel = cancel  # Optional CancelToken of the request
+        # Answers not parsed yet: text -> list of (cache key, model, whether it came from the cache)
+        self._unparsed = {}
+        self._unparsed_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The preferred model of the stage"""
+        return self.routes[0].model
+
+    def _observe(self, outcome, model=None, **values):
+        if self.metrics is not None:
+            self.metrics.observe_call(model or self.model, self.stage, outcome, **values)
+
+    def _expected_completion_tokens(self):
+        return getattr(self.scheduler, 'completion_tokens', 0) or 0
+
+    def _check_cancel(self, prompt, model=None):
+        """Raise Cancelled before a call is sent, counting the tokens it would have spent"""
+        if self.cancel is None or not self.cancel.cancelled:
+            return
+        if self.metrics is not None:
+            self.metrics.observe_cancel(model or self.model, self.stage, 'before_send',
+                                        estimate_tokens(prompt) + self._expected_completion_tokens())
+        raise Cancelled(self.cancel.reason)
+
+    def parse_json(self, text, validator=None, cacheable=None):
+        """
+        Parse an answer with the shared pipeline, recording the outcome under the stage of the gateway
+
+        A valid answer of complete or stream is cached; a cached answer that
+        is not valid is removed from the cache.
+
+        Args:
+            text: The answer returned by complete or stream
+            validator: Optional schema validator (see ParsePipeline.parse)
+            cacheable: Optional predicate on the parsed value; an answer it
+                rejects is used but not cached (e.g. an incomplete batch)
+        """
+        on_outcome = None
+        if self.metrics is not None:
+            on_outcome = lambda outcome: self.metrics.observe_parse(self.model, self.stage, outcome)
+        answer = self._pop_unparsed(text)
+        try:
+            value = parse_llm_json(text, validator, on_outcome)
+        except InvalidLLMOutput:
+            if answer is not None and answer[2]:
+                self.cache.delete(answer[0])
+            raise
+        if answer is not None:
+            if cacheable is not None and not cacheable(value):
+                if answer[2]:
+                    self.cache.delete(answer[0])
+            elif not answer[2]:
+                self.cache.set(answer[0], text, model=answer[1])
+        return value
+
+    def _add_unparsed(self, key, text, model, cached):
+        """Remember the cache key of an answer until parse_json accepts or rejects it"""
+        if key is None or not text:
+            return
+        with self._unparsed_lock:
+            self._unparsed.setdefault(text, []).append((key, model, cached))
+
+    def _pop_unparsed(self, text):
+        with self._unparsed_lock:
+            answers = self._unparsed.get(text)
+            if not answers:
+                return None
+            answer = answers.pop()
+            if not answers:
+                del self._unparsed[text]
+            return answer
+
+    def _cache_key(self, messages, temperature, top_p):
+        # Answers are cached under the preferred model, whichever model of the chain produced them
+        if self.cache is None:
+            return None
+        return LLMCache.make_key(self.model, messages, temperature, top_p)
+
+    def _send(self, prompt, messages, params, stream=False):
+        """
+        Send a chat completion request under the rate limit and the resilience policy
+
+        Each route of the chain is tried in turn until one answers.
+
+        Returns:
+            A (response, reserved_tokens, route) tuple
+        """
+        routes = self.router.order(self.routes) if self.router is not None else self.routes
+        for position, route in enumerate(routes):
+            self._check_cancel(prompt, route.model)
+            started = time.monotonic()
+            try:
+                response, reserved = self._send_to(route, prompt, messages, params, stream)
+            except Cancelled:
+                raise
+            except Exception as e:
+                if self.cancel is not None and self.cancel.cancelled:
+                    # The request deadline cut the call short, it is not the model's fault
+                    raise Cancelled(self.cancel.reason) from e
+                if self.router is not None:
+                    self.router.record(route, False, time.monotonic() - started)
+                if position == len(routes) - 1:
+                    raise
+                self._observe('error', model=route.model, latency=time.monotonic() - started)
+                print(f"LLM call to {route.provider}:{route.model} failed ({str(e)}), "
+                      f"falling back to {routes[position + 1].provider}:{routes[position + 1].model}")
+                continue
+            if self.router is not None:
+                self.router.record(route, True, time.monotonic() - started)
+            return response, reserved, route
+
+    def _send_to(self, route, prompt, messages, params, stream):
+        scheduler = self.scheduler if route.rate_limited else None
+
+        def create(timeout):
+            options = dict(params)
+            reserved = 0
+            if scheduler is not None:
+                started = time.monotonic()
+                try:
+                    reserved = scheduler.acquire(
+                        self.flow, estimate_tokens(prompt) + scheduler.completion_tokens, timeout, self.cancel
+                    )
+                except Cancelled:
+                    # Left the queue without taking any budget
+                    self._check_cancel(prompt, route.model)
+                    raise
+                if timeout is not None:
+                    timeout -= time.monotonic() - started
+                    if timeout <= 0:
+                        raise DeadlineExceeded('LLM call deadline reached while rate limited')
+                if self.cancel is not None and self.cancel.cancelled:
+                    # Cancelled while waiting for the rate limit: give the budget back
+                    scheduler.settle(reserved, 0)
+                    self._check_cancel(prompt, route.model)
+            # timeout=None would disable the client timeout, so only pass a real one
+            if timeout is not None:
+                options['timeout'] = timeout
+            if stream:
+                options['stream'] = True
+            response = route.client.chat.completions.create(
+                model=route.model,
+                messages=messages,
+                **options
+            )
+            return response, reserved
+
+        if self.resilience is not None:
+            deadline = None
+            if self.cancel is not None and self.cancel.remaining() is not None:
+                deadline = max(self.cancel.remaining(), 0.001)
+                if self.resilience.deadline:
+                    deadline = min(deadline, self.resilience.deadline)
+            discard = lambda result: self._discard(route, result, stream)
+            return self.resilience.call(create, deadline, stream=stream, discard=discard)
+        return create(None)
+
+    def _discard(self, route, result, stream):
+        """Release the answer of a hedged request that lost: close its stream and settle its tokens"""
+        response, reserved = result
+        if stream:
+            response.response.close()
+            self._settle(route, reserved, 0)
+        else:
+            usage = getattr(response, 'usage', None)
+            self._settle(route, reserved, getattr(usage, 'total_tokens', None))
+
+    def _settle(self, route, reserved, used):
+        if self.scheduler is not None and route.rate_limited:
+            self.scheduler.settle(reserved, used)
+
+    def complete(self, prompt, temperature=None, top_p=None):
+        """
+        Send a single-message prompt and return the text of the answer
+
+        The response cache is looked up first unless the request bypasses it;
+        the answer is cached once parse_json accepts it, so a bypassed call
+        still refreshes the cached entry. Calls to the model
+        wait for the outbound rate limit, and are retried, hedged and bounded
+        by the resilience policy.
+
+        Args:
+            prompt: The user prompt
+            temperature: Optional sampling temperature
+            top_p: Optional nucleus sampling parameter
+
+        Returns:
+            The content of the first choice
+        """
+        messages = [{"role": "user", "content": prompt}]
+        params = _sampling_params(temperature, top_p)
+
+        key = self._cache_key(messages, temperature, top_p)
+        if key is not None and self.use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._observe('cache_hit')
+                self._add_unparsed(key, cached, None, True)
+                return cached
+
+        started = time.monotonic()
+        try:
+            response, reserved, route = self._send(prompt, messages, params)
+        except Cancelled:
+            raise
+        except Exception:
+            self._observe('error', latency=time.monotonic() - started)
+            raise
+        latency = time.monotonic() - started
+        usage = getattr(response, 'usage', None)
+        self._settle(route, reserved, getattr(usage, 'total_tokens', None))
+        text = response.choices[0].message.content
+        self._observe(
+            'ok',
+            model=route.model,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None) or estimate_tokens(prompt),
+            completion_tokens=getattr(usage, 'completion_tokens', None) or estimate_tokens(text or ''),
+            time_to_first_byte=latency,  # The answer arrives in one piece
+            latency=latency,
+        )
+
+        self._add_unparsed(key, text, route.model, False)
+        return text
+
+    def stream(self, prompt, temperature=None, top_p=None):
+        """
+        Send a single-message prompt and yield the text of the answer as it arrives
+
+        Same cache, rate limit, resilience and fallback behaviour as
+        complete; they cover the call up to the first byte of the answer. A
+        cached answer is yielded in one chunk. Closing the generator before
+        the end closes the connection, so the provider stops generating, and
+        the partial answer is not cached.
+
+        Args:
+            prompt: The user prompt
+            temperature: Optional sampling temperature
+            top_p: Optional nucleus sampling parameter
+
+        Yields:
+            The text chunks of the first choice
+        """
+        messages = [{"role": "user", "content": prompt}]
+        params = _sampling_params(temperature, top_p)
+
+        key = self._cache_key(messages, temperature, top_p)
+        if key is not None and self.use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._observe('cache_hit')
+                self._add_unparsed(key, cached, None, True)
+                yield cached
+                return
+
+        started = time.monotonic()
+        try:
+            response, reserved, route = self._send(prompt, messages, params, stream=True)
+        except Cancelled:
+            raise
+        except Exception:
+            self._observe('error', latency=time.monotonic() - started)
+            raise
+        chunks = []
+        first_byte = None
+        outcome = 'aborted'
+        try:
+            for event in response:
+                if self.cancel is not None and self.cancel.cancelled:
+                    outcome = 'cancelled'
+                    raise Cancelled(self.cancel.reason)
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if first_byte is None:
+                        first_byte = time.monotonic() - started
+                    chunks.append(delta)
+                    yield delta
+            outcome = 'ok'
+        except Cancelled:
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            if outcome != 'ok':
+                response.response.close()
+            # Streamed answers carry no usage, count on an estimate
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(''.join(chunks)) if chunks else 0
+            self._settle(route, reserved, prompt_tokens + completion_tokens)
+            if outcome == 'cancelled' and self.metrics is not None:
+                self.metrics.observe_cancel(route.model, self.stage, 'streaming',
+                                            max(0, self._expected_completion_tokens() - completion_tokens))
+            self._observe(outcome, model=route.model, prompt_tokens=prompt_tokens,
+                          completion_tokens=completion_tokens, time_to_first_byte=first_byte,
+                          latency=time.monotonic() - started)
+
+        self._add_unparsed(key, ''.join(chunks), route.model, False)
+
+
+def _sampling_params(temperature, top_p):
+    params = {}
+    if temperature is not None:
+        params['temperature'] = temperature
+    if top_p is not None:
+        params['top_p'] = top_p
+    return params
+
+
+def init_llm_clients(app):
+    """
+    Create the LLM client registry of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The LLMClientRegistry stored in app.extensions['llm_clients']
+    """
+    registry = LLMClientRegistry(
+        max_connections=app.config['LLM_MAX_CONNECTIONS'],
+        max_keepalive_connections=app.config['LLM_MAX_KEEPALIVE_CONNECTIONS'],
+        keepalive_expiry=app.config['LLM_KEEPALIVE_EXPIRY'],
+        timeout=app.config['LLM_TIMEOUT'],
+        max_retries=0,  # Retries are handled by the resilience policy
+    )
+    app.extensions['llm_clients'] = registry
+    return registry
+
+
+def get_llm(use_cache=True, flow=None, stage=None, cancel=None):
+    """
+    Return an LLMGateway for the current request
+
+    Args:
+        use_cache: False to bypass the response cache for this request
+        flow: Optional identifier shared by the calls of one generation, used
+            for fair scheduling (a new one is created by default)
+        stage: Generation stage (plan, plan_jour, content, content_jour),
+            selects the model chain and labels the metrics
+        cancel: Optional CancelToken stopping the calls of the request
+    """
+    router = current_app.extensions['llm_router']
+    return LLMGateway(
+        router.routes_for(stage),
+        cache=current_app.extensions.get('llm_cache'),
+        use_cache=use_cache,
+        resilience=current_app.extensions.get('llm_resilience'),
+        scheduler=current_app.extensions.get('llm_scheduler'),
+        flow=flow,
+        streaming=current_app.config['LLM_STREAMING'],
+        stage=stage,
+        metrics=current_app.extensions.get('llm_metrics'),
+        router=router,
+        cancel=cancel,
+    )
@@ -0,0 +1,254 @@
+# app/services/llm_parsing.py
+import json
+import time
+import threading
+import json_repair
+from app.utils.helpers import strip_code_fence
+
+
+class InvalidLLMOutput(ValueError):
+    """Raised when an LLM answer is not usable JSON or does not match the expected schema."""
+
+
+class ParsePipeline:
+    """
+    Staged parser of the JSON answers of the model
+
+    1. The fenced text is extracted from the answer
+    2. It is parsed with the standard (C accelerated) json module
+    3. Only when that fails, json_repair fixes the text
+    4. The result is checked, and lightly normalized, by a schema validator
+
+    The time spent in each stage and the outcome of every parse are counted,
+    to see how often the slow repair path is needed.
+    """
+
+    STAGES = ('fence', 'strict', 'repair', 'validate')
+    OUTCOMES = ('strict', 'repaired', 'unparseable', 'invalid')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.runs = dict.fromkeys(self.STAGES, 0)
+        self.outcomes = dict.fromkeys(self.OUTCOMES, 0)
+
+    def _record(self, stage, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.seconds[stage] += elapsed
+            self.runs[stage] += 1
+
+    def _count(self, outcome, on_outcome=None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+        if on_outcome is not None:
+            on_outcome(outcome)
+
+    def parse(self, text, validator=None, on_outcome=None):
+        """
+        Parse an LLM answer
+
+        Args:
+            text: The raw text of the answer
+            validator: Optional function checking the parsed value, returning
+                it normalized or raising InvalidLLMOutput
+            on_outcome: Optional function called with the outcome of the parse
+
+        Returns:
+            The parsed (and validated) value
+
+        Raises:
+            InvalidLLMOutput: If the answer cannot be parsed or is invalid
+        """
+        started = time.perf_counter()
+        text = strip_code_fence(text or '')
+        self._record('fence', started)
+
+        started = time.perf_counter()
+        try:
+            value = json.loads(text)
+            outcome = 'strict'
+        except ValueError:
+            value = None
+            outcome = None
+        self._record('strict', started)
+
+        if outcome is None:
+            started = time.perf_counter()
+            try:
+                value = json_repair.loads(text)
+                outcome = 'repaired'
+            except Exception as e:
+                self._count('unparseable', on_outcome)
+                raise InvalidLLMOutput(f'Unparseable answer: {str(e)}') from e
+            finally:
+                self._record('repair', started)
+            # json_repair returns an empty string when there is nothing to repair
+            if value in ('', None):
+                self._count('unparseable', on_outcome)
+                raise InvalidLLMOutput('Unparseable answer')
+
+        if validator is not None:
+            started = time.perf_counter()
+            try:
+                value = validator(value)
+            except InvalidLLMOutput:
+                self._count('invalid', on_outcome)
+                raise
+            finally:
+                self._record('validate', started)
+
+        self._count(outcome, on_outcome)
+        return value
+
+    def stats(self):
+        """Return the outcome counters and the mean time of each stage"""
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            stages = {
+                stage: {
+                    'runs': self.runs[stage],
+                    'total_ms': round(self.seconds[stage] * 1000, 2),
+                    'mean_ms': round(self.seconds[stage] * 1000 / self.runs[stage], 3) if self.runs[stage] else None,
+                }
+                for stage in self.STAGES
+            }
+        total = sum(outcomes.values())
+        return {
+            'parses': total,
+            'outcomes': outcomes,
+            'repair_rate': round(outcomes['repaired'] / total, 3) if total else None,
+            'stages': stages,
+        }
+
+
+# Shared by the generators, which also run in worker threads without application context
+pipeline = ParsePipeline()
+
+
+def parse_llm_json(text, validator=None, on_outcome=None):
+    """Parse an LLM answer with the shared pipeline (see ParsePipeline.parse)"""
+    return pipeline.parse(text, validator, on_outcome)
+
+
+# Schema validators: they return the normalized value or raise InvalidLLMOutput
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(str(item) for item in value if item is not None)
+    return str(value)
+
+
+def _validate_table(table):
+    if not isinstance(table, list):
+        return None
+    rows = []
+    for row in table:
+        if isinstance(row, dict):
+            row = list(row.values())
+        elif not isinstance(row, list):
+            row = [row]
+        rows.append(["" if cell is None else cell for cell in row])
+    return rows or None
+
+
+def _validate_subsection(subsection):
+    if isinstance(subsection, str):
+        return {"title": subsection}
+    if not isinstance(subsection, dict) or not subsection.get("title"):
+        raise InvalidLLMOutput('Sub-section without a title')
+    subsection["title"] = _text(subsection["title"])
+
+    for key in ("content", "code", "code_example", "example"):
+        if key in subsection:
+            if subsection[key] is None:
+                del subsection[key]
+            else:
+                subsection[key] = _text(subsection[key])
+
+    if "bullets" in subsection:
+        bullets = subsection["bullets"]
+        if isinstance(bullets, str):
+            bullets = [bullets]
+        if isinstance(bullets, list) and bullets:
+            subsection["bullets"] = [_text(point) for point in bullets if point is not None]
+        else:
+            del subsection["bullets"]
+
+    if "table" in subsection:
+        table = _validate_table(subsection["table"])
+        if table is None:
+            del subsection["table"]
+        else:
+            subsection["table"] = table
+    return subsection
+
+
+def validate_section_content(value):
+    """
+    Check the content of a section or session: a list of {"title", "subsections"} objects
+
+    A single object is wrapped in a list, as the renderers iterate over the
+    sections of each generated item. Sub-section fields (content, bullets,
+    code, table) are coerced to the types the renderers expect; unusable
+    optional fields are dropped.
+    """
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list) or not value:
+        raise InvalidLLMOutput('Expected a list of sections')
+    for section in value:
+        if not isinstance(section, dict) or not section.get("title"):
+            raise InvalidLLMOutput('Section without a title')
+        section["title"] = _text(section["title"])
+        subsections = section.get("subsections", [])
+        if not isinstance(subsections, list):
+            raise InvalidLLMOutput(f"Sub-sections of '{section['title']}' are not a list")
+        section["subsections"] = [_validate_subsection(subsection) for subsection in subsections]
+    return value
+
+
+def validate_plan(value):
+    """Check a plan: {"titre", "sections": [{"section", "sous-sections"}]}"""
+    if isinstance(value, list):
+        value = {"sections": value}
+    if not isinstance(value, dict) or not isinstance(value.get("sections"), list) or not value["sections"]:
+        raise InvalidLLMOutput('Expected a plan with a list of sections')
+    for sec in value["sections"]:
+        if not isinstance(sec, dict) or not sec.get("section"):
+            raise InvalidLLMOutput('Plan section without a title')
+        sous_sections = sec.get("sous-sections", "aucun")
+        if not isinstance(sous_sections, (list, str)):
+            raise InvalidLLMOutput(f"Invalid sub-sections for '{sec['section']}'")
+        if isinstance(sous_sections, list):
+            sous_sections = [_text(title) for title in sous_sections]
+        sec["sous-sections"] = sous_sections
+    return value
+
+
+def validate_plan_jour(value):
+    """Check a daily plan: [{"jour", "sessions": [{"title", "subsections"}]}]"""
+    if isinstance(value, dict):
+        # An object wrapping the list of days, e.g. {"jours": [...]}
+        lists = [item for item in value.values() if isinstance(item, list)]
+        if len(lists) != 1:
+            raise InvalidLLMOutput('Expected a list of days')
+        value = lists[0]
+    if not isinstance(value, list) or not value:
+        raise InvalidLLMOutput('Expected a list of days')
+    for day in value:
+        if not isinstance(day, dict) or not isinstance(day.get("sessions"), list):
+            raise InvalidLLMOutput('Day without a list of sessions')
+        for session in day["sessions"]:
+            if not isinstance(session, dict) or not session.get("title"):
+                raise InvalidLLMOutput('Session without a title')
+            subsections = session.get("subsections", [])
+            if not isinstance(subsections, list):
+                subsections = [subsections]
+            session["subsections"] = [
+                _text(title.get("title", "")) if isinstance(title, dict) else _text(title)
+                for title in subsections
+            ]
+    return value
@@ -0,0 +1,194 @@
+# app/services/llm_providers.py
+import time
+import threading
+from collections import deque, namedtuple
+
+# A model served by a provider; client is the pooled client of the provider endpoint
+Route = namedtuple('Route', ['provider', 'model', 'client', 'rate_limited'])
+
+
+def parse_chain(value):
+    """
+    Parse a model chain: comma-separated "provider:model" entries
+
+    Only the first colon separates the provider, so model names may contain
+    colons (e.g. "default:deepseek/deepseek-chat:free").
+
+    Returns:
+        A list of (provider, model) tuples
+    """
+    chain = []
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, separator, model = entry.partition(':')
+        if not separator or not provider.strip() or not model.strip():
+            raise ValueError(f"Invalid model route '{entry}', expected provider:model")
+        chain.append((provider.strip(), model.strip()))
+    return chain
+
+
+class RouteHealth:
+    """Rolling window of the outcomes and latencies of one provider model"""
+
+    def __init__(self, window=20):
+        self.samples = deque(maxlen=window)
+        self.degraded_until = 0.0
+        self.degradations = 0
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    def latency_p95(self):
+        latencies = sorted(latency for ok, latency in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+
+
+class ProviderRouter:
+    """
+    Routes each generation stage to its chain of provider models
+
+    Providers are OpenAI-compatible endpoints: the configured API, a local
+    stand-in server, etc. Each stage (plan, plan_jour, content,
+    content_jour) has its own chain of models, stages without one use the
+    "default" chain.
+
+    The first healthy model of the chain is preferred. A model is degraded
+    for ``cooldown`` seconds when, over its last calls, its error rate goes
+    over ``error_budget`` or its p95 latency over ``latency_slo``; degraded
+    models move to the end of the chain, so the next model takes the
+    traffic. A call that fails on a model falls through to the next one.
+    """
+
+    def __init__(self, registry, providers, routes, latency_slo=None, error_budget=0.5, window=20,
+                 min_samples=5, cooldown=60.0):
+        self.registry = registry
+        self.providers = providers
+        self.latency_slo = latency_slo
+        self.error_budget = error_budget
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.chains = {}
+        for stage, value in routes.items():
+            chain = parse_chain(value)
+            for provider, _ in chain:
+                if provider not in providers:
+                    raise ValueError(f"Unknown LLM provider '{provider}' in the route of stage '{stage}'")
+            if chain:
+                self.chains[stage] = chain
+        if 'default' not in self.chains:
+            raise ValueError("The 'default' LLM route is required")
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def chain(self, stage):
+        """Return the configured (provider, model) chain of a stage"""
+        return self.chains.get(stage) or self.chains['default']
+
+    def routes_for(self, stage):
+        """Return the routes of a stage, in chain order"""
+        routes = []
+        for provider, model in self.chain(stage):
+            endpoint = self.providers[provider]
+            routes.append(Route(
+                provider, model,
+                self.registry.get(endpoint['base_url'], endpoint['api_key']),
+                endpoint.get('rate_limited', True),
+            ))
+        return routes
+
+    def order(self, routes):
+        """
+        Return routes in the order they should be tried
+
+        Returns:
+            The healthy routes first, then the degraded ones, each group in chain order
+        """
+        now = time.monotonic()
+        with self._lock:
+            degraded = {
+                key for key, health in self._health.items() if health.degraded_until > now
+            }
+        return ([route for route in routes if (route.provider, route.model) not in degraded]
+                + [route for route in routes if (route.provider, route.model) in degraded])
+
+    def record(self, route, ok, latency):
+        """Record the outcome of a call, degrading the model when it exceeds its SLO or error budget"""
+        key = (route.provider, route.model)
+        with self._lock:
+            health = self._health.setdefault(key, RouteHealth(self.window))
+            health.samples.append((ok, latency))
+            if len(health.samples) < self.min_samples:
+                return
+            p95 = health.latency_p95()
+            too_slow = self.latency_slo is not None and p95 is not None and p95 > self.latency_slo
+            if too_slow or health.error_rate() > self.error_budget:
+                print(f"LLM route {route.provider}:{route.model} degraded for {self.cooldown}s "
+                      f"(error rate {health.error_rate():.0%}, p95 {'n/a' if p95 is None else f'{p95:.1f}s'})")
+                health.degraded_until = time.monotonic() + self.cooldown
+                health.degradations += 1
+                # Judge the model on fresh calls once the cooldown is over
+                health.samples.clear()
+
+    def stats(self):
+        """Return the chain of each stage and the health of each model"""
+        now = time.monotonic()
+        with self._lock:
+            health = {
+                f'{provider}:{model}': {
+                    'calls': len(state.samples),
+                    'error_rate': round(state.error_rate(), 3),
+                    'latency_p95_seconds': round(state.latency_p95(), 3) if state.latency_p95() is not None else None,
+                    'degraded': state.degraded_until > now,
+                    'degradations': state.degradations,
+                }
+                for (provider, model), state in self._health.items()
+            }
+        return {
+            'routes': {stage: [f'{provider}:{model}' for provider, model in chain]
+                       for stage, chain in self.chains.items()},
+            'health': health,
+        }
+
+
+def init_llm_router(app):
+    """
+    Create the provider router of the application
+
+    The "default" provider is the BASE_URL/API_KEY endpoint of the
+    configuration; LLM_PROVIDERS adds the others. With LLM_WARMUP, the
+    endpoints used by the routes are connected ahead of the first request.
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The ProviderRouter stored in app.extensions['llm_router']
+    """
+    providers = {'default': {'base_url': app.config['BASE_URL'], 'api_key': app.config['API_KEY']}}
+    providers.update(app.config['LLM_PROVIDERS'])
+    router = ProviderRouter(
+        app.extensions['llm_clients'],
+        providers,
+        app.config['LLM_ROUTES'],
+        latency_slo=app.config['LLM_FALLBACK_LATENCY_SLO'],
+        error_budget=app.config['LLM_FALLBACK_ERROR_BUDGET'],
+        window=app.config['LLM_FALLBACK_WINDOW'],
+        min_samples=app.config['LLM_FALLBACK_MIN_SAMPLES'],
+        cooldown=app.config['LLM_FALLBACK_COOLDOWN'],
+    )
+    app.extensions['llm_router'] = router
+
+    if app.config['LLM_WARMUP']:
+        used = {provider for chain in router.chains.values() for provider, _ in chain}
+        for provider in used:
+            endpoint = providers[provider]
+            router.registry.warm_up(endpoint['base_url'], endpoint['api_key'], app.config['LLM_WARMUP_CONNECTIONS'])
+
+    return router
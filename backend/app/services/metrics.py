@@ -0,0 +1,191 @@
+# app/services/metrics.py
+import threading
+from bisect import bisect_left
+
+# Latency buckets in seconds, from a cached answer to a long section
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name + '_total'
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, key, value
+
+
+class Histogram:
+    """Observations counted in cumulative buckets per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # label key -> (bucket counts, sum, count)
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', key + (('le', _format_value(float(bound))),), cumulative
+            yield self.name + '_sum', key, total
+            yield self.name + '_count', key, count
+
+
+class MetricsRegistry:
+    """Set of metrics exported in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return the exposition text of every metric"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class LLMMetrics:
+    """
+    Per-call instrumentation of the LLM gateway
+
+    Every call is recorded with its model and generation stage (plan,
+    plan_jour, content, content_jour): outcome, prompt and completion
+    tokens, time to first byte and total latency. Parse outcomes of the
+    answers are counted per stage as well.
+    """
+
+    def __init__(self, registry):
+        labels = ('model', 'stage')
+        self.requests = registry.counter(
+            'llm_requests', 'LLM calls by outcome (ok, cache_hit, error, aborted, cancelled)', labels + ('outcome',))
+        self.prompt_tokens = registry.counter(
+            'llm_prompt_tokens', 'Prompt tokens sent to the model', labels)
+        self.completion_tokens = registry.counter(
+            'llm_completion_tokens', 'Completion tokens received from the model', labels)
+        self.time_to_first_byte = registry.histogram(
+            'llm_time_to_first_byte_seconds',
+            'Seconds until the first chunk of the answer (the whole answer when not streamed)', labels)
+        self.latency = registry.histogram(
+            'llm_request_duration_seconds', 'Seconds until the end of the answer, rate limit and retries included',
+            labels)
+        self.parses = registry.counter(
+            'llm_parse_outcomes', 'Parse outcomes of the answers (strict, repaired, unparseable, invalid)',
+            labels + ('outcome',))
+        self.cancellations = registry.counter(
+            'llm_cancelled_calls', 'LLM calls stopped by a cancellation (client gone, job deleted, deadline), '
+            'before being sent or while streaming', labels + ('phase',))
+        self.tokens_avoided = registry.counter(
+            'llm_tokens_avoided', 'Estimated prompt and completion tokens not spent thanks to cancellations', labels)
+
+    def observe_call(self, model, stage, outcome, prompt_tokens=None, completion_tokens=None,
+                     time_to_first_byte=None, latency=None):
+        """Record one call; cache hits and failures only count as requests"""
+        labels = {'model': model, 'stage': stage or 'unknown'}
+        self.requests.inc(outcome=outcome, **labels)
+        if prompt_tokens:
+            self.prompt_tokens.inc(prompt_tokens, **labels)
+        if completion_tokens:
+            self.completion_tokens.inc(completion_tokens, **labels)
+        if time_to_first_byte is not None:
+            self.time_to_first_byte.observe(time_to_first_byte, **labels)
+        if latency is not None:
+            self.latency.observe(latency, **labels)
+
+    def observe_cancel(self, model, stage, phase, tokens_avoided=0):
+        """Record a call stopped by a cancellation and the tokens it did not spend"""
+        labels = {'model': model, 'stage': stage or 'unknown'}
+        self.cancellations.inc(phase=phase, **labels)
+        if tokens_avoided:
+            self.tokens_avoided.inc(tokens_avoided, **labels)
+
+    def observe_parse(self, model, stage, outcome):
+        """Record the parse outcome of an answer"""
+        self.parses.inc(model=model, stage=stage or 'unknown', outcome=outcome)
+
+
+def init_metrics(app):
+    """
+    Create the metrics registry of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The MetricsRegistry stored in app.extensions['metrics']; the LLM
+        instrumentation is stored in app.extensions['llm_metrics']
+    """
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    app.extensions['llm_metrics'] = LLMMetrics(registry)
+    return registry
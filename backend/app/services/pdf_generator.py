@@ -1,481 +1,206 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak, Spacer, Image, Table, TableStyle, ListFlowable, ListItem
-from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
-from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak, Spacer, Image, Table, ListFlowable, ListItem
 from reportlab.platypus import Preformatted
-import os
+from xml.sax.saxutils import escape
+from app.services.document import Block
+from app.services.tables import TableLayout, split_columns
+from app.services.themes import DEFAULT_THEME, get_theme, placeholder_logo
 
-def format_code_block(code_text):
+# Table layout, in points: the frame of a 600x350 page with its margins, less the body indent
+TABLE_WIDTH = 540
+TABLE_PAGE_HEIGHT = 300
+TABLE_CELL_PADDING = 8  # Left and right padding of the theme table style
+TABLE_LEADING = 12
+TABLE_MIN_COLUMN_WIDTH = 45
+TABLE_MAX_CELL_LINES = 10  # A cell of more lines is cut: a header and a row must fit in a page
+
+def format_code_block(code_text, theme=None):
     """
     Format code blocks for PDF display
     
     Args:
-        code_text: List of code lines
+        code_text: Sequence of code lines
+        theme: The Theme of the document (defaults to the default theme)
         
     Returns:
         Formatted table containing code with proper styling
     """
+    theme = theme or get_theme()
+    
     # Join code lines with line breaks
     code_text = "\n".join(code_text)
     
     # Use Preformatted to preserve spaces
-    formatted_code = Preformatted(code_text, getSampleStyleSheet()["Code"])
+    formatted_code = Preformatted(code_text, theme.styles['code'])
     
     code_table = Table([[formatted_code]])
-    
-    code_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor("#f3f3f3")),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor("#222222")),
-        ('FONTNAME', (0, 0), (-1, -1), 'Courier'),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
+    code_table.setStyle(theme.code_table_style)
     
     return code_table
 
-def format_table(data):
+def format_table(data, theme=None, width=TABLE_WIDTH, page_height=TABLE_PAGE_HEIGHT):
     """
     Format tables for PDF display
     
+    The layout (see TableLayout) is computed once from the length of the
+    cells: ragged rows are padded, the column widths are fixed and cells too
+    long for a page are cut. The rows are split into tables of about a page
+    each, repeating the header, so reportlab never measures the whole table
+    again when it breaks it across pages; columns that do not fit in the
+    width continue in another table (see split_columns).
+    
     Args:
-        data: 2D list representing table data
+        data: Sequence of rows, each a sequence of cell values
+        theme: The Theme of the document (defaults to the default theme)
+        width: The width available for the table, in points
+        page_height: The height of a page frame, in points
         
     Returns:
-        Formatted table with proper styling
+        A list of formatted tables with proper styling
     """
-    # Wrap each cell value in a Paragraph
-    wrapped_data = [[Paragraph(str(cell), getSampleStyleSheet()['Normal']) for cell in row] for row in data]
-    table = Table(wrapped_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#0097b2")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#f3f3f3")),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#ffffff")),
-        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
-    ]))
-    return table
+    theme = theme or get_theme()
+    cell_style = theme.styles['cell']
+    rows = [[str(cell) for cell in row] for row in data]
+    tables = []
+    # Columns that do not fit in the width go to the next table
+    for part in split_columns(rows, int(width // TABLE_MIN_COLUMN_WIDTH)):
+        layout = TableLayout(part, width, theme.char_width, padding=TABLE_CELL_PADDING * 2,
+                             min_width=TABLE_MIN_COLUMN_WIDTH, max_lines=TABLE_MAX_CELL_LINES)
+        
+        def cell(text, column, style):
+            # Cells on one line are drawn as plain strings, without paragraph layout
+            if "\n" not in text and len(text) <= layout.per_line[column]:
+                return text
+            return Paragraph(escape(text).replace("\n", "<br/>"), style)
+        
+        header = [cell(text, column, theme.styles['header_cell']) for column, text in enumerate(layout.header)]
+        for start, end in layout.pages(lambda lines: lines * TABLE_LEADING + TABLE_CELL_PADDING * 2, page_height):
+            page = [[cell(text, column, cell_style) for column, text in enumerate(row)] for row in layout.rows[start:end]]
+            table = Table([header] + page, colWidths=layout.widths, repeatRows=1)
+            table.setStyle(theme.table_style)
+            tables.append(table)
+    return tables
 
-def create_pdf(output_filename, sections, logo_path, formation_title, trainer_name):
+def create_pdf(output_filename, course, logo_path, theme_id=DEFAULT_THEME):
     """
     Create a PDF presentation from the generated content
     
-    Args:
-        output_filename: Path to save the PDF file
-        sections: Content sections to include
-        logo_path: Path to the logo image
-        formation_title: Title of the presentation
-        trainer_name: Name of the presenter
-    """
-    page_width, page_height = 600, 350
-    
-    doc = SimpleDocTemplate(output_filename, pagesize=(page_width, page_height),
-                            leftMargin=15, rightMargin=15, topMargin=10, bottomMargin=15)
-    
-    styles = getSampleStyleSheet()
-    normal_style = styles["Normal"]
-    
-    # Styles customization
-    formation_style = ParagraphStyle(
-        "FormationTitle",
-        parent=styles["Title"],
-        fontSize=45,
-        textColor=colors.HexColor("#ff7900"),
-        spaceAfter=15,
-        spaceBefore=45,
-        alignment=TA_LEFT,
-    )
-    
-    trainer_style = ParagraphStyle(
-        "TrainerName",
-        parent=styles["BodyText"],
-        fontSize=25,
-        spaceAfter=45,
-        spaceBefore=45,
-        alignment=TA_CENTER,
-        leftIndent=45,
-    )
-    
-    title_style = ParagraphStyle(
-        "TitleStyle",
-        parent=styles["Title"],
-        fontSize=14,
-        alignment=TA_LEFT,
-        spaceAfter=5,
-        spaceBefore=5,
-        textColor=colors.HexColor("#ff7900")
-    )
-    
-    bullet_style = ParagraphStyle(
-        "BulletStyle",
-        parent=styles["BodyText"],
-        fontSize=10,
-        leading=17,
-        spaceBefore=3,
-        spaceAfter=3,
-        rightIndent=15,
-        fontName="Courier",
-    )
-    
-    subtitle_style = ParagraphStyle(
-        "SubtitleStyle",
-        parent=styles["BodyText"],
-        fontSize=12,
-        spaceAfter=2,
-        textColor=colors.HexColor("#000"),
-        leftIndent=15,
-        fontName="Helvetica-Bold"
-    )
-    
-    body_style = ParagraphStyle(
-        "BodyStyle",
-        parent=styles["BodyText"],
-        fontSize=10,
-        leading=20,
-        spaceAfter=3,
-        leftIndent=30,
-        rightIndent=15,
-        alignment=TA_JUSTIFY
-    )
-    
-    elements = []
-    
-    # Function to add the orange bar
-    def add_orange_bar(c, width, height):
-        orange = colors.HexColor("#ff7900")
-        c.setFillColor(orange)
-        c.rect(-12, 0, 20, height, fill=True, stroke=False)
-    
-    # Check if logo exists, use placeholder if not
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'default_logo.png')
-        # If default logo doesn't exist either, create a blank image
-        if not os.path.exists(logo_path):
-            from PIL import Image as PILImage
-            from PIL import ImageDraw
-            img = PILImage.new('RGB', (150, 50), color=(255, 255, 255))
-            d = ImageDraw.Draw(img)
-            d.text((10, 20), "Logo", fill=(0, 0, 0))
-            logo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'default_logo.png')
-            img.save(logo_path)
-    
-    # Add first page (Formation)
-    img = Image(logo_path, width=120, height=30)
-    img.hAlign = 'RIGHT'
-    
-    elements.append(img)
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph("Formation", formation_style))
-    elements.append(Paragraph(formation_title, trainer_style))
-    elements.append(PageBreak())
-    
-    # Add second page (Presented by)
-    elements.append(img)
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph("Présenté par", formation_style))
-    elements.append(Paragraph(trainer_name, trainer_style))
-    elements.append(PageBreak())
-    
-    # Add content
-    for sections_group in sections:
-        for section in sections_group:
-            section_title = section.get("title", "Sans titre")
-            elements.append(Paragraph(f"<b>{section_title}</b>", title_style))
-            elements.append(Spacer(1, 10))
-            
-            # Handle subsections
-            for subsection in section.get("subsections", []):
-                subsection_title = subsection.get("title", "Sous-section")
-                elements.append(Paragraph(f"{subsection_title}", subtitle_style))
-                elements.append(Spacer(1, 5))
-                
-                # Main content
-                content = subsection.get("content", "")
-                elements.append(Paragraph(content, body_style))
-                elements.append(Spacer(1, 10))
-                
-                # Bullet points
-                if "bullets" in subsection:
-                    bullet_points = ListFlowable(
-                        [ListItem(Paragraph(point, bullet_style)) for point in subsection["bullets"]],
-                        bulletType="bullet",
-                        leftIndent=25,
-                        spaceBefore=5,
-                        spaceAfter=5
-                    )
-                    elements.append(bullet_points)
-                    elements.append(Spacer(1, 10))
-                
-                # Code blocks
-                if "code" in subsection:
-                    elements.append(format_code_block(subsection["code"]))
-                    elements.append(Spacer(1, 10))
-                
-                # Tables
-                if "table" in subsection:
-                    table_data = subsection["table"]
-                    elements.append(format_table(table_data))
-                    elements.append(Spacer(1, 10))
-    
-    # Function for canvas with orange bar
-    def canvas_with_orange_bar(canvas, doc):
-        width, height = A4
-        add_orange_bar(canvas, width, height)
-    
-    # Generate the PDF
-    doc.build(elements, onFirstPage=canvas_with_orange_bar, onLaterPages=canvas_with_orange_bar)
-    
-    return output_filename
-
-def create_pdf_jour(output_filename, contenu_jour, logo_path, formation_title, trainer_name):
-    """
-    Create a PDF presentation for multi-day content from the generated content
+    A course organized in days starts with a table of contents, and the
+    sessions of each day follow a day title, one day per page.
     
     Args:
         output_filename: Path to save the PDF file
-        contenu_jour: Multi-day content structure with days, sessions, and subsections
+        course: The Course to render (see app.services.document)
         logo_path: Path to the logo image
-        formation_title: Title of the presentation
-        trainer_name: Name of the presenter
+        theme_id: The theme of the document (see app.services.themes)
     """
     page_width, page_height = 600, 350
     
     doc = SimpleDocTemplate(output_filename, pagesize=(page_width, page_height),
                             leftMargin=15, rightMargin=15, topMargin=10, bottomMargin=15)
     
-    styles = getSampleStyleSheet()
-    normal_style = styles["Normal"]
-    
-    # Styles customization
-    formation_style = ParagraphStyle(
-        "FormationTitle",
-        parent=styles["Title"],
-        fontSize=45,
-        textColor=colors.HexColor("#ff7900"),
-        spaceAfter=15,
-        spaceBefore=45,
-        alignment=TA_LEFT,
-    )
-    
-    trainer_style = ParagraphStyle(
-        "TrainerName",
-        parent=styles["BodyText"],
-        fontSize=25,
-        spaceAfter=45,
-        spaceBefore=45,
-        alignment=TA_CENTER,
-        leftIndent=45,
-    )
-    
-    title_style = ParagraphStyle(
-        "TitleStyle",
-        parent=styles["Title"],
-        fontSize=14,
-        alignment=TA_LEFT,
-        spaceAfter=5,
-        spaceBefore=5,
-        textColor=colors.HexColor("#ff7900")
-    )
-    
-    day_title_style = ParagraphStyle(
-        "DayTitleStyle",
-        parent=styles["Title"],
-        fontSize=20,
-        alignment=TA_LEFT,
-        spaceAfter=10,
-        spaceBefore=10,
-        textColor=colors.HexColor("#0097b2"),
-        backgroundColor=colors.HexColor("#f3f3f3"),
-        borderColor=colors.HexColor("#ff7900"),
-        borderWidth=1,
-        borderPadding=10,
-        borderRadius=5
-    )
-    
-    bullet_style = ParagraphStyle(
-        "BulletStyle",
-        parent=styles["BodyText"],
-        fontSize=10,
-        leading=17,
-        spaceBefore=3,
-        spaceAfter=3,
-        rightIndent=15,
-        fontName="Courier",
-    )
-    
-    subtitle_style = ParagraphStyle(
-        "SubtitleStyle",
-        parent=styles["BodyText"],
-        fontSize=12,
-        spaceAfter=2,
-        textColor=colors.HexColor("#000"),
-        leftIndent=15,
-        fontName="Helvetica-Bold"
-    )
-    
-    body_style = ParagraphStyle(
-        "BodyStyle",
-        parent=styles["BodyText"],
-        fontSize=10,
-        leading=20,
-        spaceAfter=3,
-        leftIndent=30,
-        rightIndent=15,
-        alignment=TA_JUSTIFY
-    )
+    theme = get_theme(theme_id, logo_path)
+    styles = theme.styles
+    formation_style = styles['formation']
+    trainer_style = styles['trainer']
+    title_style = styles['title']
+    day_title_style = styles['day_title']
+    bullet_style = styles['bullet']
+    subtitle_style = styles['subtitle']
+    body_style = styles['body']
+    example_style = styles['example']
     
     elements = []
     
     # Function to add the orange bar
     def add_orange_bar(c, width, height):
-        orange = colors.HexColor("#ff7900")
-        c.setFillColor(orange)
+        c.setFillColor(theme.colors['primary'])
         c.rect(-12, 0, 20, height, fill=True, stroke=False)
     
-    # Check if logo exists, use placeholder if not
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'default_logo.png')
-        # If default logo doesn't exist either, create a blank image
-        if not os.path.exists(logo_path):
-            from PIL import Image as PILImage
-            from PIL import ImageDraw
-            img = PILImage.new('RGB', (150, 50), color=(255, 255, 255))
-            d = ImageDraw.Draw(img)
-            d.text((10, 20), "Logo", fill=(0, 0, 0))
-            logo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'default_logo.png')
-            img.save(logo_path)
+    def add_block(block):
+        """Add the flowables of a sub-section block"""
+        if block.kind == Block.TEXT:
+            elements.append(Paragraph(block.value, body_style))
+            elements.append(Spacer(1, 10))
+        elif block.kind == Block.EXAMPLE:
+            elements.append(Paragraph("Exemple: " + block.value, example_style))
+            elements.append(Spacer(1, 5))
+        elif block.kind == Block.BULLETS:
+            elements.append(ListFlowable(
+                [ListItem(Paragraph(point, bullet_style)) for point in block.value],
+                bulletType="bullet",
+                leftIndent=25,
+                spaceBefore=5,
+                spaceAfter=5
+            ))
+            elements.append(Spacer(1, 10))
+        elif block.kind == Block.CODE:
+            elements.append(format_code_block(block.value, theme))
+            elements.append(Spacer(1, 10))
+        elif block.kind == Block.TABLE:
+            elements.extend(format_table(block.value, theme))
+            elements.append(Spacer(1, 10))
     
     # Add first page (Formation)
-    img = Image(logo_path, width=120, height=30)
+    # Use a placeholder if the logo does not exist
+    logo = theme.logo or placeholder_logo()
+    img = Image(logo.stream(), width=120, height=30)
     img.hAlign = 'RIGHT'
     
     elements.append(img)
     elements.append(Spacer(1, 20))
     elements.append(Paragraph("Formation", formation_style))
-    elements.append(Paragraph(formation_title, trainer_style))
+    elements.append(Paragraph(course.title, trainer_style))
     elements.append(PageBreak())
     
     # Add second page (Presented by)
     elements.append(img)
     elements.append(Spacer(1, 20))
     elements.append(Paragraph("Présenté par", formation_style))
-    elements.append(Paragraph(trainer_name, trainer_style))
+    elements.append(Paragraph(course.trainer, trainer_style))
     elements.append(PageBreak())
     
-    # Add table of contents 
-    elements.append(Paragraph("Programme de la Formation", title_style))
-    elements.append(Spacer(1, 20))
-    
-    # Loop through days for ToC
-    for day_index, day_content in enumerate(contenu_jour):
-        day_num = day_index + 1
-        elements.append(Paragraph(f"Jour {day_num}:", subtitle_style))
+    if course.daily:
+        # Add table of contents
+        elements.append(Paragraph("Programme de la Formation", title_style))
+        elements.append(Spacer(1, 20))
         
-        # Add session titles for each day in ToC
-        for session_list in day_content:
-            for session in session_list:
-                session_title = session.get("title", "Sans titre")
-                elements.append(Paragraph(f"• {session_title}", bullet_style))
+        for day in course.days:
+            elements.append(Paragraph(f"Jour {day.number}:", subtitle_style))
+            for section in day.sections:
+                elements.append(Paragraph(f"• {section.title}", bullet_style))
+            elements.append(Spacer(1, 10))
         
-        elements.append(Spacer(1, 10))
+        elements.append(PageBreak())
     
-    elements.append(PageBreak())
-    
-    # Process each day's content
-    for day_index, day_content in enumerate(contenu_jour):
-        day_num = day_index + 1
-        
-        # Add day title
-        elements.append(Paragraph(f"Jour {day_num}", day_title_style))
-        elements.append(Spacer(1, 20))
+    # Add content
+    for day_index, day in enumerate(course.days):
+        if course.daily:
+            elements.append(Paragraph(f"Jour {day.number}", day_title_style))
+            elements.append(Spacer(1, 20))
         
-        # Process each session in this day
-        for session_list in day_content:
-            for session in session_list:
-                section_title = session.get("title", "Sans titre")
-                elements.append(Paragraph(f"<b>{section_title}</b>", title_style))
-                elements.append(Spacer(1, 10))
-                
-                # Handle subsections
-                for subsection in session.get("subsections", []):
-                    subsection_title = subsection.get("title", "Sous-section")
-                    elements.append(Paragraph(f"{subsection_title}", subtitle_style))
-                    elements.append(Spacer(1, 5))
-                    
-                    # Main content
-                    content = subsection.get("content", "")
-                    elements.append(Paragraph(content, body_style))
-                    elements.append(Spacer(1, 10))
-                    
-                    # Example text if available
-                    if "example" in subsection:
-                        example_text = "Exemple: " + subsection["example"]
-                        example_style = ParagraphStyle(
-                            "ExampleStyle",
-                            parent=body_style,
-                            textColor=colors.HexColor("#006600"),
-                            fontStyle='italic'
-                        )
-                        elements.append(Paragraph(example_text, example_style))
-                        elements.append(Spacer(1, 5))
-                    
-                    # Bullet points
-                    if "bullets" in subsection:
-                        bullet_points = ListFlowable(
-                            [ListItem(Paragraph(point, bullet_style)) for point in subsection["bullets"]],
-                            bulletType="bullet",
-                            leftIndent=25,
-                            spaceBefore=5,
-                            spaceAfter=5
-                        )
-                        elements.append(bullet_points)
-                        elements.append(Spacer(1, 10))
-                    
-                    # Code blocks - handle both 'code' and 'code_example'
-                    code_content = None
-                    if "code" in subsection:
-                        code_content = subsection["code"]
-                    elif "code_example" in subsection:
-                        code_content = subsection["code_example"]
-                    
-                    if code_content:
-                        # Split by lines if it's a string
-                        if isinstance(code_content, str):
-                            code_lines = code_content.strip().split('\n')
-                        else:
-                            code_lines = code_content
-                            
-                        elements.append(format_code_block(code_lines))
-                        elements.append(Spacer(1, 10))
-                    
-                    # Tables
-                    if "table" in subsection:
-                        table_data = subsection["table"]
-                        elements.append(format_table(table_data))
-                        elements.append(Spacer(1, 10))
-                
-                # Add more spacing between sections
+        for section in day.sections:
+            elements.append(Paragraph(f"<b>{section.title}</b>", title_style))
+            elements.append(Spacer(1, 10))
+            
+            for subsection in section.subsections:
+                elements.append(Paragraph(subsection.title, subtitle_style))
+                elements.append(Spacer(1, 5))
+                for block in subsection.blocks:
+                    add_block(block)
+            
+            if course.daily:
+                # Add more spacing between sessions
                 elements.append(Spacer(1, 20))
         
         # Add page break after each day except the last one
-        if day_index < len(contenu_jour) - 1:
+        if course.daily and day_index < len(course.days) - 1:
             elements.append(PageBreak())
     
     # Function for canvas with orange bar
     def canvas_with_orange_bar(canvas, doc):
-        width, height = page_width, page_height
-        add_orange_bar(canvas, width, height)
+        add_orange_bar(canvas, page_width, page_height)
     
     # Generate the PDF
     doc.build(elements, onFirstPage=canvas_with_orange_bar, onLaterPages=canvas_with_orange_bar)
     
-    return output_filename
\ No newline at end of file
+    return output_filename
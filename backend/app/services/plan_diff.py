@@ -0,0 +1,75 @@
+# app/services/plan_diff.py
+
+def _normalize(text):
+    return ' '.join(str(text).split()).lower()
+
+def section_key(sec):
+    """
+    Identity of a plan section: its title and its ordered sub-section titles
+
+    Whitespace and case differences are ignored, so re-saving a plan in the
+    editor does not invalidate its content.
+    """
+    sous_sections = sec.get('sous-sections')
+    if isinstance(sous_sections, list):
+        sous_sections = tuple(_normalize(title) for title in sous_sections)
+    else:
+        sous_sections = (_normalize(sous_sections),)
+    return _normalize(sec.get('section', '')), sous_sections
+
+def session_key(day_number, session):
+    """Identity of a session of a daily plan: its day, its title and its ordered sub-section titles"""
+    subsections = session.get('subsections', [])
+    if not isinstance(subsections, list):
+        subsections = [subsections]
+    return _normalize(day_number), _normalize(session.get('title', '')), tuple(_normalize(title) for title in subsections)
+
+def diff_plan(previous_plan, plan):
+    """
+    Match the sections of a plan with the sections of its previous version
+
+    Args:
+        previous_plan: The plan the previous content was generated from
+        plan: The edited plan
+
+    Returns:
+        A list with, for each section of ``plan``, the index of the identical
+        section in ``previous_plan`` or None if it was added or changed
+    """
+    available = {}
+    for index, sec in enumerate(previous_plan.get('sections', [])):
+        available.setdefault(section_key(sec), []).append(index)
+
+    matches = []
+    for sec in plan.get('sections', []):
+        indexes = available.get(section_key(sec))
+        # Each previous section can only be reused once (duplicated titles)
+        matches.append(indexes.pop(0) if indexes else None)
+    return matches
+
+def reusable_content(previous_plan, previous_content, plan, is_reusable=None):
+    """
+    Select the previous content that can be reused verbatim for an edited plan
+
+    Args:
+        previous_plan: The plan the previous content was generated from
+        previous_content: The content generated for ``previous_plan``, in plan order
+        plan: The edited plan
+        is_reusable: Optional predicate rejecting some previous entries
+            (e.g. placeholders of failed generations)
+
+    Returns:
+        A dict mapping section indexes of ``plan`` to their reused content
+    """
+    if not previous_plan or not previous_content:
+        return {}
+
+    reuse = {}
+    for index, previous_index in enumerate(diff_plan(previous_plan, plan)):
+        if previous_index is None or previous_index >= len(previous_content):
+            continue
+        section_content = previous_content[previous_index]
+        if section_content is None or (is_reusable is not None and not is_reusable(section_content)):
+            continue
+        reuse[index] = section_content
+    return reuse
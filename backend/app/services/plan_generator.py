@@ -1,6 +1,6 @@
-from openai import OpenAI
-import json_repair
-from flask import current_app
+from app.services.llm_client import get_llm
+from app.services.llm_parsing import validate_plan
+from app.services.prompts import register_prompt, to_json
 
 # Example plan template for demonstration
 exemple_plan = {
@@ -31,11 +31,35 @@ exemple_plan = {
   ]
 }
 
-def text_to_json(text):
-    """Convert text response from LLM to JSON object"""
-    return json_repair.loads(text.replace("```", "").replace("json", "").strip())
+# Static instructions first, the fields of the call last (see PromptTemplate)
+PLAN_PROMPT = register_prompt(
+    "plan",
+    prefix=f"""
+    Tu es un formateur expert dans le domaine indiqué à la fin de ce message. Ton objectif est de générer un plan de présentation détaillé et pédagogique sur le sujet indiqué à la fin de ce message, pour des apprenants du niveau indiqué.
 
-def generate_plan(domaine, sujet, description_sujet, niveau_apprenant):
+    Ce plan doit comporter :
+          - Des sections principales clairement définies.
+          - Pour chaque section, des sous-sections sous forme de guidelines détaillées, spécifiques et pertinentes.
+          - Le contenu doit être progressif, pédagogique et adapté au niveau des apprenants.
+
+    N'intègre pas encore le contenu complet de la présentation, uniquement le plan détaillé avec les titres des sections et sous-sections.
+    Pour la conclusion, génère la conclusion directement sans ajouter de sous-sections.
+
+    Le contenu doit être structuré en JSON. Commence à générer le JSON directement sans ajouter d'autre message.
+
+    Exemple de résultat attendu : {to_json(exemple_plan)}
+    """,
+    suffix="""
+    Domaine : {domaine}
+    Sujet : {sujet}
+    Description du sujet : {description_sujet}
+    Niveau des apprenants : {niveau_apprenant} en programmation
+
+    ```json
+    """,
+)
+
+def generate_plan(domaine, sujet, description_sujet, niveau_apprenant, use_cache=True):
     """
     Generate a structured presentation plan based on given parameters
     
@@ -44,49 +68,25 @@ def generate_plan(domaine, sujet, description_sujet, niveau_apprenant):
         sujet: The specific subject of the presentation
         description_sujet: A detailed description of what should be covered
         niveau_apprenant: The audience level (e.g., "Débutants", "Avancé", etc.)
+        use_cache: False to bypass the LLM response cache
         
     Returns:
         A structured plan as a Python dictionary
     """
-    # Get API configuration from Flask config
-    api_key = current_app.config['API_KEY']
-    base_url = current_app.config['BASE_URL']
-    model = current_app.config['MODEL']
-    
-    # Create client
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    # Get the shared LLM gateway
+    llm = get_llm(use_cache, stage='plan')
     
     # Build the prompt
-    prompt = f"""
-    Tu es un formateur expert en {domaine}. Ton objectif est de générer un plan de présentation détaillé et pédagogique sur le sujet suivant : {sujet}.
-    Description du sujet : {description_sujet}
-
-    Ce plan est destiné à des apprenants de niveau {niveau_apprenant} en programmation.
-
-    Ce plan doit comporter :
-          - Des sections principales clairement définies.
-          - Pour chaque section, des sous-sections sous forme de guidelines détaillées, spécifiques et pertinentes.
-          - Le contenu doit être progressif, pédagogique et adapté au niveau des apprenants.
-
-    N'intègre pas encore le contenu complet de la présentation, uniquement le plan détaillé avec les titres des sections et sous-sections.
-    Pour la conclusion, génère la conclusion directement sans ajouter de sous-sections.
-
-    Le contenu doit être structuré en JSON. Commence à générer le JSON directement sans ajouter d'autre message.
-
-    Exemple de résultat attendu : {exemple_plan}
-
-    ```json
-    """
+    prompt = PLAN_PROMPT.render(
+        domaine=domaine,
+        sujet=sujet,
+        description_sujet=description_sujet,
+        niveau_apprenant=niveau_apprenant,
+    )
     
     # Get the response
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "user", "content": prompt},
-        ],
-    )
+    response_text = llm.complete(prompt)
 
     # Process the response
-    response_text = response.choices[0].message.content
-    response_json = text_to_json(response_text)
+    response_json = llm.parse_json(response_text, validate_plan)
     return response_json
\ No newline at end of file
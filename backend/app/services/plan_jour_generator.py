@@ -1,8 +1,8 @@
 # app/services/plan_jour_generator.py
 
-from openai import OpenAI
-import json_repair
-from flask import current_app
+from app.services.llm_client import get_llm
+from app.services.llm_parsing import validate_plan_jour
+from app.services.prompts import register_prompt, to_json
 
 # Example daily plan template for demonstration
 exemple_plan_jour = [
@@ -43,11 +43,41 @@ exemple_plan_jour = [
   }
 ]
 
-def text_to_json(text):
-    """Convert text response from LLM to JSON object"""
-    return json_repair.loads(text.replace("```", "").replace("json", "").strip())
+# Static instructions first, the fields of the call last (see PromptTemplate)
+PLAN_JOUR_PROMPT = register_prompt(
+    "plan_jour",
+    prefix=f"""
+    Tu es un formateur expert dans le domaine indiqué à la fin de ce message. Ton objectif est de générer un plan de présentation détaillé
+    et pédagogique sur le sujet indiqué à la fin de ce message, organisé sur le nombre de jours de formation indiqué, pour des apprenants du niveau indiqué.
 
-def generate_plan_jour(domaine, sujet, description_sujet, niveau_apprenant, nombre_jours):
+    Ce plan doit comporter :
+      - Une organisation par jours (de 1 au nombre de jours demandé)
+      - Pour chaque jour, plusieurs sessions principales clairement définies
+      - Pour chaque session, des sous-sections sous forme de guidelines détaillées, spécifiques et pertinentes
+      - Le contenu doit être progressif, pédagogique et adapté au niveau des apprenants
+      - La répartition des sessions doit être équilibrée sur tous les jours
+
+    N'intègre pas encore le contenu complet de la présentation, uniquement le plan détaillé
+    avec les titres des sessions et sous-sections.
+
+    Le contenu doit être structuré exactement selon ce format JSON : une liste de jours, chacun avec son numéro ("jour") et ses sessions ("sessions"), chaque session ayant un titre ("title") et une liste de sous-sections ("subsections").
+
+    Exemple de résultat attendu : {to_json(exemple_plan_jour)}
+
+    Génère une réponse seulement en format JSON. Commence à générer le JSON directement sans ajouter d'autre message.
+    """,
+    suffix="""
+    Domaine : {domaine}
+    Sujet : {sujet}
+    Description du sujet : {description_sujet}
+    Niveau des apprenants : {niveau_apprenant} en {domaine}
+    Nombre de jours : {nombre_jours}
+
+    ```json
+    """,
+)
+
+def generate_plan_jour(domaine, sujet, description_sujet, niveau_apprenant, nombre_jours, use_cache=True):
     """
     Generate a structured presentation plan organized by days based on given parameters
     
@@ -57,75 +87,29 @@ def generate_plan_jour(domaine, sujet, description_sujet, niveau_apprenant, nomb
         description_sujet: A detailed description of what should be covered
         niveau_apprenant: The audience level (e.g., "Débutants", "Avancé", etc.)
         nombre_jours: Number of days for the course (integer)
+        use_cache: False to bypass the LLM response cache
         
     Returns:
         A structured daily plan as a Python list of dictionaries
     """
-    # Get API configuration from Flask config
-    api_key = current_app.config['API_KEY']
-    base_url = current_app.config['BASE_URL']
-    model = current_app.config['MODEL']
-    
-    # Create client
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    # Get the shared LLM gateway
+    llm = get_llm(use_cache, stage='plan_jour')
     
     # Build the prompt
-    prompt = f"""
-    Tu es un formateur expert en {domaine}. Ton objectif est de générer un plan de présentation détaillé 
-    et pédagogique sur le sujet suivant : {sujet}, organisé sur {nombre_jours} jours de formation.
-    
-    Description du sujet : {description_sujet}
-
-    Ce plan est destiné à des apprenants de niveau {niveau_apprenant} en {domaine}.
-
-    Ce plan doit comporter :
-      - Une organisation par jours (de 1 à {nombre_jours})
-      - Pour chaque jour, plusieurs sessions principales clairement définies
-      - Pour chaque session, des sous-sections sous forme de guidelines détaillées, spécifiques et pertinentes
-      - Le contenu doit être progressif, pédagogique et adapté au niveau des apprenants
-      - La répartition des sessions doit être équilibrée sur les {nombre_jours} jours
-
-    N'intègre pas encore le contenu complet de la présentation, uniquement le plan détaillé 
-    avec les titres des sessions et sous-sections.
-
-    Le contenu doit être structuré exactement selon ce format JSON :
-    [
-      {{
-        "jour": 1,
-        "sessions": [
-          {{
-            "title": "Titre de la session 1",
-            "subsections": ["Sous-section 1", "Sous-section 2", "Sous-section 3"]
-          }},
-          {{
-            "title": "Titre de la session 2",
-            "subsections": ["Sous-section 1", "Sous-section 2"]
-          }}
-        ]
-      }},
-      {{
-        "jour": 2,
-        "sessions": [...]
-      }}
-    ]
-
-    Exemple de résultat attendu : {exemple_plan_jour}
-
-    Génère une réponse seulement en format JSON. Commence à générer le JSON directement sans ajouter d'autre message.
-    
-    ```json
-    """
+    prompt = PLAN_JOUR_PROMPT.render(
+        domaine=domaine,
+        sujet=sujet,
+        description_sujet=description_sujet,
+        niveau_apprenant=niveau_apprenant,
+        nombre_jours=nombre_jours,
+    )
     
     # Get the response
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "user", "content": prompt},
-        ],
+    response_text = llm.complete(
+        prompt,
         temperature=0.7,  # Slightly higher temperature for more creative planning
     )
 
     # Process the response
-    response_text = response.choices[0].message.content
-    response_json = text_to_json(response_text)
+    response_json = llm.parse_json(response_text, validate_plan_jour)
     return response_json
\ No newline at end of file
@@ -1,26 +1,43 @@
 from pptx import Presentation
 from pptx.util import Inches, Pt
-from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
-import os
+from app.services.document import Block, Section, Subsection
+from app.services.tables import TableLayout, split_columns
+from app.services.themes import DEFAULT_THEME, get_theme
 
-def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_path="ODC_logo.jpeg", output_filename=None):
+# Table layout, in points
+TABLE_FONT_SIZE = 12
+TABLE_LINE_HEIGHT = 14.4
+TABLE_CHAR_WIDTH = 6.6  # Mean width of a character at TABLE_FONT_SIZE
+TABLE_CELL_PADDING = 14.4  # Left and right margins of a cell (0.1 inch each)
+TABLE_CELL_MARGINS = 7.2  # Top and bottom margins of a cell (0.05 inch each)
+TABLE_MIN_COLUMN_WIDTH = 43
+TABLE_MAX_CELL_LINES = 8  # A cell of more lines is cut, so a row always fits in a slide
+
+def day_title_section(day_number):
+    """Section opening the slides of a day"""
+    return Section(f"Jour {day_number}", [
+        Subsection(f"Programme du Jour {day_number}", [
+            Block(Block.TEXT, f"Voici le contenu de la formation pour le jour {day_number}.")
+        ])
+    ])
+
+def generate_powerpoint(course, logo_path="ODC_logo.jpeg", output_filename=None, theme_id=DEFAULT_THEME):
     """
     Generate a PowerPoint presentation from the content
     
     Args:
-        sujet: Title of the presentation
-        contenu: Content to include in the presentation
-        nom_formateur: Name of the presenter
+        course: The Course to render (see app.services.document)
         logo_path: Path to the logo image
-        output_filename: Optional path to save the file (defaults to sujet.pptx)
+        output_filename: Optional path to save the file (defaults to the title of the course)
+        theme_id: The theme of the presentation (see app.services.themes)
         
     Returns:
         Path to the generated PPTX file
     """
     # Set default output filename if not provided
     if not output_filename:
-        output_filename = f"{sujet}.pptx"
+        output_filename = f"{course.title}.pptx"
     
     # Initialize presentation
     prs = Presentation()
@@ -35,11 +52,33 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
     slide = None
     slide_layout = prs.slide_layouts[6]  # Blank layout
     
-    # Check if logo exists
-    if not os.path.exists(logo_path):
-        # Use a default logo or placeholder
+    # Colors, fonts and the logo, decoded once per process
+    theme = get_theme(theme_id, logo_path)
+    font = theme.fonts['slide']
+    if theme.logo is None:
         print(f"Warning: Logo not found at {logo_path}")
-        logo_path = None
+    
+    def add_frame(slide, color, logo_left, logo_top):
+        """Add the sidebar and the logo of the theme to a slide"""
+        left_bar = slide.shapes.add_shape(
+            1,  # Rectangle
+            0, 0,  # Position x, y
+            Inches(0.2), Inches(7.5)  # Width, height
+        )
+        left_bar.fill.solid()
+        left_bar.fill.fore_color.rgb = color
+        left_bar.line.visible = False
+        
+        # Add logo if it exists
+        if theme.logo is not None:
+            try:
+                slide.shapes.add_picture(
+                    theme.logo.stream(),
+                    logo_left, logo_top,  # Position
+                    width=Inches(1.5)  # Fixed width
+                )
+            except Exception as e:
+                print(f"Error loading logo: {e}")
     
     # Functions for space management and content addition
     def check_space_and_add(content_height):
@@ -50,31 +89,12 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
             current_top = margin_top
             
             # Add orange sidebar and logo to each new slide
-            orange_color = RGBColor(255, 121, 0)
-            left_bar = slide.shapes.add_shape(
-                1,  # Rectangle
-                0, 0,  # Position x, y
-                Inches(0.2), Inches(7.5)  # Width, height
-            )
-            left_bar.fill.solid()
-            left_bar.fill.fore_color.rgb = orange_color
-            left_bar.line.visible = False
-            
-            # Add logo if it exists
-            if logo_path:
-                try:
-                    slide.shapes.add_picture(
-                        logo_path,
-                        Inches(0.5), Inches(7),  # Position
-                        width=Inches(1.5)  # Fixed width
-                    )
-                except Exception as e:
-                    print(f"Error loading logo: {e}")
+            add_frame(slide, theme.rgb['primary'], Inches(0.5), Inches(7))
                     
         return current_top
     
-    def add_title(text, top, size=20, color=RGBColor(255, 121, 0), bold=True):
-        """Add a title to the slide"""
+    def add_title(text, top, size=20, color=None, bold=True):
+        """Add a title to the slide (in the primary color by default)"""
         nonlocal slide
         textbox = slide.shapes.add_textbox(left_margin, top, content_width, Inches(0.5))
         p = textbox.text_frame.paragraphs[0]
@@ -82,8 +102,8 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
         run = p.runs[0]
         run.font.size = Pt(size)
         run.font.bold = bold
-        run.font.color.rgb = color
-        run.font.name = 'Inter'
+        run.font.color.rgb = color or theme.rgb['primary']
+        run.font.name = font
         return textbox.height
     
     def add_dynamic_textbox(text, top, max_width=content_width, max_height=Inches(2.5)):
@@ -105,7 +125,7 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
         
         initial_font_size = Pt(13)
         p.runs[0].font.size = initial_font_size
-        p.runs[0].font.name = 'Inter'
+        p.runs[0].font.name = font
         
         for _ in range(10):
             if textbox.height <= max_height:
@@ -138,7 +158,7 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
             initial_font_size = Pt(15)
             run = p.runs[0] if p.runs else p.add_run()
             run.font.size = initial_font_size
-            run.font.name = 'Inter'
+            run.font.name = font
             
         current_font_size = Pt(14)
         for _ in range(10):
@@ -169,13 +189,12 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
             height
         )
         
-        # Background color #FEFEFE
         background_shape.fill.solid()
-        background_shape.fill.fore_color.rgb = RGBColor(254, 254, 254)
+        background_shape.fill.fore_color.rgb = theme.rgb['slide_code_background']
         
         background_shape.line.visible = True
         background_shape.line.dash_style = 2
-        background_shape.line.color.rgb = RGBColor(0, 0, 0)
+        background_shape.line.color.rgb = theme.rgb['text']
         background_shape.line.width = Pt(0.9)
         
         textbox = slide.shapes.add_textbox(left, top, width, height)
@@ -187,70 +206,64 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
             p.text = line
             p.level = 0
             run = p.runs[0] if p.runs else p.add_run()
-            run.font.name = 'Consolas'
+            run.font.name = theme.fonts['slide_mono']
             run.font.size = Pt(12)
-            run.font.color.rgb = RGBColor(50, 50, 50)
+            run.font.color.rgb = theme.rgb['slide_code_text']
             
         return height
     
-    def add_table(data, top):
-        """Add a table to the slide"""
-        nonlocal slide
-        rows, cols = len(data), len(data[0])
-        table_width = content_width
-        height = Inches(1.5)
+    def add_table(data):
+        """Add a table at the current position, continued on the next slides with its header repeated"""
+        nonlocal current_top
+        bottom = slide_height - Inches(0.5)
         
-        table_shape = slide.shapes.add_table(rows, cols, left_margin, top, table_width, height).table
+        def row_height(lines):
+            return Pt(lines * TABLE_LINE_HEIGHT + TABLE_CELL_MARGINS)
         
-        # Header style
-        for col_idx in range(cols):
-            cell = table_shape.cell(0, col_idx)
-            cell.fill.solid()
-            cell.fill.fore_color.rgb = RGBColor(133, 179, 222)  # Light blue for header
-            cell.text_frame.paragraphs[0].font.bold = True
-            cell.text_frame.paragraphs[0].font.size = Pt(12)
+        # Columns that do not fit in the width go to the next table
+        for part in split_columns(data, int(content_width.pt // TABLE_MIN_COLUMN_WIDTH)):
+            layout = TableLayout(part, content_width.pt, TABLE_CHAR_WIDTH, padding=TABLE_CELL_PADDING,
+                                 min_width=TABLE_MIN_COLUMN_WIDTH, max_lines=TABLE_MAX_CELL_LINES)
+            
+            # Start on the next slide when the header and a first row do not fit on this one
+            first_rows = row_height(layout.lines[0]) + (row_height(layout.lines[1]) if layout.rows else 0)
+            continue_here = slide is not None and current_top + first_rows <= bottom
+            pages = layout.pages(row_height, bottom - margin_top,
+                                 bottom - current_top if continue_here else None)
             
-        # Cell style
-        for row_idx, row in enumerate(data):
-            for col_idx, value in enumerate(row):
-                cell = table_shape.cell(row_idx, col_idx)
-                cell.text = str(value)
-                cell.text_frame.paragraphs[0].font.size = Pt(12)
+            for page_index, (start, end) in enumerate(pages):
+                if page_index > 0 or not continue_here:
+                    check_space_and_add(slide_height)  # Always a new slide
+                top = current_top
+                rows = [layout.header] + layout.rows[start:end]
+                heights = [row_height(lines) for lines in [layout.lines[0]] + layout.lines[1 + start:1 + end]]
                 
-                # Alternating row colors
-                if row_idx > 0:  # Skip header
-                    cell.fill.solid()
-                    cell.fill.fore_color.rgb = RGBColor(247, 245, 245)  # Light gray
-                    
-        return height
+                table_shape = slide.shapes.add_table(len(rows), layout.columns, left_margin, top,
+                                                     Pt(sum(layout.widths)), sum(heights)).table
+                for col_idx, width in enumerate(layout.widths):
+                    table_shape.columns[col_idx].width = Pt(width)
+                
+                for row_idx, (row, height) in enumerate(zip(rows, heights)):
+                    table_shape.rows[row_idx].height = height
+                    for col_idx, value in enumerate(row):
+                        cell = table_shape.cell(row_idx, col_idx)
+                        cell.text = value
+                        cell.fill.solid()
+                        # Header, then light gray rows
+                        cell.fill.fore_color.rgb = theme.rgb['slide_table_header' if row_idx == 0 else 'slide_table_row']
+                        for paragraph in cell.text_frame.paragraphs:
+                            for run in paragraph.runs:
+                                run.font.size = Pt(TABLE_FONT_SIZE)
+                                run.font.bold = row_idx == 0
+                
+                current_top = top + sum(heights) + line_spacing
     
     def add_custom_title_slide(title, subtitle, presenter_name, presenter_title):
         """Add a title slide to the presentation"""
         slide = prs.slides.add_slide(slide_layout)
         
-        # Orange sidebar color
-        orange_color = RGBColor(255, 121, 0)
-        
-        # Add orange sidebar
-        left_bar = slide.shapes.add_shape(
-            1,  # Rectangle
-            0, 0,  # Position x, y
-            Inches(0.2), Inches(7.5)  # Width, height
-        )
-        left_bar.fill.solid()
-        left_bar.fill.fore_color.rgb = orange_color
-        left_bar.line.visible = False
-        
-        # Add logo if it exists
-        if logo_path:
-            try:
-                slide.shapes.add_picture(
-                    logo_path,
-                    Inches(8), Inches(0.5),  # Position
-                    width=Inches(1.5)  # Fixed width
-                )
-            except Exception as e:
-                print(f"Error loading logo: {e}")
+        # Orange sidebar and logo
+        add_frame(slide, theme.rgb['primary'], Inches(8), Inches(0.5))
                 
         # Main title
         textbox = slide.shapes.add_textbox(Inches(0.8), Inches(2.8), Inches(8), Inches(1))
@@ -258,9 +271,9 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
         p = text_frame.paragraphs[0]
         p.text = title
         p.font.size = Pt(60)
-        p.font.name = 'Inter'
+        p.font.name = font
         p.font.bold = True
-        p.font.color.rgb = RGBColor(255, 121, 0)
+        p.font.color.rgb = theme.rgb['primary']
         
         # Subtitle
         textbox = slide.shapes.add_textbox(Inches(2), Inches(4), Inches(8), Inches(1))
@@ -268,45 +281,24 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
         p = text_frame.paragraphs[0]
         p.text = subtitle
         p.font.size = Pt(24)
-        p.font.color.rgb = RGBColor(0, 0, 0)
+        p.font.color.rgb = theme.rgb['text']
         
     def add_presenter_slide(presenter_name, presenter_title):
         """Add a presenter slide to the presentation"""
         slide = prs.slides.add_slide(slide_layout)
         
-        # Orange sidebar color
-        orange_color = RGBColor(255, 102, 0)
-        
-        # Orange sidebar
-        left_bar = slide.shapes.add_shape(
-            1,  # Rectangle
-            0, 0,  # Position x, y
-            Inches(0.2), Inches(7.5)  # Width, height
-        )
-        left_bar.fill.solid()
-        left_bar.fill.fore_color.rgb = orange_color
-        left_bar.line.visible = False
-        
-        # Add logo if it exists
-        if logo_path:
-            try:
-                slide.shapes.add_picture(
-                    logo_path,
-                    Inches(8), Inches(0.5),  # Position
-                    width=Inches(1.5)  # Fixed width
-                )
-            except Exception as e:
-                print(f"Error loading logo: {e}")
+        # Orange sidebar and logo
+        add_frame(slide, theme.rgb['primary_dark'], Inches(8), Inches(0.5))
                 
         # Slide title
         textbox = slide.shapes.add_textbox(Inches(0.8), Inches(2.8), Inches(8), Inches(1))
         text_frame = textbox.text_frame
         p = text_frame.paragraphs[0]
         p.text = "Présenté par"
-        p.font.name = 'Inter'
+        p.font.name = font
         p.font.size = Pt(60)
         p.font.bold = True
-        p.font.color.rgb = RGBColor(0, 0, 0)
+        p.font.color.rgb = theme.rgb['text']
         
         # Presenter name
 # Presenter title
@@ -315,35 +307,14 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
         p = text_frame.paragraphs[0]
         p.text = "Formateur"
         p.font.size = Pt(18)
-        p.font.color.rgb = RGBColor(0, 0, 0)
+        p.font.color.rgb = theme.rgb['text']
     
     def add_plan_slide(formation_dates=""):
         """Add a plan slide to the presentation"""
         slide = prs.slides.add_slide(slide_layout)
         
-        # Orange sidebar color
-        orange_color = RGBColor(255, 102, 0)
-        
-        # Orange sidebar
-        left_bar = slide.shapes.add_shape(
-            1,  # Rectangle
-            0, 0,  # Position x, y
-            Inches(0.2), Inches(7.5)  # Width, height
-        )
-        left_bar.fill.solid()
-        left_bar.fill.fore_color.rgb = orange_color
-        left_bar.line.visible = False
-        
-        # Add logo if it exists
-        if logo_path:
-            try:
-                slide.shapes.add_picture(
-                    logo_path,
-                    Inches(8), Inches(0.5),  # Position
-                    width=Inches(1.5)  # Fixed width
-                )
-            except Exception as e:
-                print(f"Error loading logo: {e}")
+        # Orange sidebar and logo
+        add_frame(slide, theme.rgb['primary_dark'], Inches(8), Inches(0.5))
                 
         # Slide title
         textbox = slide.shapes.add_textbox(Inches(0.8), Inches(2.8), Inches(8), Inches(1))
@@ -351,9 +322,9 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
         p = text_frame.paragraphs[0]
         p.text = "Plan de formation"
         p.font.size = Pt(60)
-        p.font.name = 'Inter'
+        p.font.name = font
         p.font.bold = True
-        p.font.color.rgb = RGBColor(0, 0, 0)
+        p.font.color.rgb = theme.rgb['text']
         
         # Dates if provided
         if formation_dates:
@@ -362,63 +333,71 @@ def generate_powerpoint(sujet, contenu, nom_formateur="AIT TALEB AYOUB", logo_pa
             p = text_frame.paragraphs[0]
             p.text = formation_dates
             p.font.size = Pt(24)
-            p.font.name = 'Inter'
-            p.font.color.rgb = RGBColor(0, 0, 0)
+            p.font.name = font
+            p.font.color.rgb = theme.rgb['text']
     
     # Start generating the presentation
     
     # Add initial slides
     add_custom_title_slide(
         "Formation",
-        sujet,
-        nom_formateur,
+        course.title,
+        course.trainer,
         "Formateur"
     )
     
     add_presenter_slide(
-        nom_formateur,
+        course.trainer,
         "Formateur"
     )
     
     add_plan_slide()
     
     # Generate content slides
-    for sections in contenu:
+    for day in course.days:
+        sections = day.sections
+        if course.daily:
+            sections = (day_title_section(day.number),) + sections
+        
         for section in sections:
             # Check space and add a new slide if needed
             title_height = check_space_and_add(Inches(0.6))
             # Add section title
-            add_title(section["title"], title_height)
+            add_title(section.title, title_height)
             current_top += Inches(0.6)
             
-            for sub in section.get("subsections", []):
+            for sub in section.subsections:
                 # Check space for the subtitle
                 subtitle_height = check_space_and_add(Inches(0.5))
                 
                 # Add the subtitle
-                add_title(f'• {sub["title"]}', subtitle_height, size=16, bold=True, color=RGBColor(0, 0, 0))
+                add_title(f'• {sub.title}', subtitle_height, size=16, bold=True, color=theme.rgb['text'])
                 current_top += Inches(0.4) + line_spacing
                 
                 # Add content by type
-                if "content" in sub:
-                    content_height = check_space_and_add(Inches(0.6))
-                    add_dynamic_textbox(sub["content"], content_height)
-                    current_top += Inches(0.6) + line_spacing
-                
-                if "bullets" in sub:
-                    bullets_height = check_space_and_add(Inches(1))
-                    dynamic_bullets_height = add_dynamic_bullets(sub["bullets"], bullets_height)
-                    current_top += dynamic_bullets_height + line_spacing
-                
-                if "code" in sub:
-                    code_height = check_space_and_add(Inches(0.4 + 0.3 * len(sub["code"])))
-                    add_code_block(sub["code"], code_height)
-                    current_top += Inches(0.4 + 0.3 * len(sub["code"])) + line_spacing
-                
-                if "table" in sub:
-                    table_height = check_space_and_add(Inches(1.5))
-                    add_table(sub["table"], table_height)
-                    current_top += Inches(1.5) + line_spacing
+                for block in sub.blocks:
+                    if block.kind == Block.TEXT:
+                        content_height = check_space_and_add(Inches(0.6))
+                        add_dynamic_textbox(block.value, content_height)
+                        current_top += Inches(0.6) + line_spacing
+                    
+                    elif block.kind == Block.EXAMPLE:
+                        content_height = check_space_and_add(Inches(0.6))
+                        add_dynamic_textbox("Exemple: " + block.value, content_height)
+                        current_top += Inches(0.6) + line_spacing
+                    
+                    elif block.kind == Block.BULLETS:
+                        bullets_height = check_space_and_add(Inches(1))
+                        dynamic_bullets_height = add_dynamic_bullets(block.value, bullets_height)
+                        current_top += dynamic_bullets_height + line_spacing
+                    
+                    elif block.kind == Block.CODE:
+                        code_height = check_space_and_add(Inches(0.4 + 0.3 * len(block.value)))
+                        add_code_block(block.value, code_height)
+                        current_top += Inches(0.4 + 0.3 * len(block.value)) + line_spacing
+                    
+                    elif block.kind == Block.TABLE:
+                        add_table(block.value)
     
     # Save the presentation
     prs.save(output_filename)
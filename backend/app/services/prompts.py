@@ -0,0 +1,86 @@
+# app/services/prompts.py
+import json
+import textwrap
+import threading
+from app.utils.helpers import estimate_tokens
+
+
+def to_json(value):
+    """Serialize an example for a prompt: real JSON, on one line to save tokens"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+class PromptTemplate:
+    """
+    A prompt made of a static prefix and a variable suffix
+
+    The prefix (instructions and examples) is built once, when the template
+    is registered, and is identical for every call, so providers that cache
+    prompt prefixes can reuse it. Only the suffix is formatted with the
+    fields of the call, and it comes last.
+    """
+
+    def __init__(self, name, prefix, suffix):
+        self.name = name
+        self.prefix = textwrap.dedent(prefix).strip() + "\n\n"
+        self.suffix = textwrap.dedent(suffix).strip() + "\n"
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.variable_tokens = 0
+
+    def render(self, **fields):
+        """
+        Build the prompt of a call
+
+        Args:
+            **fields: The values of the placeholders of the suffix
+
+        Returns:
+            The full prompt
+        """
+        variable = self.suffix.format(**fields)
+        with self._lock:
+            self.calls += 1
+            self.variable_tokens += estimate_tokens(variable)
+        return self.prefix + variable
+
+    def stats(self):
+        """Return the estimated input size of the calls made with the template"""
+        with self._lock:
+            calls, variable_tokens = self.calls, self.variable_tokens
+        return {
+            'calls': calls,
+            'prefix_tokens': self.prefix_tokens,
+            'mean_variable_tokens': round(variable_tokens / calls, 1) if calls else None,
+            'input_tokens': calls * self.prefix_tokens + variable_tokens,
+        }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def register_prompt(name, prefix, suffix):
+    """
+    Compile a prompt template and add it to the registry
+
+    Args:
+        name: Unique name of the template (e.g. "content.section")
+        prefix: The static instructions and examples
+        suffix: The variable part, with str.format placeholders
+
+    Returns:
+        The PromptTemplate
+    """
+    template = PromptTemplate(name, prefix, suffix)
+    with _registry_lock:
+        _registry[name] = template
+    return template
+
+
+def prompt_stats():
+    """Return the stats of every registered template, by name"""
+    with _registry_lock:
+        templates = list(_registry.values())
+    return {template.name: template.stats() for template in templates}
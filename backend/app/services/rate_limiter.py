@@ -0,0 +1,286 @@
+# app/services/rate_limiter.py
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from app.services.resilience import DeadlineExceeded
+from app.utils.concurrency import Cancelled, CANCEL_POLL_INTERVAL
+
+
+class MemoryBucketStore:
+    """Token buckets kept in the memory of the process"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, limits, amounts):
+        """
+        Take amounts from several buckets at once, or from none of them
+
+        Args:
+            limits: Dict of bucket name -> (capacity, refill per second)
+            amounts: Dict of bucket name -> amount to take
+
+        Returns:
+            0 if the amounts were taken, otherwise the seconds to wait before retrying
+        """
+        now = time.time()
+        with self._lock:
+            levels = {}
+            for name, (capacity, rate) in limits.items():
+                tokens, updated_at = self._buckets.get(name, (capacity, now))
+                levels[name] = min(capacity, tokens + (now - updated_at) * rate)
+            wait = _missing_wait(limits, amounts, levels)
+            if wait == 0:
+                for name in limits:
+                    levels[name] -= amounts.get(name, 0)
+            for name, tokens in levels.items():
+                self._buckets[name] = (tokens, now)
+            return wait
+
+    def give(self, name, capacity, amount):
+        """Put back an amount into a bucket, capped at its capacity"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(name, (capacity, time.time()))
+            self._buckets[name] = (min(capacity, tokens + amount), updated_at)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets shared by every process using the same SQLite file
+
+    Each operation runs in its own IMMEDIATE transaction, which serializes
+    the gunicorn workers on the database lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def take(self, limits, amounts):
+        """See MemoryBucketStore.take"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            rows = dict(
+                (name, (tokens, updated_at))
+                for name, tokens, updated_at in conn.execute("SELECT name, tokens, updated_at FROM buckets")
+            )
+            levels = {}
+            for name, (capacity, rate) in limits.items():
+                tokens, updated_at = rows.get(name, (capacity, now))
+                levels[name] = min(capacity, tokens + (now - updated_at) * rate)
+            wait = _missing_wait(limits, amounts, levels)
+            if wait == 0:
+                for name in limits:
+                    levels[name] -= amounts.get(name, 0)
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                [(name, tokens, now) for name, tokens in levels.items()]
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def give(self, name, capacity, amount):
+        """See MemoryBucketStore.give"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE name = ?",
+                (capacity, amount, name)
+            )
+        finally:
+            conn.close()
+
+
+def _missing_wait(limits, amounts, levels):
+    """Seconds until every bucket holds its requested amount (0 if they already do)"""
+    wait = 0.0
+    for name, (capacity, rate) in limits.items():
+        missing = amounts.get(name, 0) - levels[name]
+        if missing > 0:
+            wait = max(wait, missing / rate)
+    return wait
+
+
+class OutboundScheduler:
+    """
+    Rate limiter and fair scheduler for outbound LLM requests
+
+    Enforces a requests-per-minute and a tokens-per-minute budget (0 means
+    unlimited). Waiting requests are grouped by flow, one flow per generation
+    request, and flows are served round-robin: a course with 30 queued
+    sessions gets one slot, then the single plan request waiting behind it
+    gets the next one.
+    """
+
+    def __init__(self, store, requests_per_minute=0, tokens_per_minute=0, completion_tokens=2000):
+        self.store = store
+        self.completion_tokens = completion_tokens  # Tokens reserved for the answer of each call
+        self.limits = {}
+        if requests_per_minute:
+            self.limits['requests'] = (requests_per_minute, requests_per_minute / 60)
+        if tokens_per_minute:
+            self.limits['tokens'] = (tokens_per_minute, tokens_per_minute / 60)
+        self._queues = {}
+        self._order = deque()
+        self._cond = threading.Condition()
+        self.counters = {'granted': 0, 'waited': 0, 'wait_seconds': 0.0}
+
+    def _clamp(self, tokens):
+        # A request larger than the whole budget could never be granted
+        if 'tokens' in self.limits:
+            return min(tokens, self.limits['tokens'][0])
+        return tokens
+
+    def acquire(self, flow, tokens, timeout=None, cancel=None):
+        """
+        Wait until a request of about ``tokens`` tokens may be sent
+
+        Args:
+            flow: Identifier of the generation request the call belongs to
+            tokens: Estimated tokens of the call (prompt and completion)
+            timeout: Optional maximum number of seconds to wait
+            cancel: Optional CancelToken of the request; the call leaves the
+                queue when it is cancelled
+
+        Returns:
+            The number of tokens reserved, to be passed to settle
+
+        Raises:
+            DeadlineExceeded: If the budget is not available within timeout
+            Cancelled: If the token is cancelled while waiting
+        """
+        if not self.limits:
+            return 0
+        tokens = self._clamp(tokens)
+        amounts = {'requests': 1, 'tokens': tokens}
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        start = time.monotonic()
+        ticket = object()
+
+        with self._cond:
+            queue = self._queues.setdefault(flow, deque())
+            queue.append(ticket)
+            if flow not in self._order:
+                self._order.append(flow)
+        try:
+            while True:
+                with self._cond:
+                    # Only the first ticket of the flow at the head of the rotation may take the budget
+                    while self._order[0] != flow or queue[0] is not ticket:
+                        if expires_at is not None and time.monotonic() >= expires_at:
+                            raise DeadlineExceeded('Timed out waiting for the LLM rate limit')
+                        self._cond.wait(self._wait_time(cancel, expires_at))
+                if cancel is not None:
+                    cancel.check()
+
+                # The turn is kept without the lock: with the SQLite store, take waits for the database
+                wait = self.store.take(self.limits, amounts)
+                if wait == 0:
+                    break
+                if expires_at is not None and time.monotonic() + wait > expires_at:
+                    raise DeadlineExceeded('Timed out waiting for the LLM rate limit')
+                # Keep the turn while sleeping, the budget is for this ticket
+                retry_at = time.monotonic() + wait
+                with self._cond:
+                    while time.monotonic() < retry_at:
+                        self._cond.wait(self._wait_time(cancel, retry_at))
+        finally:
+            with self._cond:
+                had_turn = self._order[0] == flow and queue[0] is ticket
+                queue.remove(ticket)
+                if had_turn:
+                    self._order.popleft()
+                    if queue:
+                        # Back to the end of the rotation
+                        self._order.append(flow)
+                elif not queue:
+                    self._order.remove(flow)
+                if not queue:
+                    del self._queues[flow]
+                self._cond.notify_all()
+
+        with self._cond:
+            waited = time.monotonic() - start
+            self.counters['granted'] += 1
+            if waited > 0.01:
+                self.counters['waited'] += 1
+                self.counters['wait_seconds'] += waited
+        return tokens
+
+    @staticmethod
+    def _wait_time(cancel, until):
+        """
+        Seconds to wait on the condition before checking again, short enough to notice a cancelled token
+
+        Raises:
+            Cancelled: If the token is cancelled
+        """
+        if cancel is not None and cancel.cancelled:
+            raise Cancelled(cancel.reason)
+        remaining = None if until is None else max(0.0, until - time.monotonic())
+        if cancel is not None:
+            remaining = CANCEL_POLL_INTERVAL if remaining is None else min(remaining, CANCEL_POLL_INTERVAL)
+        return remaining
+
+    def settle(self, reserved, used):
+        """Give back the reserved tokens a call did not use"""
+        if 'tokens' in self.limits and used is not None and reserved > used:
+            self.store.give('tokens', self.limits['tokens'][0], reserved - used)
+
+    def stats(self):
+        """Return the grant counters and the current queue"""
+        with self._cond:
+            stats = dict(self.counters)
+            stats['wait_seconds'] = round(stats['wait_seconds'], 2)
+            stats['waiting'] = sum(len(queue) for queue in self._queues.values())
+            stats['waiting_flows'] = len(self._queues)
+        stats['requests_per_minute'] = self.limits.get('requests', (0,))[0]
+        stats['tokens_per_minute'] = self.limits.get('tokens', (0,))[0]
+        return stats
+
+
+def init_rate_limiter(app):
+    """
+    Create the outbound LLM scheduler of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The OutboundScheduler stored in app.extensions['llm_scheduler']
+    """
+    limited = app.config['LLM_RATE_LIMIT_RPM'] > 0 or app.config['LLM_RATE_LIMIT_TPM'] > 0
+    # Without a limit the buckets are never used: do not create the shared database
+    if limited and app.config['LLM_RATE_LIMIT_DB']:
+        store = SQLiteBucketStore(app.config['LLM_RATE_LIMIT_DB'])
+    else:
+        store = MemoryBucketStore()
+    scheduler = OutboundScheduler(
+        store,
+        requests_per_minute=app.config['LLM_RATE_LIMIT_RPM'],
+        tokens_per_minute=app.config['LLM_RATE_LIMIT_TPM'],
+        completion_tokens=app.config['LLM_EXPECTED_COMPLETION_TOKENS'],
+    )
+    app.extensions['llm_scheduler'] = scheduler
+    return scheduler
@@ -0,0 +1,218 @@
+# app/services/rendering.py
+import math
+import itertools
+import threading
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+try:
+    import resource
+    import signal
+except ImportError:  # Windows: no memory ceiling nor in-process timeout
+    resource = None
+    signal = None
+
+class RenderTimeout(Exception):
+    """Raised when a PDF/PPTX render does not finish within its timeout."""
+
+
+# Queue the render processes report the start of each render to (see RenderPool.wait)
+_started_queue = None
+
+
+def _init_worker(memory_limit, started_queue=None):
+    """Set the address space ceiling of a render process"""
+    global _started_queue
+    _started_queue = started_queue
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout('Render timed out')
+
+
+def _render(kind, output_path, args, kwargs, timeout, task_id=None):
+    """Run one render in a pool process; the renderers are imported there, not in the web workers"""
+    if task_id is not None and _started_queue is not None:
+        _started_queue.put(task_id)
+    if timeout and signal is not None:
+        # Tasks run in the main thread of the pool process, so an alarm can interrupt them
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(math.ceil(timeout))
+    try:
+        if kind == 'pdf':
+            from app.services.pdf_generator import create_pdf
+            create_pdf(output_path, *args, **kwargs)
+        elif kind == 'pptx':
+            from app.services.pptx_generator import generate_powerpoint
+            generate_powerpoint(*args, output_filename=output_path, **kwargs)
+        else:
+            raise ValueError(f"Unknown render kind '{kind}'")
+    finally:
+        if timeout and signal is not None:
+            signal.alarm(0)
+    return output_path
+
+
+def _remove_output(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Error removing the abandoned render {path}: {str(e)}")
+
+
+class RenderPool:
+    """
+    Process pool running the CPU-bound PDF and PPTX renders
+
+    reportlab and python-pptx hold the GIL for the whole render, so they
+    run in separate processes instead of the request threads. Each process
+    renders at most ``max_tasks_per_child`` documents before it is replaced,
+    so memory held by a large document is returned to the system. A render
+    is interrupted after ``timeout`` seconds, and the address space of the
+    processes is capped at ``memory_limit`` bytes. With ``max_workers`` 0,
+    renders run in the calling thread.
+    """
+
+    def __init__(self, max_workers=2, max_tasks_per_child=20, timeout=120, memory_limit=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        # Start of the renders: task id -> Event, set when a process begins the render
+        self._task_ids = itertools.count()
+        self._starts = {}
+        self._started = {}  # Future -> Event of its task
+        self._lock = threading.Lock()
+        if max_workers > 0:
+            # Spawned processes do not inherit the threads and sockets of the web worker
+            context = multiprocessing.get_context('spawn')
+            self._started_queue = context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(memory_limit, self._started_queue),
+                max_tasks_per_child=max_tasks_per_child or None,
+            )
+            self._listener = threading.Thread(target=self._listen, name='render-starts', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        """Mark the renders started as the processes report them"""
+        while True:
+            task_id = self._started_queue.get()
+            if task_id is None:
+                return
+            with self._lock:
+                event = self._starts.pop(task_id, None)
+            if event is not None:
+                event.set()
+
+    def submit(self, kind, output_path, *args, **kwargs):
+        """
+        Start a render
+
+        Args:
+            kind: "pdf" (create_pdf) or "pptx" (generate_powerpoint)
+            output_path: The file to write
+            *args, **kwargs: The other arguments of the renderer
+
+        Returns:
+            A Future of the output path, to pass to wait
+        """
+        if self._executor is None:
+            from concurrent.futures import Future
+            future = Future()
+            try:
+                future.set_result(_render(kind, output_path, args, kwargs, None))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        task_id = next(self._task_ids)
+        started = threading.Event()
+        with self._lock:
+            self._starts[task_id] = started
+        future = self._executor.submit(_render, kind, output_path, args, kwargs, self.timeout, task_id)
+        with self._lock:
+            self._started[future] = started
+        future.add_done_callback(lambda _: self._forget(future, task_id))
+        return future
+
+    def _forget(self, future, task_id):
+        with self._lock:
+            self._starts.pop(task_id, None)
+            self._started.pop(future, None)
+
+    def wait(self, future, output_path=None):
+        """
+        Return the output path of a render
+
+        The timeout counts from the start of the render, so a render queued
+        behind others in a busy pool is not timed out before it runs. A
+        render given up is cancelled if it has not started, otherwise its
+        output is deleted once it is written.
+
+        Args:
+            future: The Future returned by submit
+            output_path: The file the render writes, deleted when the render is given up
+
+        Raises:
+            RenderTimeout: If the render did not finish in time
+            MemoryError: If the render went over the memory ceiling
+            The error of the renderer otherwise
+        """
+        if not self.timeout or self._executor is None:
+            return future.result()
+        with self._lock:
+            started = self._started.get(future)
+        # Wait for a process to begin the render; the executor marks it running as soon as it is queued
+        while started is not None and not started.wait(0.1) and not future.done():
+            pass
+        # The render process interrupts itself; this only covers a process stuck outside Python code
+        try:
+            return future.result(self.timeout + 5)
+        except FutureTimeoutError:
+            self._abandon(future, output_path)
+            raise RenderTimeout(f'Render did not finish within {self.timeout}s')
+
+    @staticmethod
+    def _abandon(future, output_path):
+        """Cancel a render nobody waits for anymore, or delete its output when it finishes"""
+        if future.cancel() or output_path is None:
+            return
+        future.add_done_callback(lambda _: _remove_output(output_path))
+
+    def render(self, kind, output_path, *args, **kwargs):
+        """Render a document and wait for it (see submit and wait)"""
+        return self.wait(self.submit(kind, output_path, *args, **kwargs), output_path)
+
+    def shutdown(self, wait=True):
+        # Without waiting, the executor can race with the replacement of a recycled process
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._started_queue.put(None)
+
+
+def init_render_pool(app):
+    """
+    Create the render process pool of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The RenderPool stored in app.extensions['render_pool']
+    """
+    memory_limit = app.config['RENDER_MEMORY_LIMIT_MB'] * 1024 * 1024
+    pool = RenderPool(
+        max_workers=app.config['RENDER_MAX_WORKERS'],
+        max_tasks_per_child=app.config['RENDER_MAX_TASKS_PER_CHILD'],
+        timeout=app.config['RENDER_TIMEOUT'],
+        memory_limit=memory_limit or None,
+    )
+    app.extensions['render_pool'] = pool
+    return pool
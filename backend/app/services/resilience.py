@@ -0,0 +1,261 @@
+# app/services/resilience.py
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import openai
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an LLM call cannot complete before its deadline."""
+
+
+def is_retryable(error):
+    """Tell whether an LLM error is worth retrying (rate limits, 5xx, network errors)"""
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409) or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error):
+    """Return the delay requested by a Retry-After header, or None"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        """Return the p-th percentile (0-100) of the window, or None if empty"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class ResiliencePolicy:
+    """
+    Retry, deadline and hedging policy shared by all LLM calls
+
+    Failed calls are retried with full-jitter exponential backoff, waiting
+    at least the Retry-After delay sent by the provider. Every call has a
+    deadline covering all its attempts.
+
+    With hedging enabled, a duplicate request is sent once an attempt runs
+    longer than the ``hedge_percentile`` latency of recent calls; the first
+    successful answer wins. The slower request is not interrupted; its
+    answer is handed to the ``discard`` function of the call when it
+    arrives, so an open stream can be closed. Streamed calls only wait for
+    the response headers, so their latencies are tracked apart from those
+    of complete answers.
+    """
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0, deadline=300.0,
+                 hedge_percentile=None, hedge_min_samples=20, hedge_workers=8):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = LatencyTracker()
+        self.stream_latencies = LatencyTracker()  # Time to the response headers of streamed calls
+        self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='hedge') \
+            if hedge_percentile else None
+        self._lock = threading.Lock()
+        self.counters = {
+            'calls': 0,
+            'retries': 0,
+            'failures': 0,
+            'deadline_exceeded': 0,
+            'hedges': 0,
+            'hedge_wins': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def backoff(self, attempt, error=None):
+        """
+        Return the delay before a retry (attempt starts at 0)
+
+        max_delay only bounds the jitter; a Retry-After delay of the provider
+        is always waited in full, call gives up when it passes the deadline.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def hedge_delay(self, stream=False):
+        """Return the latency after which a duplicate request is sent, or None"""
+        latencies = self.stream_latencies if stream else self.latencies
+        if not self.hedge_percentile or len(latencies) < self.hedge_min_samples:
+            return None
+        return latencies.percentile(self.hedge_percentile)
+
+    def call(self, fn, deadline=None, stream=False, discard=None):
+        """
+        Run an LLM call under the policy
+
+        Args:
+            fn: Function called with the timeout (seconds) left for one attempt
+            deadline: Optional number of seconds for the whole call,
+                defaults to the policy deadline
+            stream: Whether fn only waits for the headers of a streamed answer
+            discard: Optional function called with the result of a hedged
+                request that lost, e.g. to close its connection
+
+        Returns:
+            The result of fn
+
+        Raises:
+            DeadlineExceeded: If the deadline passed before a successful attempt
+            The error of the last attempt when it is not retryable or retries are exhausted
+        """
+        self._count('calls')
+        deadline = deadline if deadline is not None else self.deadline
+        expires_at = time.monotonic() + deadline if deadline else None
+
+        attempt = 0
+        while True:
+            timeout = None
+            if expires_at is not None:
+                timeout = expires_at - time.monotonic()
+                if timeout <= 0:
+                    self._count('deadline_exceeded')
+                    raise DeadlineExceeded(f'LLM call exceeded its {deadline}s deadline')
+
+            try:
+                return self._attempt(fn, timeout, stream, discard)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                delay = self.backoff(attempt, e)
+                if expires_at is not None and time.monotonic() + delay >= expires_at:
+                    self._count('deadline_exceeded')
+                    raise DeadlineExceeded(f'LLM call exceeded its {deadline}s deadline') from e
+                print(f"LLM call failed ({str(e)}), retrying in {delay:.1f}s")
+                self._count('retries')
+                attempt += 1
+                time.sleep(delay)
+
+    def _attempt(self, fn, timeout, stream=False, discard=None):
+        """Run one attempt, hedged if the latency history allows it"""
+        latencies = self.stream_latencies if stream else self.latencies
+        hedge_delay = self.hedge_delay(stream)
+        if hedge_delay is None or (timeout is not None and hedge_delay >= timeout):
+            start = time.monotonic()
+            result = fn(timeout)
+            latencies.add(time.monotonic() - start)
+            return result
+
+        start = time.monotonic()
+        primary = self._hedge_executor.submit(fn, timeout)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            result = primary.result()
+            latencies.add(time.monotonic() - start)
+            return result
+
+        self._count('hedges')
+        remaining = None if timeout is None else timeout - hedge_delay
+        hedge = self._hedge_executor.submit(fn, remaining)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is hedge:
+                    self._count('hedge_wins')
+                latencies.add(time.monotonic() - start)
+                if discard is not None:
+                    # The other request may have finished at the same time, in done, or still run
+                    for loser in (done | pending) - {future}:
+                        loser.add_done_callback(lambda loser: _discard(loser, discard))
+                return result
+        raise error
+
+    def stats(self):
+        """Return the retry and hedge counters"""
+        with self._lock:
+            stats = dict(self.counters)
+        for prefix, stream in (('', False), ('stream_', True)):
+            latencies = self.stream_latencies if stream else self.latencies
+            p50 = latencies.percentile(50)
+            p95 = latencies.percentile(95)
+            hedge_delay = self.hedge_delay(stream)
+            stats[f'{prefix}latency_p50_seconds'] = round(p50, 3) if p50 is not None else None
+            stats[f'{prefix}latency_p95_seconds'] = round(p95, 3) if p95 is not None else None
+            stats[f'{prefix}hedge_delay_seconds'] = round(hedge_delay, 3) if hedge_delay is not None else None
+        return stats
+
+
+def _discard(future, discard):
+    """Hand the result of a hedged request that lost to the discard function of its call"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        discard(future.result())
+    except Exception as e:
+        print(f"Error discarding a hedged LLM answer: {str(e)}")
+
+
+def init_resilience(app):
+    """
+    Create the retry/hedging policy of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The ResiliencePolicy stored in app.extensions['llm_resilience']
+    """
+    policy = ResiliencePolicy(
+        max_retries=app.config['LLM_MAX_RETRIES'],
+        base_delay=app.config['LLM_RETRY_BASE_DELAY'],
+        max_delay=app.config['LLM_RETRY_MAX_DELAY'],
+        deadline=app.config['LLM_CALL_DEADLINE'],
+        hedge_percentile=app.config['LLM_HEDGE_PERCENTILE'],
+        hedge_min_samples=app.config['LLM_HEDGE_MIN_SAMPLES'],
+    )
+    app.extensions['llm_resilience'] = policy
+    return policy
@@ -0,0 +1,351 @@
+# app/services/single_flight.py
+import os
+import copy
+import json
+import time
+import errno
+import hashlib
+import threading
+from app.utils.concurrency import Cancelled, CANCEL_POLL_INTERVAL
+
+try:
+    import fcntl
+except ImportError:  # Windows: deduplication within the process only
+    fcntl = None
+
+
+# Free-text fields identifying what is generated, compared without case and whitespace differences
+IDENTITY_FIELDS = ('domaine', 'sujet', 'niveau_apprenant')
+
+
+def _normalize(value):
+    return ' '.join(value.split()).lower()
+
+
+def request_fingerprint(kind, params):
+    """
+    Fingerprint of a generation request
+
+    The IDENTITY_FIELDS are compared without case and whitespace
+    differences, so two users typing the same subject share the same
+    generation; the other parameters (plans, titles, content) must match
+    exactly.
+    """
+    params = dict(params)
+    for field in IDENTITY_FIELDS:
+        if isinstance(params.get(field), str):
+            params[field] = _normalize(params[field])
+    payload = json.dumps([kind, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    """An execution in progress in this process, awaited by its followers"""
+
+    def __init__(self, on_progress=None):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self._listeners = [on_progress] if on_progress is not None else []
+        self._first = None  # The first progress (with the total and the partial result), then the latest
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def publish(self, *args):
+        """Report the progress of the execution to the leader and the followers"""
+        with self._lock:
+            if self._first is None:
+                self._first = args
+            else:
+                self._latest = args
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(*args)
+
+    def subscribe(self, on_progress):
+        """Receive the progress of the execution, starting with the progress reported so far"""
+        with self._lock:
+            self._listeners.append(on_progress)
+            reported = [args for args in (self._first, self._latest) if args is not None]
+        for args in reported:
+            on_progress(*args)
+
+    def unsubscribe(self, on_progress):
+        with self._lock:
+            self._listeners.remove(on_progress)
+
+
+def _ignore_progress(*args):
+    pass
+
+
+def _copy_error(error):
+    """A new exception of the type and arguments of ``error``"""
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(str(error))
+
+
+class SingleFlight:
+    """
+    Shares one execution between identical concurrent generation requests
+
+    The first request with a given fingerprint (the leader) runs the
+    generation; identical requests arriving while it runs (the followers)
+    wait for it and get the same result, or a copy of its error. The
+    progress reported by the leader is forwarded to the followers, and a
+    follower whose own request is cancelled stops waiting.
+
+    Within a process the followers wait on an event. Across processes
+    (gunicorn workers sharing ``directory``) the leader holds an exclusive
+    lock on ``<fingerprint>.lock`` while it runs and writes its result to
+    ``<fingerprint>.json``; followers of another process block on the lock,
+    then read the result. When the leader of another process failed, or
+    after ``timeout`` seconds, a follower runs the generation itself.
+    """
+
+    def __init__(self, directory, timeout=600, result_ttl=60):
+        self.directory = directory
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {'executions': 0, 'shared': 0, 'shared_across_processes': 0, 'timeouts': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def do(self, kind, params, fn, reusable=None, cancel=None, on_progress=None):
+        """
+        Run fn once for all the identical requests in flight
+
+        Args:
+            kind: The type of request (e.g. "generate-plan")
+            params: The parsed parameters of the request, JSON-serializable
+            fn: Function running the generation, called with a function to
+                report its progress to; returns a JSON-serializable result
+            reusable: Optional predicate telling whether a result can be handed
+                to the other requests; followers of an unusable result run fn themselves
+            cancel: Optional CancelToken of this request, ending its wait as a follower
+            on_progress: Optional function receiving the progress of the
+                generation, whichever request runs it
+
+        Returns:
+            The result of fn, possibly computed for another request
+
+        Raises:
+            Cancelled: If the token is cancelled while waiting for another request
+        """
+        key = request_fingerprint(kind, params)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(on_progress)
+
+        if not leader:
+            return self._follow(call, fn, reusable, cancel, on_progress)
+
+        try:
+            call.result = self._run_locked(key, lambda: fn(call.publish), reusable, cancel)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _follow(self, call, fn, reusable, cancel, on_progress):
+        """Wait for the execution of the leader, then take its result"""
+        if on_progress is not None:
+            call.subscribe(on_progress)
+        try:
+            deadline = time.monotonic() + self.timeout
+            while not call.done.wait(CANCEL_POLL_INTERVAL if cancel is not None else self.timeout):
+                if cancel is not None:
+                    cancel.check()
+                if time.monotonic() >= deadline:
+                    break
+        finally:
+            if on_progress is not None:
+                call.unsubscribe(on_progress)
+
+        if not call.done.is_set():
+            self._count('timeouts')
+            return fn(on_progress or _ignore_progress)
+        if call.error is not None:
+            self._count('shared')
+            # Each follower raises its own exception, so tracebacks do not pile up on the leader's
+            raise _copy_error(call.error) from call.error
+        if reusable is not None and not reusable(call.result):
+            return fn(on_progress or _ignore_progress)
+        self._count('shared')
+        return call.result
+
+    def _run_locked(self, key, fn, reusable=None, cancel=None):
+        """Run fn under the lock file of the fingerprint, shared with the other processes"""
+        if fcntl is None:
+            self._count('executions')
+            return fn()
+
+        self.purge_expired()
+        lock_path = os.path.join(self.directory, f'{key}.lock')
+        result_path = os.path.join(self.directory, f'{key}.json')
+        waiting_since = time.time()
+        lock_file, waited, locked = self._lock_file(lock_path, cancel)
+        with lock_file:
+            if waited:
+                # Another process ran the same request: use its result
+                if locked:
+                    result = self._read_result(result_path, waiting_since)
+                    if result is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                        self._count('shared_across_processes')
+                        return result['result']
+                else:
+                    self._count('timeouts')
+            try:
+                self._count('executions')
+                result = fn()
+                if reusable is None or reusable(result):
+                    self._write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lock_file(self, lock_path, cancel=None):
+        """
+        Open and lock the lock file of a fingerprint, waiting up to timeout seconds
+
+        purge_expired may remove the file between its opening and its
+        locking; the lock is then taken again on the file now at the path,
+        so every process locks the same file.
+
+        Returns:
+            A (lock_file, waited, locked) tuple: the open lock file, whether
+            another process held the lock, and whether it is now locked
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            lock_file = open(lock_path, 'a')
+            if self._try_lock(lock_file):
+                locked = True
+            else:
+                waited = True
+                try:
+                    locked = self._wait_lock(lock_file, deadline, cancel)
+                except Cancelled:
+                    lock_file.close()
+                    raise
+            if not locked or self._is_current(lock_file, lock_path):
+                return lock_file, waited, locked
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    @staticmethod
+    def _is_current(lock_file, path):
+        """Whether an open file is still the one at path"""
+        try:
+            return os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return False
+
+    def _wait_lock(self, lock_file, deadline, cancel=None):
+        """Wait until deadline (a monotonic time) for the exclusive lock, or until cancel is cancelled"""
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            if cancel is not None:
+                cancel.check()
+            if self._try_lock(lock_file):
+                return True
+        return False
+
+    @staticmethod
+    def _read_result(path, since):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('created_at', 0) >= since else None
+
+    @staticmethod
+    def _write_result(path, result):
+        # Write to a temporary file first so readers never see a partial result
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': time.time(), 'result': result}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not share the result {os.path.basename(path)}: {str(e)}")
+
+    def purge_expired(self):
+        """Remove the result files, and the unused lock files, older than result_ttl seconds"""
+        limit = time.time() - self.result_ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) >= limit:
+                    continue
+                if name.endswith('.lock'):
+                    # A lock file stays while its generation runs, however long it takes. It is
+                    # removed under its lock; processes that opened it before see it gone once
+                    # they lock it, and open the new file at the path (see _lock_file)
+                    with open(path, 'a') as lock_file:
+                        if not self._try_lock(lock_file):
+                            continue
+                        if self._is_current(lock_file, path):
+                            os.remove(path)
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def stats(self):
+        """Return the counters of executions and shared results"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+def init_single_flight(app):
+    """
+    Create the request deduplication layer of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The SingleFlight stored in app.extensions['single_flight'], or None when disabled
+    """
+    single_flight = None
+    if app.config['SINGLE_FLIGHT_ENABLED']:
+        single_flight = SingleFlight(
+            app.config['SINGLE_FLIGHT_FOLDER'],
+            timeout=app.config['SINGLE_FLIGHT_TIMEOUT'],
+            result_ttl=app.config['SINGLE_FLIGHT_RESULT_TTL'],
+        )
+    app.extensions['single_flight'] = single_flight
+    return single_flight
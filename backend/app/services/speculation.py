@@ -0,0 +1,190 @@
+# app/services/speculation.py
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def plan_fingerprint(kind, domaine, sujet, plan):
+    """Stable fingerprint of a generated plan and the subject it was generated for"""
+    payload = json.dumps([kind, domaine, sujet, plan], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _subject(domaine, sujet):
+    return ' '.join(str(domaine).split()).lower(), ' '.join(str(sujet).split()).lower()
+
+
+class SpeculativeStore:
+    """
+    Content generated ahead of time for the plans just returned to a user
+
+    When a plan is returned, the content of its items (sections or
+    sessions) is generated in the background on a small worker pool, keyed
+    by the plan fingerprint. The content request that follows claims the
+    finished or in-flight results of the items it still has, matched by
+    item key, so a plan edited on a few sections only regenerates those.
+    The items nobody claimed (edited or removed) are cancelled when still
+    queued; running ones finish and are dropped.
+    """
+
+    def __init__(self, max_workers=2, ttl=900, max_plans=20):
+        self.ttl = ttl
+        self.max_plans = max_plans
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculative')
+        self._entries = {}  # fingerprint -> entry dict
+        self._lock = threading.Lock()
+        self.counters = {'plans': 0, 'items': 0, 'claimed': 0, 'claimed_done': 0, 'cancelled': 0, 'expired': 0}
+
+    def start(self, kind, domaine, sujet, plan, items, generate):
+        """
+        Start generating the items of a plan in the background
+
+        Args:
+            kind: The kind of content ("content" or "content_jour")
+            domaine: The domain of the plan
+            sujet: The subject of the plan
+            plan: The plan, used for its fingerprint
+            items: List of (key, item) tuples, key identifying the item across plan edits
+            generate: Function called with an item, returning its content
+
+        Returns:
+            The fingerprint of the plan
+        """
+        fingerprint = plan_fingerprint(kind, domaine, sujet, plan)
+        self.purge_expired()
+        with self._lock:
+            if fingerprint in self._entries:
+                return fingerprint
+            futures = {}
+            for key, item in items:
+                futures.setdefault(key, deque()).append(self._executor.submit(generate, item))
+            self._entries[fingerprint] = {
+                'kind': kind,
+                'subject': _subject(domaine, sujet),
+                'created_at': time.time(),
+                'futures': futures,
+            }
+            self.counters['plans'] += 1
+            self.counters['items'] += len(items)
+            # Forget the oldest plans beyond the limit
+            while len(self._entries) > self.max_plans:
+                oldest = min(self._entries, key=lambda name: self._entries[name]['created_at'])
+                self._cancel(self._entries.pop(oldest))
+        return fingerprint
+
+    def claim(self, kind, domaine, sujet, plan, keys):
+        """
+        Take the speculative results matching the items of a plan
+
+        The plan with the same fingerprint is used when there is one, and is
+        consumed: its unclaimed items are cancelled. Otherwise the results
+        of the latest plan generated for the same subject are shared without
+        consuming it, as that plan may still be claimed by its own content
+        request.
+
+        Args:
+            kind: The kind of content ("content" or "content_jour")
+            domaine: The domain of the plan
+            sujet: The subject of the plan
+            plan: The plan of the content request
+            keys: Dict of item position -> item key, for the items to look up
+
+        Returns:
+            A dict of item position -> Future of its content
+        """
+        self.purge_expired()
+        fingerprint = plan_fingerprint(kind, domaine, sujet, plan)
+        subject = _subject(domaine, sujet)
+        with self._lock:
+            entry = self._entries.pop(fingerprint, None)
+            owned = entry is not None
+            if entry is None:
+                candidates = [other for other in self._entries.values()
+                              if other['kind'] == kind and other['subject'] == subject]
+                if candidates:
+                    entry = max(candidates, key=lambda other: other['created_at'])
+            if entry is None:
+                return {}
+
+            claimed = {}
+            used = {}
+            for position, key in keys.items():
+                futures = entry['futures'].get(key)
+                if not futures:
+                    continue
+                if owned:
+                    claimed[position] = futures.popleft()
+                else:
+                    # Items repeated under the same key are shared in order, each once
+                    index = used.get(key, 0)
+                    if index < len(futures):
+                        claimed[position] = futures[index]
+                        used[key] = index + 1
+            self.counters['claimed'] += len(claimed)
+            self.counters['claimed_done'] += sum(1 for future in claimed.values() if future.done())
+            if owned:
+                self._cancel(entry)
+        return claimed
+
+    def _cancel(self, entry):
+        for futures in entry['futures'].values():
+            for future in futures:
+                if future.cancel():
+                    self.counters['cancelled'] += 1
+        entry['futures'].clear()
+
+    def purge_expired(self):
+        """Drop the plans older than ttl seconds"""
+        limit = time.time() - self.ttl
+        with self._lock:
+            expired = [name for name, entry in self._entries.items() if entry['created_at'] < limit]
+            for name in expired:
+                self._cancel(self._entries.pop(name))
+            self.counters['expired'] += len(expired)
+        return len(expired)
+
+    def stats(self):
+        """Return the speculation counters"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending_plans'] = len(self._entries)
+        return stats
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def claimed_result(future):
+    """
+    Wait for a claimed speculative result
+
+    Returns:
+        The content, or None when the speculative generation was cancelled or failed
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Speculative generation unusable: {str(e) or type(e).__name__}")
+        return None
+
+
+def init_speculation(app):
+    """
+    Create the speculative content store of the application
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        The SpeculativeStore stored in app.extensions['speculation']
+    """
+    store = SpeculativeStore(
+        max_workers=app.config['SPECULATIVE_MAX_WORKERS'],
+        ttl=app.config['SPECULATIVE_TTL'],
+        max_plans=app.config['SPECULATIVE_MAX_PLANS'],
+    )
+    app.extensions['speculation'] = store
+    return store
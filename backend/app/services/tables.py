@@ -0,0 +1,185 @@
+# app/services/tables.py
+import math
+
+ELLIPSIS = "…"
+
+
+class TableLayout:
+    """
+    Layout of a table, shared by the PDF and PPTX renderers
+
+    Computed in one pass over the cells, from their length in characters:
+    rows are padded to the same number of columns (the model does not
+    always keep its rows aligned), the width is shared between the columns
+    and cells too long for ``max_lines`` lines of their column are cut.
+    Lengths are converted with ``char_width``, the mean width of a character
+    in the unit of ``width`` (points for both renderers).
+
+    Attributes:
+        header: The first row
+        rows: The other rows
+        widths: The width of each column
+        per_line: The number of characters per line of each column
+        lines: The number of lines of the header then of each row, once wrapped in their column
+    """
+
+    def __init__(self, rows, width, char_width, padding=0, min_width=0, max_lines=None):
+        """
+        Args:
+            rows: Sequence of rows of str, the first one being the header
+            width: The width available for the table
+            char_width: The mean width of a character of the cells
+            padding: The horizontal padding of a cell, both sides combined
+            min_width: The narrowest a column can be
+            max_lines: Optional number of lines after which a cell is cut
+        """
+        columns = max(len(row) for row in rows)
+        longest = [0] * columns
+        total = [0] * columns
+        padded = []
+        for row in rows:
+            if len(row) < columns:
+                row = tuple(row) + ("",) * (columns - len(row))
+            padded.append(row)
+            for index, cell in enumerate(row):
+                length = len(cell)
+                total[index] += length
+                if length > longest[index]:
+                    longest[index] = length
+
+        natural = [max(min_width, length * char_width + padding) for length in longest]
+        means = [max(1, column_total / len(padded)) for column_total in total]
+        self.widths = share_width(natural, means, width, min_width)
+
+        # Characters per line of each column, to cut and count the lines of the cells
+        self.per_line = per_line = [max(1, int((column_width - padding) / char_width)) for column_width in self.widths]
+        self.lines = []
+        fitted = []
+        for row in padded:
+            if max_lines is not None:
+                row = tuple(fit_text(cell, per_line[index], max_lines) for index, cell in enumerate(row))
+            fitted.append(row)
+            self.lines.append(max(count_lines(cell, per_line[index]) for index, cell in enumerate(row)))
+        self.header = fitted[0]
+        self.rows = fitted[1:]
+
+    @property
+    def columns(self):
+        return len(self.widths)
+
+    def pages(self, row_height, capacity, first_capacity=None):
+        """
+        Split the rows into groups that fit in a page with the header repeated
+
+        Args:
+            row_height: Function of a number of lines returning the height of a row
+            capacity: The height available for a group on a page
+            first_capacity: The height available for the first group, if less
+                (the table starts below other content)
+
+        Returns:
+            A list of (start, end) slices of rows; every group has at least one row
+        """
+        header_height = row_height(self.lines[0])
+        available = capacity if first_capacity is None else first_capacity
+        pages = []
+        start = 0
+        used = header_height
+        for index, lines in enumerate(self.lines[1:]):
+            height = row_height(lines)
+            if used + height > available and index > start:
+                pages.append((start, index))
+                start = index
+                used = header_height
+                available = capacity
+            used += height
+        if start < len(self.rows) or not pages:
+            pages.append((start, len(self.rows)))
+        return pages
+
+
+def split_columns(rows, max_columns):
+    """
+    Split a table too wide for the page into tables of at most ``max_columns`` columns
+
+    The tables after the first repeat the first column, which usually names the rows.
+
+    Args:
+        rows: Sequence of rows, the first one being the header
+        max_columns: The number of columns that fit in the width of the page
+
+    Returns:
+        A list of tables, each a list of rows
+    """
+    columns = max(len(row) for row in rows)
+    if columns <= max_columns or max_columns < 2:
+        return [rows]
+    step = max_columns - 1
+    return [[tuple(row[:1]) + tuple(row[start:start + step]) for row in rows]
+            for start in range(1, columns, step)]
+
+
+def share_width(natural, weights, width, min_width=0):
+    """
+    Share a width between columns
+
+    Columns narrower than an equal share keep their natural width; the
+    width left is shared between the other columns, at least ``min_width``
+    each, in proportion of their weights.
+
+    Args:
+        natural: The width each column needs to keep its cells on one line
+        weights: The weight of each column (e.g. the mean length of its cells)
+        width: The width to share
+        min_width: The narrowest a column can be
+
+    Returns:
+        The width of each column
+    """
+    columns = len(natural)
+    if sum(natural) <= width:
+        return list(natural)
+    if columns * min_width >= width:
+        return [width / columns] * columns
+
+    widths = [None] * columns
+    remaining = width
+    wide = list(range(columns))
+    while wide:
+        share = remaining / len(wide)
+        narrow = [index for index in wide if natural[index] <= share]
+        if not narrow:
+            break
+        for index in narrow:
+            widths[index] = natural[index]
+            remaining -= natural[index]
+        wide = [index for index in wide if widths[index] is None]
+
+    total_weight = sum(weights[index] for index in wide)
+    spare = remaining - min_width * len(wide)
+    for index in wide:
+        widths[index] = min_width + spare * weights[index] / total_weight
+    return widths
+
+
+def count_lines(text, per_line):
+    """The number of lines of a text wrapped at ``per_line`` characters"""
+    return sum(max(1, math.ceil(len(line) / per_line)) for line in text.split("\n"))
+
+
+def fit_text(text, per_line, max_lines):
+    """Cut a text taking more than ``max_lines`` lines wrapped at ``per_line`` characters, marking the cut"""
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        lines = max(1, math.ceil(len(line) / per_line))
+        if used + lines > max_lines:
+            room = (max_lines - used) * per_line
+            if room > 0:
+                kept.append(line[:room - 1].rstrip() + ELLIPSIS)
+            else:
+                kept[-1] = kept[-1].rstrip() + ELLIPSIS
+            return "\n".join(kept)
+        kept.append(line)
+        used += lines
+    return text
@@ -0,0 +1,264 @@
+# app/services/themes.py
+import io
+import os
+from functools import lru_cache
+from PIL import Image as PILImage, ImageDraw
+from pptx.dml.color import RGBColor
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import TableStyle
+
+DEFAULT_THEME = 'default'
+
+# Colors (hex) and fonts of the rendered files, shared by the PDF and PPTX renderers
+THEMES = {
+    'default': {
+        'palette': {
+            'primary': '#ff7900',                # Titles and sidebar
+            'primary_dark': '#ff6600',           # Sidebar of the presenter and plan slides
+            'secondary': '#0097b2',              # Day titles and PDF table headers
+            'text': '#000000',
+            'light': '#f3f3f3',                  # Code and day title backgrounds, PDF table grid
+            'white': '#ffffff',
+            'code_text': '#222222',
+            'example': '#006600',
+            'slide_code_background': '#fefefe',
+            'slide_code_text': '#323232',
+            'slide_table_header': '#85b3de',
+            'slide_table_row': '#f7f5f5',
+        },
+        'fonts': {
+            'body': 'Helvetica',
+            'bold': 'Helvetica-Bold',
+            'mono': 'Courier',
+            'slide': 'Inter',
+            'slide_mono': 'Consolas',
+        },
+    },
+}
+
+LOGO_MAX_SIZE = (400, 400)  # Pixels kept of the logo, drawn at most 1.5 inch wide
+DEFAULT_LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'default_logo.png')
+
+
+class Logo:
+    """A logo decoded and resized once, re-encoded as PNG"""
+    __slots__ = ('data', 'width', 'height')
+
+    def __init__(self, data, width, height):
+        self.data = data
+        self.width = width
+        self.height = height
+
+    def stream(self):
+        """A file object of the PNG, as accepted by reportlab and python-pptx"""
+        return io.BytesIO(self.data)
+
+
+def _encode_logo(image):
+    image.thumbnail(LOGO_MAX_SIZE)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return Logo(buffer.getvalue(), image.width, image.height)
+
+
+def load_logo(path):
+    """
+    Decode and resize a logo file
+
+    Args:
+        path: Path to the image
+
+    Returns:
+        A Logo, or None if the file is missing or is not an image
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with PILImage.open(path) as image:
+            image.load()
+            return _encode_logo(image)
+    except OSError as e:
+        print(f"Error loading logo {path}: {str(e)}")
+        return None
+
+
+@lru_cache(maxsize=1)
+def placeholder_logo():
+    """The default logo of the application, or a blank "Logo" image if there is none"""
+    logo = load_logo(DEFAULT_LOGO_PATH)
+    if logo is None:
+        image = PILImage.new('RGB', (150, 50), color=(255, 255, 255))
+        ImageDraw.Draw(image).text((10, 20), "Logo", fill=(0, 0, 0))
+        logo = _encode_logo(image)
+    return logo
+
+
+class Theme:
+    """
+    Styles, colors, fonts and logo of the rendered files
+
+    Built once per process for each theme and logo file (see get_theme) and
+    shared by every render, so the reportlab styles and the logo are not
+    rebuilt or decoded again for each document, table or slide.
+    """
+
+    def __init__(self, theme_id, logo_path=None):
+        spec = THEMES[theme_id]
+        self.id = theme_id
+        self.palette = dict(spec['palette'])
+        self.fonts = dict(spec['fonts'])
+        # The palette for each renderer
+        self.colors = {name: colors.HexColor(value) for name, value in self.palette.items()}
+        self.rgb = {name: RGBColor.from_string(value.lstrip('#')) for name, value in self.palette.items()}
+        self.styles = self._build_styles()
+        self.code_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), self.colors['light']),
+            ('TEXTCOLOR', (0, 0), (-1, -1), self.colors['code_text']),
+            ('FONTNAME', (0, 0), (-1, -1), self.fonts['mono']),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), self.colors['secondary']),
+            ('TEXTCOLOR', (0, 0), (-1, 0), self.colors['white']),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 1, self.colors['light']),
+            ('FONTNAME', (0, 0), (-1, -1), self.fonts['body']),
+            ('FONTNAME', (0, 0), (-1, 0), self.fonts['bold']),
+            ('BACKGROUND', (0, 1), (-1, -1), self.colors['white']),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+        # Mean width of a character of the PDF table cells (10pt), to lay out the tables
+        sample = "abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789"
+        self.char_width = stringWidth(sample, self.fonts['body'], 10) / len(sample)
+        # None when the logo file is missing: slides go without, PDF pages use placeholder_logo
+        self.logo = load_logo(logo_path)
+
+    def _build_styles(self):
+        """The reportlab paragraph styles of the PDF"""
+        base = getSampleStyleSheet()
+        styles = {
+            'code': base["Code"],
+            'cell': base["Normal"],
+        }
+        styles['header_cell'] = ParagraphStyle(
+            "HeaderCell",
+            parent=base["Normal"],
+            textColor=self.colors['white'],
+            fontName=self.fonts['bold'],
+        )
+        styles['formation'] = ParagraphStyle(
+            "FormationTitle",
+            parent=base["Title"],
+            fontSize=45,
+            textColor=self.colors['primary'],
+            spaceAfter=15,
+            spaceBefore=45,
+            alignment=TA_LEFT,
+        )
+        styles['trainer'] = ParagraphStyle(
+            "TrainerName",
+            parent=base["BodyText"],
+            fontSize=25,
+            spaceAfter=45,
+            spaceBefore=45,
+            alignment=TA_CENTER,
+            leftIndent=45,
+        )
+        styles['title'] = ParagraphStyle(
+            "TitleStyle",
+            parent=base["Title"],
+            fontSize=14,
+            alignment=TA_LEFT,
+            spaceAfter=5,
+            spaceBefore=5,
+            textColor=self.colors['primary'],
+        )
+        styles['day_title'] = ParagraphStyle(
+            "DayTitleStyle",
+            parent=base["Title"],
+            fontSize=20,
+            alignment=TA_LEFT,
+            spaceAfter=10,
+            spaceBefore=10,
+            textColor=self.colors['secondary'],
+            backgroundColor=self.colors['light'],
+            borderColor=self.colors['primary'],
+            borderWidth=1,
+            borderPadding=10,
+            borderRadius=5,
+        )
+        styles['bullet'] = ParagraphStyle(
+            "BulletStyle",
+            parent=base["BodyText"],
+            fontSize=10,
+            leading=17,
+            spaceBefore=3,
+            spaceAfter=3,
+            rightIndent=15,
+            fontName=self.fonts['mono'],
+        )
+        styles['subtitle'] = ParagraphStyle(
+            "SubtitleStyle",
+            parent=base["BodyText"],
+            fontSize=12,
+            spaceAfter=2,
+            textColor=self.colors['text'],
+            leftIndent=15,
+            fontName=self.fonts['bold'],
+        )
+        styles['body'] = ParagraphStyle(
+            "BodyStyle",
+            parent=base["BodyText"],
+            fontSize=10,
+            leading=20,
+            spaceAfter=3,
+            leftIndent=30,
+            rightIndent=15,
+            alignment=TA_JUSTIFY,
+        )
+        styles['example'] = ParagraphStyle(
+            "ExampleStyle",
+            parent=styles['body'],
+            textColor=self.colors['example'],
+            fontStyle='italic',
+        )
+        return styles
+
+
+@lru_cache(maxsize=16)
+def _cached_theme(theme_id, logo_path, logo_mtime):
+    return Theme(theme_id, logo_path)
+
+
+def get_theme(theme_id=DEFAULT_THEME, logo_path=None):
+    """
+    Return the theme of the rendered files, built once per process
+
+    Args:
+        theme_id: A key of THEMES
+        logo_path: Path to the logo image; a modified file gives a new theme
+
+    Returns:
+        The Theme of this theme id and version of the logo file
+    """
+    if theme_id not in THEMES:
+        raise ValueError(f"Unknown theme '{theme_id}'")
+    try:
+        logo_mtime = os.path.getmtime(logo_path) if logo_path else None
+    except OSError:
+        logo_mtime = None
+    return _cached_theme(theme_id, logo_path, logo_mtime)
@@ -0,0 +1,225 @@
+import time
+import queue
+import select
+import socket
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+# Seconds between two checks of a cancellation token while waiting for results
+CANCEL_POLL_INTERVAL = 0.25
+# Seconds between two checks that the client of a plain request is still connected
+DISCONNECT_POLL_INTERVAL = 1.0
+
+class Cancelled(Exception):
+    """Raised when the work of a request is cancelled (client gone, job deleted, deadline)."""
+
+class CancelToken:
+    """
+    Cooperative cancellation of the work of one request
+    
+    The token is shared by the threads working for the request; they check
+    it between steps and stop when it is cancelled, either explicitly or
+    because its deadline passed.
+    """
+    
+    def __init__(self, deadline=None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.reason = None
+        self.expires_at = None
+        self.limit(deadline)
+    
+    def limit(self, seconds):
+        """Cancel the token in ``seconds`` seconds, unless it expires earlier (None or 0: no limit)"""
+        if not seconds:
+            return
+        expires_at = time.monotonic() + seconds
+        with self._lock:
+            if self.expires_at is None or expires_at < self.expires_at:
+                self.expires_at = expires_at
+    
+    def cancel(self, reason='cancelled'):
+        """Cancel the token; the first reason is kept"""
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+        self._event.set()
+    
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.cancel('deadline')
+        return self._event.is_set()
+    
+    def remaining(self):
+        """Seconds until the deadline, or None without one"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def check(self):
+        """
+        Raises:
+            Cancelled: If the token is cancelled
+        """
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+def iter_parallel(fn, items, max_workers, heartbeat=None, events=None, cancel=None):
+    """
+    Run a function over items on a bounded thread pool
+    
+    Items are submitted in order, so the pool starts them in that order.
+    Results are yielded as soon as they are available, together with the
+    index of their item.
+    
+    Args:
+        fn: The function to call with each item
+        items: The items to process
+        max_workers: Maximum number of concurrent calls (1 runs sequentially,
+            on a worker thread when heartbeat or events is set)
+        heartbeat: Optional number of seconds after which None is yielded
+            when no result arrived, to let callers keep a connection alive
+        events: Optional queue.Queue the calls put progress notifications
+            into; they are yielded while the calls run
+        cancel: Optional CancelToken; once it is cancelled, iteration stops
+            and the calls raising Cancelled are not yielded. The remaining
+            items are still handed to ``fn``, which is expected to check the
+            token and return at once.
+        
+    Yields:
+        (index, result) tuples in completion order, (None, event) tuples for
+        the notifications put in ``events``, or None on heartbeat
+    """
+    items = list(items)
+    # Heartbeats and notifications need the calls to run off the consumer's thread
+    if (max_workers <= 1 or len(items) <= 1) and heartbeat is None and events is None:
+        for index, item in enumerate(items):
+            try:
+                result = fn(item)
+            except Cancelled:
+                continue
+            yield from _drain(events)
+            if cancel is not None and cancel.cancelled:
+                continue
+            yield index, result
+        return
+    
+    # With a token, wake up regularly to check it
+    timeout = heartbeat
+    if cancel is not None:
+        timeout = CANCEL_POLL_INTERVAL if heartbeat is None else min(heartbeat, CANCEL_POLL_INTERVAL)
+    last_yield = time.monotonic()
+    
+    def idle():
+        # Whether the heartbeat interval elapsed without yielding anything
+        return heartbeat is not None and time.monotonic() - last_yield >= heartbeat
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    try:
+        futures = {executor.submit(fn, item): index for index, item in enumerate(items)}
+        pending = set(futures)
+        if events is None:
+            while pending:
+                if cancel is not None and cancel.cancelled:
+                    return
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if idle():
+                        last_yield = time.monotonic()
+                        yield None
+                    continue
+                for future in sorted(done, key=futures.get):
+                    try:
+                        result = future.result()
+                    except Cancelled:
+                        continue
+                    last_yield = time.monotonic()
+                    yield futures[future], result
+            return
+        
+        # Completions go through the events queue, after the notifications of their call
+        for future in futures:
+            future.add_done_callback(events.put)
+        while pending:
+            if cancel is not None and cancel.cancelled:
+                return
+            try:
+                event = events.get(timeout=timeout)
+            except queue.Empty:
+                if idle():
+                    last_yield = time.monotonic()
+                    yield None
+                continue
+            if isinstance(event, Future) and event in pending:
+                pending.discard(event)
+                try:
+                    result = event.result()
+                except Cancelled:
+                    continue
+                last_yield = time.monotonic()
+                yield futures[event], result
+            else:
+                last_yield = time.monotonic()
+                yield None, event
+    finally:
+        # Do not start queued items if the consumer stopped early; cancelled
+        # items still run, to stop at the first check of their token
+        executor.shutdown(wait=False, cancel_futures=cancel is None or not cancel.cancelled)
+
+def _drain(events):
+    while events is not None:
+        try:
+            yield None, events.get_nowait()
+        except queue.Empty:
+            return
+
+@contextmanager
+def watch_disconnect(environ, interval=DISCONNECT_POLL_INTERVAL):
+    """
+    Cancel the work of a plain (non-streaming) request when its client goes away
+    
+    A thread checks the connection of the request every ``interval``
+    seconds while the block runs. Only the gunicorn and werkzeug servers
+    expose their socket; with other servers the token is never cancelled
+    this way.
+    
+    Args:
+        environ: The WSGI environ of the request, whose body was already read
+        interval: Seconds between two checks
+        
+    Yields:
+        A CancelToken cancelled with the reason "client disconnected"
+    """
+    cancel = CancelToken()
+    sock = environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+    if sock is None:
+        yield cancel
+        return
+    
+    stop = threading.Event()
+    
+    def watch():
+        while not stop.wait(interval) and not cancel.cancelled:
+            if _peer_closed(sock):
+                cancel.cancel('client disconnected')
+                return
+    
+    threading.Thread(target=watch, name='disconnect-watch', daemon=True).start()
+    try:
+        yield cancel
+    finally:
+        stop.set()
+
+def _peer_closed(sock):
+    """Whether the other end closed a connection whose request was entirely read"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        # Readable with nothing to read: end of stream
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except ConnectionError:
+        return True
+    except (OSError, ValueError):
+        # Socket closed by the server, or TLS socket that cannot be peeked
+        return False
@@ -1,5 +1,7 @@
 import os
 import json
+import string
+import threading
 import logging
 from flask import current_app
 
@@ -17,8 +19,11 @@ def save_to_json(data, filename, directory=None):
     ensure_dir(directory)
     filepath = os.path.join(directory, filename)
     
-    with open(filepath, 'w', encoding='utf-8') as f:
+    # Write to a temporary file first so a crash never leaves a truncated file
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, filepath)
     
     return filepath
 
@@ -67,4 +72,29 @@ def text_to_safe_filename(text):
     if len(text) > 100:
         text = text[:100]
     # Return the safe filename
-    return text
\ No newline at end of file
+    return text
+
+def estimate_tokens(text):
+    """Roughly estimate the number of LLM tokens of a text (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+def format_sse(event, data):
+    """Format a Server-Sent Event with a JSON payload."""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+def strip_code_fence(text):
+    """Return the text of an LLM answer without its Markdown code fence."""
+    text = text.strip()
+    if text[:1] in ('{', '['):
+        # The answer continued the fence opened by the prompt, only the closing fence may follow
+        end = text.rfind("```")
+        return (text[:end] if end != -1 else text).strip()
+    start = text.find("```")
+    if start == -1:
+        return text
+    body = text[start + 3:]
+    # Skip the language tag (```json)
+    body = body[len(body) - len(body.lstrip(string.ascii_letters)):]
+    end = body.rfind("```")
+    return (body[:end] if end != -1 else body).strip()
@@ -9,6 +9,104 @@ class Config:
     BASE_URL = "https://openrouter.ai/api/v1"
     MODEL = "deepseek/deepseek-chat:free"
     
+    # LLM connection pool configuration (shared by all generators)
+    LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 20))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 10))
+    LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', 60))  # Seconds an idle connection is kept
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 180))  # Seconds per LLM call
+    LLM_WARMUP = os.environ.get('LLM_WARMUP', 'false').lower() == 'true'  # Open connections at worker start
+    LLM_WARMUP_CONNECTIONS = int(os.environ.get('LLM_WARMUP_CONNECTIONS', 2))
+    LLM_STREAMING = os.environ.get('LLM_STREAMING', 'true').lower() == 'true'  # Stream content answers into the incremental parser
+    
+    # LLM providers (OpenAI-compatible endpoints) besides the default BASE_URL/API_KEY one
+    LLM_PROVIDERS = {
+        # llama.cpp-style server on this machine, outside the outbound rate limit
+        'local': {
+            'base_url': os.environ.get('LLM_LOCAL_BASE_URL', 'http://localhost:8080/v1'),
+            'api_key': os.environ.get('LLM_LOCAL_API_KEY', 'local'),
+            'rate_limited': False,
+        },
+    }
+    LLM_LOCAL_MODEL = os.environ.get('LLM_LOCAL_MODEL', 'local-model')
+    # Model chain of each generation stage: "provider:model" entries tried in order
+    LLM_ROUTES = {
+        'default': os.environ.get('LLM_ROUTE_DEFAULT', f'default:{MODEL}'),
+        'plan': os.environ.get('LLM_ROUTE_PLAN'),  # Short and latency-sensitive
+        'plan_jour': os.environ.get('LLM_ROUTE_PLAN_JOUR'),
+        'content': os.environ.get('LLM_ROUTE_CONTENT'),  # Long and throughput-bound
+        'content_jour': os.environ.get('LLM_ROUTE_CONTENT_JOUR'),
+    }
+    # A model whose error rate or p95 latency goes over budget is tried last for a cooldown
+    LLM_FALLBACK_LATENCY_SLO = float(os.environ.get('LLM_FALLBACK_LATENCY_SLO', 0)) or None  # Seconds, p95
+    LLM_FALLBACK_ERROR_BUDGET = float(os.environ.get('LLM_FALLBACK_ERROR_BUDGET', 0.5))  # Failed calls ratio
+    LLM_FALLBACK_WINDOW = int(os.environ.get('LLM_FALLBACK_WINDOW', 20))  # Recent calls judged per model
+    LLM_FALLBACK_MIN_SAMPLES = int(os.environ.get('LLM_FALLBACK_MIN_SAMPLES', 5))
+    LLM_FALLBACK_COOLDOWN = float(os.environ.get('LLM_FALLBACK_COOLDOWN', 60))  # Seconds
+    
+    # LLM retry and hedging configuration
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 1))  # Seconds, doubled on each retry
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 30))
+    LLM_CALL_DEADLINE = float(os.environ.get('LLM_CALL_DEADLINE', 300))  # Seconds for a call, retries included
+    LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 0)) or None  # e.g. 95 to hedge past p95
+    LLM_HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20))  # Latencies needed before hedging
+    
+    # Outbound LLM rate limit, shared by all worker threads (0 means unlimited)
+    LLM_RATE_LIMIT_RPM = int(os.environ.get('LLM_RATE_LIMIT_RPM', 0))  # Requests per minute
+    LLM_RATE_LIMIT_TPM = int(os.environ.get('LLM_RATE_LIMIT_TPM', 0))  # Tokens per minute
+    LLM_EXPECTED_COMPLETION_TOKENS = int(os.environ.get('LLM_EXPECTED_COMPLETION_TOKENS', 2000))  # Reserved per call
+    # SQLite file shared by the gunicorn workers, created only when a limit is set; leave empty to limit each process separately
+    LLM_RATE_LIMIT_DB = os.environ.get('LLM_RATE_LIMIT_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache/rate_limit.sqlite3'))
+    
+    # LLM response cache configuration
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_FOLDER = os.environ.get('LLM_CACHE_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache/llm')
+    LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600))  # 7 days
+    
+    # Content generation configuration
+    CONTENT_MAX_WORKERS = int(os.environ.get('CONTENT_MAX_WORKERS', 4))  # Concurrent section requests
+    # Small sections (e.g. the conclusion) share one prompt, within an expected output token budget
+    CONTENT_BATCH_ENABLED = os.environ.get('CONTENT_BATCH_ENABLED', 'true').lower() == 'true'
+    CONTENT_BATCH_MAX_SUBSECTIONS = int(os.environ.get('CONTENT_BATCH_MAX_SUBSECTIONS', 2))  # Largest batchable section
+    CONTENT_BATCH_MAX_SECTIONS = int(os.environ.get('CONTENT_BATCH_MAX_SECTIONS', 4))
+    CONTENT_BATCH_TOKEN_BUDGET = int(os.environ.get('CONTENT_BATCH_TOKEN_BUDGET', 3000))
+    CONTENT_TOKENS_PER_SUBSECTION = int(os.environ.get('CONTENT_TOKENS_PER_SUBSECTION', 600))  # Expected output
+    # Output tokens one content prompt may ask of the model; larger sections are generated in parts of sub-sections
+    CONTENT_OUTPUT_TOKEN_BUDGET = int(os.environ.get('CONTENT_OUTPUT_TOKEN_BUDGET', 4000))
+    CONTENT_OUTPUT_TOKEN_BUDGETS = {
+        MODEL: int(os.environ.get('CONTENT_OUTPUT_TOKEN_BUDGET_DEFAULT_MODEL', 5000)),  # 8k output limit, with margin
+    }
+    CONTENT_JOUR_MAX_WORKERS = int(os.environ.get('CONTENT_JOUR_MAX_WORKERS', 6))  # Concurrent session requests, all days combined
+    # Opt-in: generate the content of a returned plan in the background, ahead of the content request
+    CONTENT_SPECULATIVE = os.environ.get('CONTENT_SPECULATIVE', 'false').lower() == 'true'
+    SPECULATIVE_MAX_WORKERS = int(os.environ.get('SPECULATIVE_MAX_WORKERS', 2))  # Concurrent speculative requests
+    SPECULATIVE_TTL = int(os.environ.get('SPECULATIVE_TTL', 900))  # Seconds unclaimed speculative content is kept
+    SPECULATIVE_MAX_PLANS = int(os.environ.get('SPECULATIVE_MAX_PLANS', 20))  # Plans with speculative content kept
+    CONTENT_REQUEST_DEADLINE = float(os.environ.get('CONTENT_REQUEST_DEADLINE', 0))  # Seconds before the remaining content calls are cancelled, 0 for none
+    # Daily content runs are saved after each session, to resume them after a crash or a restart
+    CONTENT_CHECKPOINT_ENABLED = os.environ.get('CONTENT_CHECKPOINT_ENABLED', 'true').lower() == 'true'
+    CHECKPOINT_FOLDER = os.environ.get('CHECKPOINT_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache/checkpoints')
+    CHECKPOINT_TTL = int(os.environ.get('CHECKPOINT_TTL', 24 * 3600))  # Seconds an idle run can be resumed
+    SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))  # Keep-alive interval of streaming routes
+    
+    # Identical generation requests in flight share one execution, across the workers sharing the folder
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_FOLDER = os.environ.get('SINGLE_FLIGHT_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache/single_flight')
+    SINGLE_FLIGHT_TIMEOUT = int(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 600))  # Seconds a duplicate waits before running itself
+    SINGLE_FLIGHT_RESULT_TTL = int(os.environ.get('SINGLE_FLIGHT_RESULT_TTL', 60))  # Seconds shared results are kept on disk
+    
+    # Background job configuration
+    JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 4))  # Jobs running at the same time
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 100))  # Queued jobs before submissions are refused
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))  # Seconds finished jobs are kept
+    
+    # PDF/PPTX rendering runs in a process pool, out of the request threads
+    RENDER_MAX_WORKERS = int(os.environ.get('RENDER_MAX_WORKERS', 2))  # Render processes, 0 renders in the request thread
+    RENDER_MAX_TASKS_PER_CHILD = int(os.environ.get('RENDER_MAX_TASKS_PER_CHILD', 20))  # Renders before a process is replaced
+    RENDER_TIMEOUT = int(os.environ.get('RENDER_TIMEOUT', 120))  # Seconds before a render is interrupted
+    RENDER_MEMORY_LIMIT_MB = int(os.environ.get('RENDER_MEMORY_LIMIT_MB', 1024))  # Address space of a render process, 0 for none
+    
     # Application configuration
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app/static/uploads')
     OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app/static/outputs')
@@ -24,11 +122,23 @@ class TestingConfig(Config):
     """Testing configuration."""
     DEBUG = False
     TESTING = True
+    LLM_CACHE_ENABLED = False
+    LLM_RATE_LIMIT_RPM = 0
+
+class LocalConfig(DevelopmentConfig):
+    """Development against a local OpenAI-compatible server (e.g. llama.cpp)."""
+    LLM_ROUTES = {
+        'default': os.environ.get('LLM_ROUTE_DEFAULT', f'local:{Config.LLM_LOCAL_MODEL}'),
+    }
+    LLM_RATE_LIMIT_RPM = 0
 
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
     TESTING = False
+    LLM_WARMUP = os.environ.get('LLM_WARMUP', 'true').lower() == 'true'
+    # Move down the model chains when a model answers slower than a minute at p95
+    LLM_FALLBACK_LATENCY_SLO = float(os.environ.get('LLM_FALLBACK_LATENCY_SLO', 60)) or None
     # In production, ensure all sensitive values are set via environment variables
     SECRET_KEY = os.environ.get('SECRET_KEY')
     API_KEY = os.environ.get('OPENAI_API_KEY')
@@ -37,6 +147,7 @@ class ProductionConfig(Config):
 config = {
     'development': DevelopmentConfig,
     'testing': TestingConfig,
+    'local': LocalConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file